@@ -0,0 +1,99 @@
+"""
+Benchmark del tiempo de importación de la CLI (`python -X importtime`).
+
+Mide en subprocesos `main.py --help` y `import main`, reporta el tiempo total de
+importación y los módulos más costosos, y verifica que '--help' no cargue las
+dependencias pesadas. Cada ejecución se agrega como una línea JSON a
+`benchmarks/results/import_time.jsonl` para seguir su evolución entre commits.
+
+    python -m benchmarks.import_time [--budget-ms 500] [--top 10]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from os.path import join, dirname, abspath
+
+
+ROOT = dirname(dirname(abspath(__file__)))
+# Ninguno de estos módulos debe importarse para mostrar la ayuda o validar argumentos
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'statsmodels', 'scipy', 'sklearn', 'plotly', 'tqdm')
+CASES = {
+    'help': [os.path.join(ROOT, 'main.py'), '--help'],
+    'import_main': ['-c', 'import main'],
+}
+
+
+def parse_importtime(stderr:str) -> list:
+    """Entradas (módulo, propio_us, acumulado_us, nivel) de la salida de `-X importtime`."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(own), int(cumulative), level))
+    return entries
+
+
+def measure(args, repeat=3) -> dict:
+    """Mejor de `repeat` ejecuciones: tiempo total del proceso y de importación."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=ROOT,
+                              capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            raise RuntimeError(f"Falló {args}: {proc.stderr[-2000:]}")
+        entries = parse_importtime(proc.stderr)
+        result = {
+            'wall_ms': round(wall * 1e3, 1),
+            'import_ms': round(sum(cum for _, _, cum, level in entries if level == 0) / 1e3, 1),
+            'modules': [name for name, *_ in entries],
+            'top': sorted(((name, round(cum / 1e3, 1)) for name, _, cum, level in entries if level == 0),
+                          key=lambda item: -item[1]),
+        }
+        if best is None or result['wall_ms'] < best['wall_ms']:
+            best = result
+    return best
+
+
+def git_revision() -> str:
+    proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    return proc.stdout.strip() or None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiempo de importación de la CLI.')
+    parser.add_argument('--budget-ms', type=float, default=500, help="Tiempo máximo de importación para '--help'. Por defecto: 500.")
+    parser.add_argument('--top', type=int, default=10, help='Módulos de primer nivel a mostrar. Por defecto: 10.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-o', '--output', default=join(ROOT, 'benchmarks', 'results', 'import_time.jsonl'))
+    args = parser.parse_args()
+
+    record = {'revision': git_revision(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0]}
+    failures = []
+    for case, case_args in CASES.items():
+        result = measure(case_args, repeat=args.repeat)
+        heavy = sorted({name.split('.')[0] for name in result['modules']} & set(HEAVY_MODULES))
+        record[case] = {'wall_ms': result['wall_ms'], 'import_ms': result['import_ms'], 'heavy_modules': heavy,
+                        'top': result['top'][:args.top]}
+        print(f"{case}: {result['wall_ms']:.0f} ms proceso, {result['import_ms']:.0f} ms importando")
+        for name, ms in result['top'][:args.top]:
+            print(f"    {ms:8.1f} ms  {name}")
+        if case == 'help':
+            if heavy:
+                failures.append(f"'--help' importa dependencias pesadas: {heavy}")
+            if result['import_ms'] > args.budget_ms:
+                failures.append(f"'--help' importa en {result['import_ms']:.0f} ms (presupuesto {args.budget_ms:.0f} ms)")
+
+    os.makedirs(dirname(args.output), exist_ok=True)
+    with open(args.output, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(record) + '\n')
+    print(f"Resultados agregados a {args.output}")
+    for failure in failures:
+        print(f"ERROR: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,193 @@
+"""
+Benchmarks de los modelos de desestacionalización sobre series mensuales sintéticas.
+
+Mide, para cada modelo, el tiempo y la memoria máxima (tracemalloc) de ajustar una
+serie de 5 a 50 años, de ajustar muchas series de igual largo (serie a serie y, si el
+modelo lo soporta, con adjust_batch) y de SlidingSpans.fit. Estima el exponente de
+escalamiento tiempo ~ n^k y guarda todo en `benchmarks/results/models-<fecha>.json`;
+`--compare` muestra la razón contra un resultado anterior.
+
+Sin x13as instalado, X13Model se mide contra `benchmarks/x13as_stub.py` (el campo
+`x13_backend` lo indica): en ese caso solo refleja el costo de proceso y E/S. La
+memoria del binario x13as no es visible para tracemalloc.
+
+    python -m benchmarks.models [--models x13,stl,cissa] [--years 5,10,20,30,50]
+                                [--batch 100] [--compare benchmarks/results/models-....json]
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from os.path import join, dirname, abspath
+
+import numpy as np
+import pandas as pd
+
+from main import MODELS, model_class
+from diagnostics.adjustment_cache import ADJUSTMENT_CACHE
+from diagnostics.x11_comparison import synthetic_series
+
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+
+def install_x13_stub(directory) -> str:
+    """Crea un ejecutable 'x13as' (el sustituto) en `directory` y define X13PATH."""
+    path = join(directory, 'x13as')
+    with open(join(ROOT, 'benchmarks', 'x13as_stub.py'), encoding='utf-8') as file:
+        source = file.read()
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f'#!{sys.executable}\n{source}')
+    os.chmod(path, 0o755)
+    os.environ['X13PATH'] = directory
+    return path
+
+
+def x13_backend(stub_dir) -> str:
+    """'x13as' si el binario real está disponible; si no, instala el sustituto. Debe llamarse antes de importar X13Model."""
+    from statsmodels.tsa.x13 import _find_x12
+    if _find_x12(os.getenv('X13PATH')):
+        return 'x13as'
+    install_x13_stub(stub_dir)
+    return 'stub'
+
+
+def measure(func, repeat=3) -> dict:
+    """
+    Mejor tiempo y mediana de `repeat` ejecuciones, y memoria máxima de una ejecución
+    adicional. Una primera ejecución sin medir carga los imports diferidos del modelo.
+    """
+    func()
+    times = []
+    for _ in range(repeat):
+        ADJUSTMENT_CACHE.clear()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    ADJUSTMENT_CACHE.clear()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'median_s': statistics.median(times), 'peak_mb': peak / 2**20}
+
+
+def _adjust(name, serie):
+    model = model_class(name)()
+    model.fit(serie)
+    model.adjust()
+    return model.seasadj
+
+
+def _run_case(record, func, repeat):
+    try:
+        record.update(measure(func, repeat))
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+    _print_record(record)
+    return record
+
+
+def run_suite(models, years, batch, batch_years, spans_years, repeat=3) -> list:
+    results = []
+    for name in models:
+        for n_years in years:
+            serie = synthetic_series(n_years, seed=0)
+            results.append(_run_case({'case': 'single', 'model': name, 'years': n_years, 'n': len(serie)},
+                                     lambda: _adjust(name, serie), repeat))
+
+        series = [synthetic_series(batch_years, seed=seed) for seed in range(batch)]
+        results.append(_run_case({'case': 'batch_loop', 'model': name, 'years': batch_years, 'n': batch},
+                                 lambda: [_adjust(name, serie) for serie in series], max(1, repeat // 2)))
+        model = model_class(name)()
+        if model.supports_batch:
+            rows = np.vstack([serie.to_numpy() for serie in series])
+            results.append(_run_case({'case': 'batch', 'model': name, 'years': batch_years, 'n': batch},
+                                     lambda: model.adjust_batch(rows), repeat))
+
+        from diagnostics.x13_diags import SlidingSpans
+        serie = synthetic_series(spans_years, seed=0)
+        results.append(_run_case({'case': 'sliding_spans', 'model': name, 'years': spans_years, 'n': len(serie)},
+                                 lambda: SlidingSpans(model_class(name)()).fit(serie), repeat))
+    return results
+
+
+def _print_record(record):
+    if 'error' in record:
+        print(f"  {record['model']:>6} {record['case']:<14} {record['years']:>3} años  ERROR {record['error']}")
+    else:
+        print(f"  {record['model']:>6} {record['case']:<14} {record['years']:>3} años  "
+              f"{record['seconds']*1e3:10.1f} ms  {record['peak_mb']:8.2f} MB")
+
+
+def scaling(results) -> dict:
+    """Exponente k de tiempo ~ n^k por modelo (regresión log-log de los casos 'single')."""
+    exponents = {}
+    data = pd.DataFrame([r for r in results if r['case'] == 'single' and 'seconds' in r])
+    for name, group in data.groupby('model') if not data.empty else []:
+        if len(group) >= 2:
+            exponents[name] = round(float(np.polyfit(np.log(group['n']), np.log(group['seconds']), 1)[0]), 3)
+    return exponents
+
+
+def compare(results, previous) -> pd.DataFrame:
+    """Razón actual/anterior de tiempo y memoria para los casos presentes en ambos resultados."""
+    key = ['case', 'model', 'years', 'n']
+    new = pd.DataFrame([r for r in results if 'seconds' in r]).set_index(key)
+    old = pd.DataFrame([r for r in previous['results'] if 'seconds' in r]).set_index(key)
+    both = new.join(old, how='inner', rsuffix='_old')
+    return pd.DataFrame({'seconds': both['seconds'], 'seconds_old': both['seconds_old'],
+                         'time_ratio': both['seconds'] / both['seconds_old'],
+                         'memory_ratio': both['peak_mb'] / both['peak_mb_old']})
+
+
+def metadata(backend) -> dict:
+    revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return {'revision': revision or None, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0], 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'x13_backend': backend}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks de los modelos de desestacionalización.')
+    parser.add_argument('--models', default='x13,stl,cissa', help="Modelos separados por coma. Por defecto: 'x13,stl,cissa'.")
+    parser.add_argument('--years', default='5,10,20,30,50', help='Largos de serie (años) para el caso de una serie.')
+    parser.add_argument('--batch', type=int, default=100, help='Número de series del caso por lotes. Por defecto: 100.')
+    parser.add_argument('--batch_years', type=int, default=20)
+    parser.add_argument('--spans_years', type=int, default=20, help='Largo de la serie para SlidingSpans.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', default=None, help='JSON de una ejecución anterior para comparar.')
+    parser.add_argument('-o', '--output', default=None, help="Por defecto: 'benchmarks/results/models-<fecha>.json'.")
+    args = parser.parse_args()
+
+    models = [name for name in args.models.split(',') if name]
+    unknown = [name for name in models if name not in MODELS]
+    if unknown:
+        print(f"Modelos inválidos: {unknown}. Valores permitidos: {list(MODELS)}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as stub_dir:
+        backend = x13_backend(stub_dir) if 'x13' in models else None
+        print(f"Benchmark de {models} (x13: {backend})")
+        results = run_suite(models, [int(y) for y in args.years.split(',')], args.batch, args.batch_years,
+                            args.spans_years, repeat=args.repeat)
+
+    report = {'meta': metadata(backend), 'scaling': scaling(results), 'results': results}
+    print(f"Exponente de escalamiento (tiempo ~ n^k): {report['scaling']}")
+    output = args.output or join(ROOT, 'benchmarks', 'results', f"models-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Resultados en {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            print(compare(results, json.load(file)).round(3).to_string())
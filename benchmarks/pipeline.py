@@ -0,0 +1,173 @@
+"""
+Benchmark de punta a punta de la ingesta y el procesamiento de la ENE con datos sintéticos.
+
+Genera archivos anuales en `raw/anual` y archivos mensuales servidos por un sitio INE
+local (`benchmarks.synthetic_ene.ServidorINE`), y mide con las mismas funciones de
+`main.py` cada etapa en un directorio de trabajo temporal:
+
+    aggregate_anual   ENE.groupby_cae('anual')
+    download          ENE.nuevos_datos() contra el servidor local
+    aggregate_mensual ENE.groupby_cae('mensual') (con '--dedup_ingest', lectura deduplicada)
+    import            main.import_data
+    adjust            main.run_adjust
+    diagnose          main.run_diagnostics (solo con '--diagnose')
+    rates             main.compute_rates
+    save              main.save_results
+
+`--scale` multiplica las filas por mes de encuesta (p. ej. `--scale 10` para probar la
+ingesta a 10 veces el volumen actual). Los resultados se agregan a
+`benchmarks/results/pipeline-<fecha>.json`.
+
+    python -m benchmarks.pipeline [--rows 12000] [--scale 10] [--model stl]
+                                  [--anual 2010-2019] [--monthly 2019-12:2022-12]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+from argparse import Namespace
+from os.path import join, dirname, abspath
+
+import pandas as pd
+
+import main
+from benchmarks.models import metadata, x13_backend
+from benchmarks.synthetic_ene import ServidorINE
+
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+
+def _year_range(value):
+    first, _, last = value.partition('-')
+    return list(range(int(first), int(last or first) + 1))
+
+
+def _month_range(value):
+    first, _, last = value.partition(':')
+    return [(p.year, p.month) for p in pd.period_range(first, last or first, freq='M')]
+
+
+def _rss_mb():
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _du_mb(path):
+    return sum(os.path.getsize(join(root, name)) for root, _, files in os.walk(path) for name in files) / 2**20
+
+
+class Etapas():
+    """Ejecuta y cronometra etapas en orden; guarda segundos y memoria residente máxima de cada una."""
+    def __init__(self) -> None:
+        self.records = []
+
+    def run(self, name, func, **extra):
+        logging.info(f"Etapa '{name}'...")
+        start = time.perf_counter()
+        value = func()
+        record = {'stage': name, 'seconds': time.perf_counter() - start, 'max_rss_mb': _rss_mb(), **extra}
+        self.records.append(record)
+        print(f"  {name:<18} {record['seconds']:9.2f} s  {record['max_rss_mb']:8.1f} MB RSS")
+        return value
+
+    @property
+    def total(self) -> float:
+        return sum(r['seconds'] for r in self.records)
+
+
+def run_pipeline(workdir, anual, monthly, rows, model='stl', diagnose=False, dedup=False, columnas_extra=20) -> dict:
+    from utils.preprocess import ENE
+    args = Namespace(x13=model == 'x13', stl=model == 'stl', cissa=model == 'cissa', x11=model == 'x11',
+                     adjustment='concurrent', refit_days=365, diagnose=diagnose, diagnose_models=None,
+                     diag_executor='auto', show_traceback=True, input=join('data', 'preprocess', 'tasa_oficial.csv'),
+                     output_dir='outputs', output='resultados.csv')
+    os.chdir(workdir)
+    sitio = join(workdir, 'sitio')
+
+    # Se genera en otro proceso para que la memoria máxima medida sea solo la del pipeline
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'benchmarks.synthetic_ene', '-o', 'data', '--sitio', sitio,
+                    '--anual', f'{anual[0]}-{anual[-1]}', '--monthly', f'{monthly[0][0]}-{monthly[0][1]:02d}:{monthly[-1][0]}-{monthly[-1][1]:02d}',
+                    '--rows', str(rows), '--columns', str(columnas_extra)],
+                   check=True, env={**os.environ, 'PYTHONPATH': ROOT})
+    generation = {'seconds': time.perf_counter() - start, 'anual_mb': _du_mb(join('data', 'raw', 'anual')),
+                  'monthly_mb': _du_mb(sitio), 'anual_files': len(anual), 'monthly_files': len(monthly)}
+    print(f"  Datos generados en {generation['seconds']:.1f} s: {generation['anual_mb']:.0f} MB anuales, "
+          f"{generation['monthly_mb']:.0f} MB mensuales")
+
+    etapas = Etapas()
+    with ServidorINE(sitio) as url:
+        ene = ENE(data_path=join(workdir, 'data'), base_url=url)
+        etapas.run('aggregate_anual', lambda: ene.groupby_cae('anual'))
+        status = etapas.run('download', ene.nuevos_datos)
+    downloaded = sum(state == 'descargado' for state in status.values())
+    etapas.records[-1]['files'] = downloaded
+    etapas.run('aggregate_mensual', lambda: ene.groupby_cae('mensual', dedup=dedup))
+    data = etapas.run('import', lambda: main.import_data(args.input))
+    adjusted = etapas.run('adjust', lambda: main.run_adjust(data, args))
+    if diagnose:
+        etapas.run('diagnose', lambda: main.run_diagnostics(data, args))
+    results = etapas.run('rates', lambda: main.compute_rates(data, adjusted, args))
+    etapas.run('save', lambda: main.save_results(results, args))
+
+    if downloaded != len(monthly):
+        logging.warning(f"Se descargaron {downloaded} de {len(monthly)} archivos mensuales")
+    return {'generation': generation, 'stages': etapas.records, 'total_s': etapas.total,
+            'months': int(len(data)), 'series': int(data.shape[1])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de punta a punta con archivos ENE sintéticos.')
+    parser.add_argument('--rows', type=int, default=12000, help='Filas por mes de encuesta a escala 1. Por defecto: 12000.')
+    parser.add_argument('--scale', type=float, default=1, help='Multiplicador de filas (volumen). Por defecto: 1.')
+    parser.add_argument('--anual', default='2010-2019', help="Años de los archivos anuales. Por defecto: '2010-2019'.")
+    parser.add_argument('--monthly', default=None,
+                        help="Meses centrales a descargar. Por defecto: de diciembre del último año anual a tres años después.")
+    parser.add_argument('--columns', type=int, default=20, help='Columnas de relleno por archivo. Por defecto: 20.')
+    parser.add_argument('--model', default='stl', choices=list(main.MODELS))
+    parser.add_argument('--diagnose', action='store_true', help='Incluye los diagnósticos de outlier.')
+    parser.add_argument('--dedup_ingest', action='store_true')
+    parser.add_argument('--keep', default=None, help='Directorio de trabajo a conservar (por defecto, uno temporal).')
+    parser.add_argument('-o', '--output', default=None, help="Por defecto: 'benchmarks/results/pipeline-<fecha>.json'.")
+    parser.add_argument('--log_level', default='WARNING')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+
+    rows = int(args.rows * args.scale)
+    anual = _year_range(args.anual)
+    # La tabla anual termina en noviembre del último año (el trimestre móvil de
+    # diciembre necesita enero): la descarga empieza en diciembre
+    args.monthly = args.monthly or f'{anual[-1]}-12:{anual[-1] + 3}-12'
+    monthly = _month_range(args.monthly)
+    output = args.output or join(ROOT, 'benchmarks', 'results', f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    print(f"Pipeline con {rows} filas por mes, {len(anual)} años anuales y {len(monthly)} meses descargados ({args.model})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = abspath(args.keep) if args.keep else tmp
+        os.makedirs(workdir, exist_ok=True)
+        backend = None
+        if args.model == 'x13':
+            os.makedirs(join(tmp, 'bin'))
+            backend = x13_backend(join(tmp, 'bin'))
+        cwd = os.getcwd()
+        try:
+            result = run_pipeline(workdir, anual, monthly, rows, model=args.model, diagnose=args.diagnose,
+                                  dedup=args.dedup_ingest, columnas_extra=args.columns)
+        finally:
+            os.chdir(cwd)
+
+    report = {'meta': metadata(backend), 'config': {'rows': rows, 'scale': args.scale, 'anual': args.anual,
+                                                    'monthly': args.monthly, 'columns': args.columns, 'model': args.model,
+                                                    'diagnose': args.diagnose, 'dedup_ingest': args.dedup_ingest},
+              **result}
+    print(f"Total: {result['total_s']:.2f} s para {result['series']} series de {result['months']} meses")
+    os.makedirs(dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Resultados en {output}")
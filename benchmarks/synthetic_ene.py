@@ -0,0 +1,173 @@
+"""
+Archivos ENE sintéticos y un sustituto local del sitio del INE, para medir la ingesta sin red.
+
+Los archivos tienen las columnas que lee `utils.preprocess.ENE`, más columnas de
+identificación y de relleno, con el formato de los archivos publicados (separador ';',
+codificación latin1). Cada mes de encuesta se genera una sola vez (semilla fija por
+mes), de modo que los tres archivos de trimestre móvil que lo contienen coinciden,
+igual que en los datos reales. La desocupación tiene tendencia, estacionalidad y un
+salto en 2020 para que el ajuste y los diagnósticos trabajen sobre algo realista.
+
+    from benchmarks.synthetic_ene import generar_anuales, generar_mensuales, ServidorINE
+    generar_anuales('data/raw/anual', range(2010, 2020), filas=10000)
+    generar_mensuales('sitio', [(2020, m) for m in range(1, 13)], filas=10000)
+    with ServidorINE('sitio') as url:
+        ENE(data_path='data', base_url=url).nuevos_datos()
+
+    python -m benchmarks.synthetic_ene -o data --anual 2010-2019 --monthly 2019-12:2022-12 [--rows 12000]
+"""
+import os
+import threading
+from functools import partial
+from os.path import join
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+
+from utils.download import nombre_archivo
+
+
+POBLACION = 15_000_000
+
+
+def tasa_desocupacion(year:int, month:int) -> float:
+    """Tasa de desocupación simulada del mes: tendencia, estacionalidad y salto de pandemia."""
+    t = (year - 2010) * 12 + month - 1
+    tasa = 0.075 + 0.002 * np.sin(2 * np.pi * t / 96) + 0.006 * np.sin(2 * np.pi * (month - 3) / 12)
+    if (year, month) >= (2020, 4) and (year, month) <= (2021, 6):
+        tasa += 0.045
+    return float(tasa)
+
+
+def mes_encuesta(year:int, month:int, filas:int, columnas_extra=20) -> pd.DataFrame:
+    """Registros de un mes de encuesta (siempre los mismos para el mismo mes y `filas`)."""
+    rng = np.random.default_rng(year * 100 + month)
+    edad = rng.integers(0, 91, size=filas)
+    activo = (edad >= 15) & (rng.random(filas) < 0.6)
+    desocupado = activo & (rng.random(filas) < tasa_desocupacion(year, month))
+    cae = np.zeros(filas, dtype=int)
+    cae[activo] = rng.choice([1, 2, 3, 4, 5, 6, 7], size=activo.sum(), p=[.8, .05, .05, .03, .03, .02, .02])
+    cae[desocupado] = rng.choice([8, 9], size=desocupado.sum(), p=[.9, .1])
+    data = {
+        'id_identificacion': rng.integers(1, 10**7, size=filas),
+        'idrph': np.arange(1, filas + 1),
+        'nro_linea': rng.integers(1, 9, size=filas),
+        'region': rng.integers(1, 17, size=filas),
+        'provincia': rng.integers(11, 164, size=filas),
+        'tipo': rng.integers(1, 4, size=filas),
+        'estrato': rng.integers(1000, 9999, size=filas),
+        'conglomerado': rng.integers(10**5, 10**6, size=filas),
+        'sexo': rng.integers(1, 3, size=filas),
+        'edad': edad,
+        'cae_especifico': cae,
+        'fact_cal': np.round(POBLACION / filas * rng.lognormal(0, 0.3, size=filas), 6),
+    }
+    for k in range(columnas_extra):
+        data[f'v{k + 1}'] = rng.integers(0, 10, size=filas)
+    return pd.DataFrame(data)
+
+
+def _escribir(path, partes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.concat(partes, ignore_index=True).to_csv(path, sep=';', index=False, encoding='latin1')
+    return path
+
+
+def generar_anuales(directorio, years, filas=10000, columnas_extra=20) -> list:
+    """Un archivo 'ano-YYYY.csv' por año, con cada mes de encuesta una vez (formato de raw/anual)."""
+    files = []
+    for year in years:
+        partes = []
+        for month in range(1, 13):
+            parte = mes_encuesta(year, month, filas, columnas_extra)
+            parte.insert(0, 'ano_trimestre', year)
+            parte.insert(1, 'mes_central', month)
+            parte.insert(2, 'ano_encuesta', year)
+            parte.insert(3, 'mes_encuesta', month)
+            partes.append(parte)
+        files.append(_escribir(join(directorio, f'ano-{year}.csv'), partes))
+    return files
+
+
+def generar_mensuales(directorio, meses, filas=10000, columnas_extra=20, layout='sitio') -> list:
+    """
+    Un archivo de trimestre móvil por cada (año, mes central) de `meses`, con los tres
+    meses de encuesta que cubre. Con layout='sitio' usa las rutas del INE
+    (`<año>/csv/ene-YYYY-MM-xxx.csv`, para ServidorINE); con 'raw', todos en `directorio`.
+    """
+    files, cache = [], {}
+    for year, month in meses:
+        central = pd.Period(year=year, month=month, freq='M')
+        partes = []
+        for k in (-1, 0, 1):
+            periodo = central + k
+            key = (periodo.year, periodo.month)
+            if key not in cache:
+                cache[key] = mes_encuesta(*key, filas, columnas_extra)
+            parte = cache[key].copy()
+            parte.insert(0, 'ano_trimestre', year)
+            parte.insert(1, 'mes_central', month)
+            parte.insert(2, 'ano_encuesta', periodo.year)
+            parte.insert(3, 'mes_encuesta', periodo.month)
+            partes.append(parte)
+        # Cada mes se usa en tres archivos consecutivos; los anteriores ya no se necesitan
+        for key in [key for key in cache if key < ((central - 1).year, (central - 1).month)]:
+            del cache[key]
+        path = join(directorio, str(year), 'csv', nombre_archivo(year, month)) if layout == 'sitio' else join(directorio, nombre_archivo(year, month))
+        files.append(_escribir(path, partes))
+    return files
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ServidorINE():
+    """
+    Servidor HTTP local que sirve `directorio` con las rutas del sitio del INE; se usa
+    como `base_url` de ENE/Downloader. Responde 404 a los archivos que no existen y
+    304 a las revalidaciones con If-Modified-Since.
+
+    >>> with ServidorINE('sitio') as url:
+    ...     ENE(base_url=url).nuevos_datos()
+    """
+    def __init__(self, directorio, host='127.0.0.1', port=0) -> None:
+        handler = partial(_QuietHandler, directory=directorio)
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> str:
+        self._thread.start()
+        return self.url
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Genera archivos ENE sintéticos (anuales y de trimestre móvil).')
+    parser.add_argument('-o', '--output', default='data', help="Directorio de datos; escribe en '<output>/raw/anual' y '<output>/raw/monthly'.")
+    parser.add_argument('--anual', default='2010-2019', help="Años de los archivos anuales ('' para ninguno). Por defecto: '2010-2019'.")
+    parser.add_argument('--monthly', default='', help="Meses centrales de los archivos mensuales, p. ej. '2019-12:2022-12'.")
+    parser.add_argument('--rows', type=int, default=12000, help='Filas por mes de encuesta. Por defecto: 12000.')
+    parser.add_argument('--columns', type=int, default=20, help='Columnas de relleno. Por defecto: 20.')
+    parser.add_argument('--sitio', default=None, help='Escribe los mensuales con las rutas del sitio del INE en este directorio (para ServidorINE).')
+    args = parser.parse_args()
+
+    if args.anual:
+        first, _, last = args.anual.partition('-')
+        generar_anuales(join(args.output, 'raw', 'anual'), range(int(first), int(last or first) + 1), args.rows, args.columns)
+    if args.monthly:
+        first, _, last = args.monthly.partition(':')
+        meses = [(p.year, p.month) for p in pd.period_range(first, last or first, freq='M')]
+        if args.sitio:
+            generar_mensuales(args.sitio, meses, args.rows, args.columns)
+        else:
+            generar_mensuales(join(args.output, 'raw', 'monthly'), meses, args.rows, args.columns, layout='raw')
@@ -0,0 +1,61 @@
+"""
+Sustituto mínimo del binario x13as para benchmarks sin X-13ARIMA-SEATS instalado.
+
+Lee el spec que escribe `statsmodels.tsa.x13.x13_arima_analysis`, estima factores
+estacionales con medias por mes de la serie sin tendencia (media móvil 2x12) y
+escribe los archivos .err, .out, .d11, .d12 y .d13 que statsmodels espera. Usa solo
+la biblioteca estándar: mide el costo de proceso y E/S de X13Model, no el de x13as.
+
+    benchmarks.models.install_x13_stub(directorio)  # crea 'x13as' y define X13PATH
+"""
+import re
+import sys
+
+
+def _read_spec(path):
+    with open(path, encoding='utf-8') as file:
+        spec = file.read()
+    values = [float(value) for value in re.search(r'data=\(([^)]*)\)', spec).group(1).split()]
+    year, month = re.search(r'start=(\d+)\.(\d+)', spec).groups()
+    return values, int(year), int(month)
+
+
+def _decompose(values, period=12):
+    n = len(values)
+    half = period // 2
+    trend = list(values)
+    for t in range(half, n - half):
+        window = values[t - half:t + half + 1]
+        trend[t] = (sum(window[1:-1]) + (window[0] + window[-1]) / 2) / period
+    by_month = [[] for _ in range(period)]
+    for t in range(half, n - half):
+        by_month[t % period].append(values[t] - trend[t])
+    factors = [sum(month) / len(month) if month else 0.0 for month in by_month]
+    mean = sum(factors) / period
+    seasonal = [factors[t % period] - mean for t in range(n)]
+    seasadj = [value - season for value, season in zip(values, seasonal)]
+    irregular = [adjusted - level for adjusted, level in zip(seasadj, trend)]
+    return seasadj, trend, irregular
+
+
+def _write_table(path, values, year, month, name):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f'date\t{name}\n------\t-----------------------\n')
+        for t, value in enumerate(values):
+            y, m = divmod(month - 1 + t, 12)
+            file.write(f'{year + y}{m + 1:02d}\t{value:+.14e}\n')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        # statsmodels verifica que el binario exista ejecutándolo sin argumentos
+        sys.exit(0)
+    spec_path, out_path = sys.argv[1], sys.argv[2]
+    values, year, month = _read_spec(spec_path + '.spc')
+    seasadj, trend, irregular = _decompose(values)
+    with open(out_path + '.err', 'w', encoding='utf-8') as file:
+        file.write(f' spc: {spec_path}.spc\n')
+    with open(out_path + '.out', 'w', encoding='utf-8') as file:
+        file.write('x13as (sustituto para benchmarks)\n')
+    for suffix, series, name in [('d11', seasadj, 'seasadj'), ('d12', trend, 'trend'), ('d13', irregular, 'irregular')]:
+        _write_table(f'{out_path}.{suffix}', series, year, month, name)
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class AdjustmentCache():
+    """
+    Cache LRU en memoria de series desestacionalizadas, compartido por los diagnósticos.
+
+    La llave es (clase del modelo, hiperparámetros, huella de la serie ajustada, vía), por
+    lo que el mismo prefijo o span ajustado desde OutlierAnalysis, RevisionHistory o
+    SlidingSpans se calcula una sola vez por proceso. La vía ('loop' o 'batch') separa
+    los ajustes serie a serie de los de adjust_batch, que difieren levemente. Al superar
+    `max_bytes` se descartan las entradas usadas hace más tiempo.
+    """
+    def __init__(self, max_bytes=64 * 2**20) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(values, index) -> str:
+        digest = hashlib.sha1(np.ascontiguousarray(values, dtype=float).tobytes())
+        digest.update(np.asarray(pd.DatetimeIndex(index).asi8).tobytes())
+        return digest.hexdigest()
+
+    def key(self, model, values, index, path='loop') -> tuple:
+        return (type(model).__name__, repr(model.hiperparams), self.fingerprint(values, index), path)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, values:np.ndarray):
+        values = np.array(values, dtype=float)
+        if values.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = values
+            self.nbytes += values.nbytes
+            while self.nbytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = self.hits = self.misses = 0
+
+    def seasadj(self, model, serie:pd.Series) -> pd.Series:
+        """
+        Serie desestacionalizada de `serie` con `model`, ajustando solo si no está en el
+        cache. Con un acierto, `model` queda ajustado a `serie` con la serie ajustada del
+        cache y sin `model_obj`, de modo que no conserva el estado de un ajuste anterior.
+        """
+        key = self.key(model, serie.to_numpy(dtype=float), serie.index)
+        values = self.get(key)
+        if values is None:
+            model.fit(serie)
+            values = model.adjust().seasadj.to_numpy(dtype=float)
+            self.put(key, values)
+        else:
+            model.fit(serie)
+            model.model_obj = None
+            model._seasadj = pd.Series(values.copy(), index=serie.index, name='seasadj')
+        return pd.Series(values, index=serie.index, name='seasadj')
+
+    def seasadj_batch(self, model, rows:np.ndarray, indexes) -> np.ndarray:
+        """
+        Versión por lotes de `seasadj`: `rows` (series, n) con `indexes` (una DatetimeIndex
+        por fila). Solo las filas ausentes del cache se ajustan, en una llamada a adjust_batch.
+        """
+        keys = [self.key(model, row, index, 'batch') for row, index in zip(rows, indexes)]
+        out = np.empty(rows.shape, dtype=float)
+        missing = []
+        for i, key in enumerate(keys):
+            values = self.get(key)
+            if values is None:
+                missing.append(i)
+            else:
+                out[i] = values
+        if missing:
+            out[missing] = model.adjust_batch(rows[missing])
+            for i in missing:
+                self.put(keys[i], out[i])
+        return out
+
+
+# Cache compartido por todos los diagnósticos del proceso
+ADJUSTMENT_CACHE = AdjustmentCache()
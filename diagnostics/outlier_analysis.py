@@ -1,15 +1,16 @@
 from os import path
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.x13 import x13_arima_analysis
 from statsmodels.tsa.statespace.sarimax import SARIMAX
-from plotly import graph_objects as go
 import warnings
 from statsmodels.tools.sm_exceptions import X13Warning, ConvergenceWarning, ValueWarning, ModelWarning
 from sklearn.metrics import mean_squared_error
 
 from diagnostics.x13_diags import SlidingSpans, RevisionHistory
 from models.base import BaseModel
+from diagnostics.adjustment_cache import ADJUSTMENT_CACHE, AdjustmentCache
 
 
 warnings.simplefilter('ignore', category=X13Warning)
@@ -18,6 +19,40 @@ warnings.simplefilter('ignore', category=UserWarning)
 warnings.simplefilter('ignore', category=ValueWarning)
 
 
+class ForecastFits():
+    """
+    Modelos de pronóstico ya ajustados, por (modelo, huella de la serie de entrenamiento).
+
+    Todos los pasos de model_evolution, y las ventanas de outlier con el mismo inicio,
+    pronostican desde el mismo tramo pre-outlier: el SARIMAX se ajusta una sola vez y
+    cada horizonte se obtiene del mismo resultado. Guarda a lo más `max_fits` ajustes.
+    """
+    def __init__(self, max_fits=16) -> None:
+        self.max_fits = max_fits
+        self.hits = 0
+        self.misses = 0
+        self._fits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fit(self, model, serie:pd.Series, fit_func):
+        key = (model.__name__, AdjustmentCache.fingerprint(serie.to_numpy(dtype=float), serie.index))
+        with self._lock:
+            if key in self._fits:
+                self.hits += 1
+                self._fits.move_to_end(key)
+                return self._fits[key]
+            self.misses += 1
+        results = fit_func()
+        with self._lock:
+            self._fits[key] = results
+            while len(self._fits) > self.max_fits:
+                self._fits.popitem(last=False)
+        return results
+
+
+FORECAST_FITS = ForecastFits()
+
+
 x13as_path = path.abspath("C:/Program Files/x13as")
 class OutlierAnalysis():
     """
@@ -43,13 +78,12 @@ class OutlierAnalysis():
         model = self.forecast_model if model is None else model
 
         if model.__name__=='SARIMAX':
-            sari = model(
+            results = FORECAST_FITS.fit(model, serie, lambda: model(
                 endog=serie,
                 order=(4,1,4),
                 seasonal_order=(2,1,2,12),
                 freq='MS'
-                )
-            results = sari.fit()
+                ).fit())
             if periods > 0:
                 fore = results.forecast(steps=periods)
 
@@ -78,14 +112,10 @@ class OutlierAnalysis():
         
         # Modelo X13-ARIMA
         # Desestacionalización Serie compuesta por parte OFICIAL-PRONOSTICO-OFICIAL (Prepandemia-Pandemia-Pospandemia)
-        seasonal_model.fit(comp_serie)
-        seasonal_model.adjust()
-        comp_adj = seasonal_model.seasadj.copy()
+        comp_adj = ADJUSTMENT_CACHE.seasadj(seasonal_model, comp_serie)
 
         # Predicción Serie Oficial
-        seasonal_model.fit(serie)
-        seasonal_model.adjust()
-        real_adj = seasonal_model.seasadj.copy()
+        real_adj = ADJUSTMENT_CACHE.seasadj(seasonal_model, serie)
     
         self.comp_adj = comp_adj if serie is None else self.comp_adj
         self.real_adj = real_adj if serie is None else self.real_adj
@@ -97,6 +127,7 @@ class OutlierAnalysis():
     
 
     def plot(self, mode):
+        from plotly import graph_objects as go
         plots = {
             'composed':go.Scatter(x=self.comp_serie.index, y=self.comp_serie, name='Composed'), 
             'real':go.Scatter(x=self.serie.index, y=self.serie, name='Real'), 
@@ -124,19 +155,30 @@ class OutlierAnalysis():
         else:
             fig.add_traces(plots[mode])
     
-    def model_evolution(self, seasonal_model:BaseModel):
-        self.mses = []
+    def evolution_dates(self):
+        """Fechas desde el fin del outlier; model_evolution evalúa la serie hasta el mes siguiente a cada una."""
+        dates = []
         last_date = self.end
         while last_date in self.serie.index:
-            cropped = self.serie[:last_date + pd.DateOffset(months=1)]
-            self.mses.append(self.seasonality_diff(serie=cropped, seasonal_model=seasonal_model))
+            dates.append(last_date)
             last_date = last_date + pd.DateOffset(months=1)
-        self.mses = pd.Series(self.mses)
+        return dates
+
+    def evolution_step(self, seasonal_model:BaseModel, last_date):
+        cropped = self.serie[:last_date + pd.DateOffset(months=1)]
+        return self.seasonality_diff(serie=cropped, seasonal_model=seasonal_model)
+
+    def model_evolution(self, seasonal_model:BaseModel, mses=None):
+        # `mses` permite entregar los pasos ya calculados por separado (p. ej. en paralelo)
+        if mses is None:
+            mses = [self.evolution_step(seasonal_model, last_date) for last_date in self.evolution_dates()]
+        self.mses = pd.Series(mses)
         self.mses.index = self.serie[self.end:].index
         self.mses.index.name = 'ds'
         return self.mses.rename('mse-compuesta-real')
     
     def plot_evol(self):
+        from plotly import graph_objects as go
         fig = go.Figure(go.Scatter(x=self.serie[self.end:].index, y=self.mses))
         fig.show()
 
@@ -188,56 +230,72 @@ class SlidingOutliers(SlidingSpans):
 
         
 class RevisionOutlier(RevisionHistory):
+    """
+    Revision history respecto a una ventana de outlier. Las curvas de cambio (MSE de
+    cada vintage contra el vintage del inicio del outlier) se calculan para todos los
+    vintages de una vez y se guardan por inicio; A_analysis y C_analysis toman las
+    estaciones como un subconjunto de la curva.
+    """
+    def fit(self, serie:pd.Series, vintages=None):
+        super().fit(serie, vintages=vintages)
+        self._curves = dict()
+        return self
+
+    def _curve(self, kind, start) -> pd.Series:
+        if (kind, start) not in self._curves:
+            frame = self.A if kind == 'A' else self.C
+            vintages = pd.to_datetime(frame.columns.str[4:-1])
+            block = frame.loc[:start]
+            values = block.astype(object).where(block.notna(), np.nan).to_numpy(dtype=float)
+            later = vintages >= start
+            base = values[:, vintages.get_loc(start)][:, None]
+            if kind == 'A':
+                residue = ((values[:, later] / base - 1)**2).mean(axis=0)
+            else:
+                residue = ((values[:, later] - base)**2).mean(axis=0)
+            self._curves[(kind, start)] = pd.Series(residue, index=vintages[later])
+        return self._curves[(kind, start)]
+
+    def _seasons(self, kind, outlier:pd.Series, n_seasons):
+        curve = self._curve(kind, outlier.index[0])
+        start, end = outlier.index[0], outlier.index[-1]
+        seasons = sorted({*[start + pd.DateOffset(months=int(12*s)) for s in range(n_seasons)], end})
+        missing = [season for season in seasons if season not in curve.index]
+        if missing:
+            warnings.warn("Se definen más estaciones de las encontradas en la serie")
+            seasons = seasons[:seasons.index(missing[0])]
+        residue = curve.loc[seasons]
+        residue.index.name = 'ds'
+        return residue
+
+    def A_curve(self, outlier:pd.Series) -> pd.Series:
+        """MSE de A*_t / A*_inicio respecto a 1, para cada vintage desde el inicio del outlier."""
+        if not isinstance(self.A, pd.DataFrame):
+            raise Exception("Es necesario aplicar método fit a serie")
+        return self._curve('A', outlier.index[0]).rename('Cambio mse de RY').rename_axis('ds')
+
+    def C_curve(self, outlier:pd.Series) -> pd.Series:
+        """MSE entre C*_t y C*_inicio, para cada vintage desde el inicio del outlier."""
+        if not isinstance(self.C, pd.DataFrame):
+            raise Exception("Es necesario aplicar método fit a serie")
+        return self._curve('C', outlier.index[0]).rename('Cambio mse de CY').rename_axis('ds')
+
     def A_analysis(self, outlier:pd.Series, n_seasons=4):
         if isinstance(self.A, pd.DataFrame):
-            a = self.A.copy()
-            start, end = outlier.index[0], outlier.index[-1]
-            seasons = [start + pd.DateOffset(months=int(12*s)) for s in range(n_seasons)]
-            seasons = sorted([*seasons, end])
-            achange_base = a.loc[:start, f'A*|[{start.date().isoformat()}]'].copy()
-            residue = dict()
-            for season in seasons:
-                col_target = f'A*|[{season.date().isoformat()}]'
-                if col_target in a.columns:
-                    achange_target = a.loc[:start, col_target]
-                    residue[season] = mean_squared_error(
-                        achange_target / achange_base, 
-                        np.ones_like(achange_base.to_numpy())
-                        )
-                else:
-                    warnings.warn("Se definen más estaciones de las encontradas en la serie") 
-                    break
-            residue = pd.Series(residue).rename('Cambio mse de RY')
-            residue.index.name = 'ds'                   
-            return residue
+            return self._seasons('A', outlier, n_seasons).rename('Cambio mse de RY')
         else:
             raise Exception("Es necesario aplicar método fit a serie")
         
     def C_analysis(self, outlier:pd.Series, n_seasons=4):
         if isinstance(self.C, pd.DataFrame):
-            c = self.C.copy()
-            start, end = outlier.index[0], outlier.index[-1]
-            seasons = [start + pd.DateOffset(months=int(12*s)) for s in range(n_seasons)]
-            seasons = sorted([*seasons, end])
-            c_base = c.loc[:start, f'C*|[{start.date().isoformat()}]'].copy()
-            residue = dict()
-            for season in seasons:
-                col_target = f'C*|[{season.date().isoformat()}]'
-                if col_target in c.columns:
-                    c_target = c.loc[:start, col_target]
-                    residue[season] = mean_squared_error(c_target, c_base)
-                else:
-                    warnings.warn("Se definen más estaciones de las encontradas en la serie")      
-                    break
-            residue = pd.Series(residue).rename('Cambio mse de CY')
-            residue.index.name = 'ds'                   
-            return residue
+            return self._seasons('C', outlier, n_seasons).rename('Cambio mse de CY')
         else:
             raise Exception("Es necesario aplicar método fit a serie")
     
 
 if __name__=='__main__':
     from plotly import express as px
+    from statsmodels.tsa.x13 import x13_arima_analysis
     # print(type(str(check_format("2024/10/12"))))
     # s = pd.Series(np.sin(np.linspace(0, 50, 160) + 2)+ 3*np.cos(np.linspace(0, 100, 160) + 0.6*np.random.randn(160)))
     # s.index = pd.date_range(start="2010-09-01", freq="MS", periods=len(s))
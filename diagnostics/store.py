@@ -0,0 +1,123 @@
+import os
+import sqlite3
+from os.path import join, exists
+
+import pandas as pd
+
+
+# Series que escribe Diagnose.outlier_diags, con los nombres de sus antiguos CSV
+SERIES_METRICS = ('mse_comp_real', 'A%_pre', 'A%_pos', 'MM%_pre', 'MM%_pos', 'RY', 'CY')
+
+
+class DiagnosticsStore():
+    """
+    Almacén único de resultados de diagnóstico (SQLite), indexado por modelo, ventana
+    de outlier y métrica.
+
+    Cada métrica es una serie (`ds`, `value`) o un escalar (`ds` nulo). Reemplaza los
+    CSV sueltos por modelo y ventana: los diagnósticos agregan con `append` y los
+    gráficos leen con `read`, `series` o `pivot` filtrando por índice. Varios procesos
+    pueden escribir en la misma base (cada operación abre su propia conexión).
+
+    >>> store = DiagnosticsStore('data/diagnostics/diagnostics.sqlite')
+    >>> store.append('STLModel', '2020-01-01', '2022-05-01', 'RY', ry)
+    >>> store.pivot('RY', end='2022-05-01')
+    """
+    def __init__(self, path=join('data', 'diagnostics', 'diagnostics.sqlite'), timeout=60) -> None:
+        self.path = path
+        self.timeout = timeout
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as con:
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute("""CREATE TABLE IF NOT EXISTS diagnostics (
+                               model TEXT NOT NULL, start TEXT NOT NULL, end TEXT NOT NULL,
+                               metric TEXT NOT NULL, ds TEXT, value REAL)""")
+            con.execute('CREATE INDEX IF NOT EXISTS key ON diagnostics (model, start, end, metric)')
+            con.execute('CREATE INDEX IF NOT EXISTS metric_key ON diagnostics (metric, end)')
+        con.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    @staticmethod
+    def _date(value) -> str:
+        return pd.Timestamp(value).date().isoformat()
+
+    def append(self, model, start, end, metric, values):
+        """
+        Agrega `values` (pd.Series indexada por fecha, o escalar) como la métrica `metric`
+        de (`model`, ventana [`start`, `end`]). Reemplaza lo que hubiera para esa llave.
+        """
+        key = (model, self._date(start), self._date(end), metric)
+        if isinstance(values, pd.Series):
+            rows = [(*key, self._date(ds), None if pd.isna(value) else float(value)) for ds, value in values.items()]
+        else:
+            rows = [(*key, None, None if pd.isna(values) else float(values))]
+        with self._connect() as con:
+            con.execute('DELETE FROM diagnostics WHERE model=? AND start=? AND end=? AND metric=?', key)
+            con.executemany('INSERT INTO diagnostics VALUES (?, ?, ?, ?, ?, ?)', rows)
+        con.close()
+
+    def append_many(self, model, start, end, metrics:dict):
+        for metric, values in metrics.items():
+            self.append(model, start, end, metric, values)
+
+    def read(self, model=None, start=None, end=None, metric=None) -> pd.DataFrame:
+        """
+        Filas (model, start, end, metric, ds, value) que cumplen los filtros. Cada filtro
+        es un valor, una lista de valores o None (sin filtro).
+        """
+        where, params = [], []
+        for column, value in [('model', model), ('start', start), ('end', end), ('metric', metric)]:
+            if value is None:
+                continue
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            if column in ('start', 'end'):
+                values = [self._date(v) for v in values]
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        query = 'SELECT model, start, end, metric, ds, value FROM diagnostics'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        with self._connect() as con:
+            data = pd.read_sql_query(query + ' ORDER BY model, start, end, metric, ds', con, params=params)
+        con.close()
+        data['ds'] = pd.to_datetime(data['ds'])
+        return data
+
+    def series(self, model, metric, start=None, end=None) -> pd.Series:
+        """Serie de `metric` para `model` y una ventana (si hay una sola, los filtros son opcionales)."""
+        data = self.read(model=model, start=start, end=end, metric=metric)
+        if data[['start', 'end']].drop_duplicates().shape[0] > 1:
+            raise ValueError(f"Hay más de una ventana para {model}/{metric}: indique start y/o end")
+        return data.set_index('ds')['value'].rename(metric)
+
+    def pivot(self, metric, start=None, end=None, models=None) -> pd.DataFrame:
+        """Tabla ds x modelo de `metric` para una ventana, para comparar modelos."""
+        data = self.read(model=models, start=start, end=end, metric=metric)
+        if data[['start', 'end']].drop_duplicates().shape[0] > 1:
+            raise ValueError(f"Hay más de una ventana para {metric}: indique start y/o end")
+        return data.pivot(index='ds', columns='model', values='value')
+
+    def windows(self) -> pd.DataFrame:
+        """Combinaciones (model, start, end) presentes en el almacén."""
+        with self._connect() as con:
+            data = pd.read_sql_query('SELECT DISTINCT model, start, end FROM diagnostics ORDER BY model, start, end', con)
+        con.close()
+        return data
+
+    def import_dir(self, results_path, model, start, end):
+        """Carga los CSV de un directorio de resultados con el formato anterior (`<modelo>/RY.csv`, ...)."""
+        for metric in SERIES_METRICS:
+            file = join(results_path, f'{metric}.csv')
+            if exists(file):
+                data = pd.read_csv(file, index_col=0)
+                self.append(model, start, end, metric, data.iloc[:, 0].set_axis(pd.to_datetime(data.index)))
+
+
+if __name__ == '__main__':
+    # python -m diagnostics.store data/diagnostics/diagnostics.sqlite
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else join('data', 'diagnostics', 'diagnostics.sqlite')
+    print(DiagnosticsStore(path).windows().to_string())
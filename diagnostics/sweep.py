@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from diagnostics import outlier_analysis as oa
+from main import MODELS, model_class, import_data
+from utils.taskgraph import TaskGraph, EXECUTORS
+
+
+def outlier_serie(start, end) -> pd.Series:
+    """Serie indicadora (=1) de la ventana de outlier [start, end], mensual."""
+    index = pd.date_range(start=start, end=end, freq='MS')
+    return pd.Series(1, index=index)
+
+
+def window_grid(starts, ends) -> list:
+    """Combinaciones (inicio, fin) de ventanas con inicio anterior al fin."""
+    starts = [pd.Timestamp(start) for start in starts]
+    ends = [pd.Timestamp(end) for end in ends]
+    return [(start, end) for start in starts for end in ends if start < end]
+
+
+def _sweep_start(serie, model, start, ends):
+    """
+    Diagnósticos de todas las ventanas que comparten `start`.
+
+    Sliding spans solo depende del inicio y el tramo pre-outlier (y su SARIMAX) es
+    el mismo para todos los fines, así que se calculan una vez por inicio; los
+    ajustes repetidos entre ventanas se reutilizan desde el cache del proceso.
+    """
+    span_analist = oa.SlidingOutliers(model())
+    outlier = outlier_serie(start, ends[0])
+    sliding = {'A_mse': span_analist.A_mse(serie, outlier=outlier),
+               'MM_mse': span_analist.MM_mse(serie, outlier=outlier)}
+    saa = span_analist.A_analysis(serie, outlier=outlier)
+    smma = span_analist.MM_analysis(serie, outlier=outlier)
+    sliding.update({'A%_pre': saa['pre_percentage'], 'A%_pos': saa['pos_percentage'],
+                    'MM%_pre': smma['pre_percentage'], 'MM%_pos': smma['pos_percentage']})
+
+    rows = []
+    for end in ends:
+        out_analist = oa.OutlierAnalysis()
+        out_analist.fit(serie, outlier=outlier_serie(start, end))
+        mses = out_analist.model_evolution(model())
+        rows.append({'start': start, 'end': end, **sliding,
+                     'mse_comp_real_mean': mses.mean(), 'mse_comp_real_max': mses.max(),
+                     'mse_comp_real_last': mses.iloc[-1] if len(mses) else np.nan})
+    return rows
+
+
+def _sweep_history(serie, model):
+    """Revision history no depende de la ventana: se ajusta una vez por modelo."""
+    history_analist = oa.RevisionOutlier(model())
+    return history_analist.fit(serie)
+
+
+def sweep(serie:pd.Series, windows, models, executor='process', max_workers=None) -> pd.DataFrame:
+    """
+    Ejecuta los diagnósticos de outlier para cada ventana (inicio, fin) y modelo.
+
+    Las ventanas se agrupan por (modelo, inicio) en una tarea, y revision history en
+    una tarea por modelo, todas en paralelo con `executor`. Retorna una tabla con una
+    fila por (modelo, inicio, fin) y los resúmenes escalares de cada diagnóstico.
+    """
+    windows = sorted(set((pd.Timestamp(start), pd.Timestamp(end)) for start, end in windows))
+    if not windows:
+        raise ValueError("No hay ventanas de outlier válidas (el inicio debe ser anterior al fin)")
+    by_start = {}
+    for start, end in windows:
+        by_start.setdefault(start, []).append(end)
+
+    graph = TaskGraph(executor, max_workers=max_workers)
+    for model in models:
+        # Revision history es la tarea más larga de cada modelo: con su costo se despacha primero
+        graph.add(f'{model.__name__}|history', _sweep_history, serie, model, cost=('history', model.__name__, len(serie)))
+        for start, ends in by_start.items():
+            graph.add(f'{model.__name__}|{start.date()}', _sweep_start, serie, model, start, ends)
+    results = graph.run()
+
+    table = []
+    for model in models:
+        history = results[f'{model.__name__}|history']
+        for start, ends in by_start.items():
+            name = f'{model.__name__}|{start.date()}'
+            for row in results[name]:
+                outlier = outlier_serie(row['start'], row['end'])
+                with np.errstate(all='ignore'):
+                    ry = history.A_analysis(outlier=outlier)
+                    cy = history.C_analysis(outlier=outlier)
+                table.append({'model': model.__name__, **row, 'RY_mean': ry.mean(), 'CY_mean': cy.mean(),
+                              'segundos': graph.timings[name]})
+    return pd.DataFrame(table).set_index(['model', 'start', 'end']).sort_index()
+
+
+def _dates(value) -> list:
+    """Fechas separadas por coma, o un rango 'inicio:fin:paso_meses'."""
+    if ':' in value:
+        start, end, step = value.split(':')
+        return list(pd.date_range(start=start, end=end, freq=f'{int(step)}MS'))
+    return [pd.Timestamp(date) for date in value.split(',') if date]
+
+
+def load_serie(path, column='td') -> pd.Series:
+    """Serie `column` del CSV de entrada de 'main.py -i', mensual e indexada por 'ds'."""
+    serie = import_data(path)[column].rename_axis('ds')
+    serie.index.freq = 'MS'
+    return serie
+
+
+if __name__ == '__main__':
+    # python -m diagnostics.sweep -i data/preprocess/tasa_oficial.csv --models stl,x11 \
+    #     --starts 2020-01-01,2020-03-01 --ends 2021-11-01:2022-11-01:3
+    parser = argparse.ArgumentParser(description='Sensibilidad de los diagnósticos a la ventana de outlier.')
+    parser.add_argument('-i', '--input', required=True, help="CSV de entrada (separado por ';', columnas 'ano' y 'mes').")
+    parser.add_argument('--column', default='td', help="Serie a diagnosticar. Por defecto: 'td'.")
+    parser.add_argument('--models', default='x13,stl,cissa', help="Modelos separados por coma. Por defecto: 'x13,stl,cissa'.")
+    parser.add_argument('--starts', default='2020-01-01', help="Inicios de la ventana: fechas separadas por coma o 'inicio:fin:paso_meses'.")
+    parser.add_argument('--ends', default='2021-11-01:2022-11-01:3', help="Fines de la ventana, mismo formato que '--starts'.")
+    parser.add_argument('--executor', default='process', choices=EXECUTORS)
+    parser.add_argument('--workers', type=int, default=None, help='Número de workers. Por defecto: CPUs disponibles.')
+    parser.add_argument('-o', '--output', default=os.path.join('data', 'diagnostics', 'sweep.csv'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    unknown = [name for name in args.models.split(',') if name not in MODELS]
+    if unknown:
+        logging.error(f"Modelos inválidos: {unknown}. Valores permitidos: {list(MODELS)}")
+        sys.exit(1)
+
+    windows = window_grid(_dates(args.starts), _dates(args.ends))
+    models = [model_class(name) for name in args.models.split(',')]
+    logging.info(f"Barrido de {len(windows)} ventanas x {len(models)} modelos")
+    start_time = time.perf_counter()
+    table = sweep(load_serie(args.input, args.column), windows, models, args.executor, args.workers)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    table.to_csv(args.output, sep=';')
+    logging.info(f"Resultados en {args.output} ({time.perf_counter() - start_time:.1f} s)")
@@ -0,0 +1,63 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.x13 import _find_x12
+
+from models.x11 import X11Model
+from models.x13_model import X13Model
+
+
+def synthetic_series(n_years=15, seed=0, level=8.0, amplitude=0.6, noise=0.1, start='2010-01-01'):
+    """Serie mensual con tendencia, estacionalidad de amplitud variable y ruido."""
+    rng = np.random.default_rng(seed)
+    n = 12 * n_years
+    t = np.arange(n)
+    trend = level + 0.5 * np.sin(2 * np.pi * t / (7 * 12)) + 0.01 * t
+    season = amplitude * (1 + 0.2 * t / n) * np.sin(2 * np.pi * t / 12 + rng.uniform(0, np.pi))
+    index = pd.date_range(start=start, periods=n, freq='MS')
+    return pd.Series(trend + season + noise * rng.standard_normal(n), index=index, name=f'sint_{seed}')
+
+
+def compare_x11(serie:pd.Series, x11_hiperparams=None, x13_hiperparams=None, edge=12) -> dict:
+    """
+    Compara la serie desestacionalizada por X11Model con la de X13Model (x13as, modo X-11).
+    `edge` meses en cada extremo se excluyen de las métricas interiores.
+    """
+    x11 = X11Model() if x11_hiperparams is None else X11Model(x11_hiperparams)
+    x13 = X13Model() if x13_hiperparams is None else X13Model(x13_hiperparams)
+    a = x11.fit(serie).adjust().seasadj
+    b = x13.fit(serie).adjust().seasadj
+    diff = (a - b).to_numpy()
+    interior = diff[edge:-edge]
+    seasonal_a, seasonal_b = serie - a, serie - b
+    return {
+        'serie': serie.name,
+        'n': len(serie),
+        'max_abs': np.abs(diff).max(),
+        'rmse': np.sqrt(np.mean(diff**2)),
+        'max_abs_interior': np.abs(interior).max(),
+        'rmse_interior': np.sqrt(np.mean(interior**2)),
+        'corr_estacional': np.corrcoef(seasonal_a, seasonal_b)[0, 1],
+    }
+
+
+def comparison_suite(series=None) -> pd.DataFrame:
+    """Ejecuta la comparación sobre `series` (lista de pd.Series); por defecto, series sintéticas."""
+    if series is None:
+        series = [synthetic_series(n_years, seed) for n_years in (5, 10, 20) for seed in range(3)]
+    return pd.DataFrame([compare_x11(serie) for serie in series]).set_index('serie')
+
+
+if __name__ == '__main__':
+    series = None
+    if len(sys.argv) > 1:
+        # python -m diagnostics.x11_comparison data/preprocess/tasa_oficial.csv
+        data = pd.read_csv(sys.argv[1], sep=';')
+        data.index = pd.to_datetime(data.pop('ano').astype(str) + '-' + data.pop('mes').astype(str) + '-01')
+        data.index.freq = 'MS'
+        series = [data[col].rename(col) for col in data.columns]
+    if not _find_x12(os.getenv('X13PATH')):
+        print("No se encontró x13as. Defina X13PATH para comparar contra X13.")
+        sys.exit(1)
+    print(comparison_suite(series).round(4).to_string())
@@ -1,14 +1,16 @@
+import copy
 from os import path
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.x13 import x13_arima_analysis
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from plotly import graph_objects as go
+from numpy.lib.stride_tricks import sliding_window_view
 import warnings
 from statsmodels.tools.sm_exceptions import X13Warning, ConvergenceWarning, ValueWarning, X13Error
 from sklearn.metrics import mean_squared_error
 
 from models.base import BaseModel
+from diagnostics.adjustment_cache import ADJUSTMENT_CACHE
+from utils.instrument import traced_method
+from utils.shared import SharedArray, SharedSeries
 
 # from ..tools.exceptions import FormatoFechaError
 warnings.simplefilter('ignore', category=X13Warning)
@@ -33,37 +35,50 @@ def check_format(date):
 x13as_path = path.abspath("C:/Program Files/x13as")
 class SlidingSpans():
     # Considero mejor definir el modelo en el init, es decir, por objecto, a diferencia de outlier.OutlierAnalysis
-    def __init__(self, model:BaseModel, sliding_len=12, span_len=48) -> None:
+    def __init__(self, model:BaseModel, sliding_len=12, span_len=48, executor=None, max_workers=None) -> None:
         self.model = model
         self.sliding_len = sliding_len
         self.span_len = span_len
+        # Con `executor` ('thread' o 'process') y sin ajuste por lotes, cada span es una tarea
+        self.executor = executor
+        self.max_workers = max_workers
         self.A = None
         self._A_ratio, self._MM_ratio = None, None
         self.A_metric, self.MM_metric = None, None
 
+    @traced_method
     def fit(self, serie:pd.Series, inverse=False):
         origin = serie.copy()
         A = pd.DataFrame(index=origin.index)
         if not inverse:
-            slide_iter = range(0, len(origin.index)-self.span_len, self.sliding_len)
-            j_sets = iter(origin.iloc[j_index:j_index+self.span_len].copy() for j_index in slide_iter)
+            starts = list(range(0, len(origin.index)-self.span_len, self.sliding_len))
         else:
-            slide_iter = range(len(origin.index), self.span_len, -self.sliding_len)
-            j_sets = iter(origin.iloc[j_index-self.span_len:j_index].copy() for j_index in slide_iter)
+            starts = [j_index-self.span_len for j_index in range(len(origin.index), self.span_len, -self.sliding_len)]
+        j_sets = iter(origin.iloc[j_index:j_index+self.span_len].copy() for j_index in starts)
+
+        if getattr(self.model, 'supports_batch', False) and isinstance(origin, pd.Series) and not origin.isna().any():
+            try:
+                A = self._fit_batch(origin, starts)
+                j_sets = iter(())
+            except ValueError:
+                # Se repite span por span para reproducir el comportamiento (y errores) del modelo
+                pass
+        if len(A.columns) == 0 and self.executor not in (None, 'serial') and isinstance(origin, pd.Series):
+            A = self._fit_parallel(origin, starts)
+            j_sets = iter(())
 
         # for n, j_index in enumerate(range(0, len(origin.index)-self.span_len, self.sliding_len)):
             # j_set = origin.iloc[j_index:j_index+self.span_len].copy()
         for n, j_set in enumerate(j_sets):   
             try:
-                self.model.fit(endog=j_set)
-                x13j = self.model.adjust()
+                seasadj = ADJUSTMENT_CACHE.seasadj(self.model, j_set)
                 # if self.model.__name__== 'x13_arima_analysis':
                     # x13j = self.model(
                     #     endog=j_set,
                     #     maxorder=(1,1),
                     #     x12path=x13as_path,
                     #     outlier=False)
-                Aj = x13j.seasadj.rename(f'A^{n+1}')
+                Aj = seasadj.rename(f'A^{n+1}')
                 A = pd.concat([A, Aj], axis=1)
             except X13Error as e:
                 X13Error("Para modelo X13 span_len debe ser 36 o superior (más de 3 años) ")
@@ -71,6 +86,40 @@ class SlidingSpans():
             raise X13Error("Serie debe ser de 3 años o más para desestacionalizar con X13 y para realizar diagnóstico")
         self.A = A.replace(np.nan, pd.NA)
         return self
+
+    def _fit_batch(self, origin:pd.Series, starts) -> pd.DataFrame:
+        """
+        Todos los spans tienen span_len observaciones: se apilan como filas de una vista
+        deslizante de la serie, se ajustan en una sola llamada a adjust_batch y cada
+        fila se devuelve a sus fechas en la matriz de spans.
+        """
+        spans = sliding_window_view(origin.to_numpy(dtype=float), self.span_len)[starts]
+        indexes = [origin.index[j_index:j_index+self.span_len] for j_index in starts]
+        adjusted = ADJUSTMENT_CACHE.seasadj_batch(self.model, spans, indexes)
+        A = np.full((len(origin), len(starts)), np.nan)
+        rows = np.add.outer(starts, np.arange(self.span_len))
+        A[rows, np.arange(len(starts))[:, None]] = adjusted
+        return pd.DataFrame(A, index=origin.index, columns=[f'A^{n+1}' for n in range(len(starts))])
+    
+    def _fit_parallel(self, origin:pd.Series, starts) -> pd.DataFrame:
+        """
+        Un span por tarea de un TaskGraph. Con procesos, la serie y la matriz de spans van
+        en memoria compartida: cada worker lee su span y escribe su columna.
+        """
+        from utils.taskgraph import TaskGraph
+        shared = self.executor == 'process'
+        columns = [f'A^{n+1}' for n in range(len(starts))]
+        with SharedArray((len(origin), len(starts)), fill=np.nan, shared=shared) as matrix, \
+                SharedSeries(origin, shared=shared) as source:
+            graph = TaskGraph(self.executor, max_workers=self.max_workers)
+            for n, j_index in enumerate(starts):
+                graph.add(columns[n], adjust_into, matrix.handle, source.handle, copy.deepcopy(self.model), n,
+                          j_index, j_index + self.span_len, (X13Error,), cost=('adjust', type(self.model).__name__, self.span_len))
+            fitted = graph.run()
+            # Como en el ajuste span por span, los spans que X13 no puede ajustar se omiten;
+            # la selección copia la matriz antes de liberar el bloque compartido
+            A = pd.DataFrame(matrix.array, index=origin.index, columns=columns, copy=False).loc[:, [fitted[column] for column in columns]]
+        return A
     
     def min(self, serie:pd.Series):
          serie = serie.dropna()
@@ -109,37 +158,67 @@ class SlidingSpans():
             raise Exception("The diagnostic must be fit before calling A ratio")
         
     def predict(self):
-        self.A_metric = self._A_ratio['success'].sum()/len(self._A_ratio['success'])
-        self.MM_metric = self._MM_ratio['success'].sum()/len(self._MM_ratio['success'])
+        # Cada métrica requiere su ratio; A_analysis y MM_analysis calculan solo uno de ellos
+        if self._A_ratio is not None:
+            self.A_metric = self._A_ratio['success'].sum()/len(self._A_ratio['success'])
+        if self._MM_ratio is not None:
+            self.MM_metric = self._MM_ratio['success'].sum()/len(self._MM_ratio['success'])
         return {'A%':self.A_metric, 'MM%': self.MM_metric}
 
 class RevisionHistory():
-    def __init__(self, model:BaseModel) -> None:
+    def __init__(self, model:BaseModel, executor=None, max_workers=None) -> None:
         self.model = model
+        # Con `executor` ('thread' o 'process') cada vintage es una tarea de un TaskGraph
+        self.executor = executor
+        self.max_workers = max_workers
         self.A = None
         self.C = None
         self.T = None
 
-    def fit(self, serie:pd.Series):
+    @staticmethod
+    def vintage_dates(serie:pd.Series):
+        """Último mes de cada vintage: prefijos de 4 meses a la serie completa."""
+        return serie.index[3:]
+
+    @traced_method
+    def fit(self, serie:pd.Series, vintages=None):
+        """
+        Ajusta cada prefijo de `serie`. `vintages` = (matriz, ajustados) entrega los
+        vintages ya calculados por separado, p. ej. por tareas del grafo de diagnóstico:
+        la matriz (len(serie), len(vintage_dates)) tiene en cada columna la serie
+        desestacionalizada de un prefijo (NaN después de su fin) y `ajustados` indica
+        qué vintages se pudieron ajustar.
+        """
         origin = serie.copy()
-        A = pd.DataFrame(index=origin.index)
-        for date_n in serie.index[3:]:
-            subserie_n = origin[:date_n]
-            try:
-                # if self.model.__name__== 'x13_arima_analysis':
-                self.model.fit(endog=subserie_n)
-                x13j = self.model.adjust()
-                    # x13j = self.model(
-                    #     endog=subserie_n,
-                    #     maxorder=(1,1),
-                    #     x12path=x13as_path,
-                    #     outlier=False)
-                An = x13j.seasadj.rename(f'A*|[{date_n.date()}]')
-                A = pd.concat([A, An], axis=1)
-            # except X13Error as e:
-                # pass
-            except:
-                pass
+        dates = self.vintage_dates(origin)
+        if vintages is not None:
+            return self._set_vintages(origin, dates, *vintages)
+        # Con procesos, la serie y la matriz de vintages van en memoria compartida: cada
+        # worker lee su prefijo y escribe su columna sin pasar por pickle
+        shared = self.executor == 'process'
+        with SharedArray((len(origin), len(dates)), fill=np.nan, shared=shared) as matrix, \
+                SharedSeries(origin, shared=shared) as source:
+            fitted = self._fit_vintages(dates, matrix.handle, source.handle)
+            return self._set_vintages(origin, dates, matrix.array, fitted)
+
+    def _fit_vintages(self, dates, target, source) -> list:
+        if self.executor in (None, 'serial'):
+            return [adjust_into(target, source, self.model, k, 0, k + 4) for k in range(len(dates))]
+        from utils.taskgraph import TaskGraph
+        graph = TaskGraph(self.executor, max_workers=self.max_workers)
+        for k in range(len(dates)):
+            # Una copia por tarea: con hilos, los ajustes no comparten el estado del modelo.
+            # Los prefijos más largos cuestan más: el grafo los despacha primero
+            graph.add(str(dates[k].date()), adjust_into, target, source, copy.deepcopy(self.model), k, 0, k + 4,
+                      cost=('vintage', type(self.model).__name__, k + 4))
+        results = graph.run()
+        return [results[str(date_n.date())] for date_n in dates]
+
+    def _set_vintages(self, origin:pd.Series, dates, matrix:np.ndarray, fitted):
+        # La matriz se envuelve sin copiarla; la selección de columnas ajustadas hace la
+        # única copia, de modo que un bloque compartido se puede liberar después
+        A = pd.DataFrame(matrix, index=origin.index, columns=[f'A*|[{date_n.date()}]' for date_n in dates], copy=False)
+        A = A.loc[:, np.asarray(fitted, dtype=bool)]
         if A.empty or len(A.columns)<2:
             raise X13Error("Serie muy corta para relizar diagnóstico")
         self.A = A.replace(np.nan, pd.NA).copy()
@@ -169,7 +248,23 @@ class RevisionHistory():
         return self.A_change(self.T, t).iloc[-1]
 
 
+def adjust_into(target, source, model, column, start, end, errors=(Exception,)) -> bool:
+    """
+    Desestacionaliza el tramo [start, end) de la serie `source` (handle de SharedSeries)
+    con `model` y lo escribe en la columna `column` de `target` (handle de SharedArray).
+    Retorna False si el ajuste lanza alguno de `errors`. Nivel de módulo para poder
+    enviarse a procesos: solo viajan los handles, no la serie ni el resultado.
+    """
+    try:
+        seasadj = ADJUSTMENT_CACHE.seasadj(model, SharedSeries.read(source, start, end))
+    except errors:
+        return False
+    SharedArray.attach(target)[start:end, column] = seasadj.to_numpy(dtype=float)
+    return True
+
+
 if __name__=='__main__':
+    from statsmodels.tsa.x13 import x13_arima_analysis
     # print(type(str(check_format("2024/10/12"))))
     # s = pd.Series(np.sin(np.linspace(0, 50, 160) + 2)+ 3*np.cos(np.linspace(0, 100, 160) + 0.6*np.random.randn(160)))
     # s.index = pd.date_range(start="2010-09-01", freq="MS", periods=len(s))
@@ -5,22 +5,19 @@ import time
 import sys
 import shlex
 import shutil
-from tqdm import tqdm
+import importlib
 
-import matplotlib
-import matplotlib.pyplot as plt
-import pandas as pd
-
-from models.x13_model import X13Model
-from models.stl import STLModel
-from models.cissa import CiSSAModel
-
-from utils.diagnose import Diagnose
-from utils.preprocess import ENE
+# Solo dependencias livianas a nivel de módulo: pandas, matplotlib, statsmodels y los
+# modelos se importan dentro de la función que los usa, de modo que '--help', la
+# validación de argumentos y las reejecuciones sin cambios partan rápido.
+from utils.pipeline import Pipeline, STAGES, file_signature, dir_signature
+from utils.instrument import profile_run, PROFILERS
+from utils.scheduler import CostModel
 
 #%% MODELS
 def apply_x13(series):
     """Realiza la desestacionalización X13-ARIMA-SEATS."""
+    from models.x13_model import X13Model
     try:
         x13_model = X13Model()
         x13_model.fit(series)
@@ -31,6 +28,7 @@ def apply_x13(series):
 
 def apply_stl(series):
     """Realiza la desestacionalización STL."""
+    from models.stl import STLModel
     try:
         stl_model = STLModel()
         stl_model.fit(series)
@@ -41,6 +39,7 @@ def apply_stl(series):
 
 def apply_cissa(series):
     """Realiza la desestacionalización CiSSA."""
+    from models.cissa import CiSSAModel
     try:
         cissa_model = CiSSAModel()
         cissa_model.fit(series)
@@ -49,9 +48,21 @@ def apply_cissa(series):
     except Exception as e:
         raise RuntimeError(f"Error en CiSSA: {e}")
 
+def apply_x11(series):
+    """Realiza la desestacionalización X-11 en proceso (sin x13as)."""
+    from models.x11 import X11Model
+    try:
+        x11_model = X11Model()
+        x11_model.fit(series)
+        x11_model.adjust()
+        return x11_model.seasadj
+    except Exception as e:
+        raise RuntimeError(f"Error en X-11: {e}")
+
 
 #%% IMPORT DATA
 def import_data(file_dir):
+    import pandas as pd
     try:
         data = pd.read_csv(file_dir, sep=';')
         data['date'] = pd.to_datetime(data['ano'].astype(str) + '-' + data['mes'].astype(str) + '-01')
@@ -70,6 +81,8 @@ def import_data(file_dir):
 #%% PLOT
 def plot_series(original_series, trend_series, method_name, output_dir, usetex=False):
     """Plot the original and trend series."""
+    import matplotlib
+    import matplotlib.pyplot as plt
     if usetex:
         plt.rc('text', usetex=True)
         plt.rc('font', family='serif')
@@ -86,33 +99,21 @@ def plot_series(original_series, trend_series, method_name, output_dir, usetex=F
     plt.savefig(plot_filename)
     plt.close()
 
-#%% MAIN
-def main(args):
-
-    logging.info("Starting the STD process...")
-    
-    if not os.path.isfile(args.input):
-        logging.warning(f"El archivo de entrada '{args.input}' no existe."
-            "Inferiendo a partir de datos anuales y/o mensuales."
-            "Este proceso puede requerir conexión a la base de datos pública del INE.")
-
-        
-    # =========================================================================
-    # TRANSFORM ENE
-    # =========================================================================
+#%% STAGES
+def run_download(ene):
+    """Descarga los archivos mensuales nuevos desde la base de datos del INE."""
+    logging.info("Descargando datos desde la base de datos del INE.")
+    return ene.nuevos_datos()
 
-    ene = ENE()
-    if not os.path.exists(args.input):
+def run_aggregate(ene, input_file, dedup=False):
+    """Agrega los microdatos crudos en la tabla de niveles y tasas."""
+    if not os.path.exists(input_file):
         ene.groupby_cae('anual')
-    
-    # TODO: Siempre descarga datos?
-    logging.info("Descargando datos desde la base de datos del INE.")
-    ene.nuevos_datos()
-    ene.groupby_cae('mensual')
+    ene.groupby_cae('mensual', dedup=dedup)
+    return input_file
 
-    # =========================================================================
-    # IMPORT DATA
-    # =========================================================================
+def run_import(args):
+    """Importa el archivo de entrada como DataFrame indexado por fecha."""
     logging.info("Iniciando la importación de datos...")
     ti = time.time()
     timeout = 60
@@ -130,49 +131,49 @@ def main(args):
     except RuntimeError as e:
         logging.error(str(e), exc_info=args.show_traceback)
         sys.exit(1)
-        
-    # # =========================================================================
-    # # IMPORT DATA
-    # # =========================================================================
-    # logging.info("Iniciando la importación de datos...")
-    # ti = time.time()
-    # timeout = 60
-    
-    # try:
-    #     data = import_data(args.input)
-    #     logging.info(f"Archivo '{args.input}' importado exitosamente.")
-        
-    #     # Explicitly flush logs
-    #     for handler in logging.getLogger().handlers:
-    #         if isinstance(handler, logging.StreamHandler):
-    #             handler.flush()
-    # except FileNotFoundError:
-    #     wait = time.time() - ti
-    #     if wait < timeout:
-    #         logging.error(f"Archivo '{args.input}' no encontrado después de {wait:.2f} segundos.")
-    #     else:
-    #         logging.error(f"Archivo '{args.input}' no encontrado. Tiempo de espera agotado ({timeout} segundos).")
-        
-    #     # Explicitly flush logs
-    #     for handler in logging.getLogger().handlers:
-    #         if isinstance(handler, logging.StreamHandler):
-    #             handler.flush()
-        
-    #     sys.exit(1)
-    # except RuntimeError as e:
-    #     logging.error(str(e), exc_info=args.show_traceback)
-        
-    #     # Explicitly flush logs
-    #     for handler in logging.getLogger().handlers:
-    #         if isinstance(handler, logging.StreamHandler):
-    #             handler.flush()
-        
-    #     sys.exit(1)
+    return data
+
+def adjust_projected(series, args, store):
+    """
+    Desestacionaliza con factores proyectados guardados; solo reajusta el modelo cuando
+    los factores no existen, expiraron o no cubren las fechas nuevas.
+    """
+    model = selected_model(args)()
+    factors, meta = store.load(type(model).__name__, series.name)
+    if store.needs_refit(model, series, factors, meta, max_age_days=args.refit_days):
+        logging.info(f"Reajustando {type(model).__name__} y proyectando factores para '{series.name}'...")
+        model.fit(series)
+        model.adjust()
+        store.save(model, series.name, model.projected_factors(horizon=12))
+        return model.seasadj
+    logging.info(f"Aplicando factores proyectados (ajuste hasta {meta['fitted_until']}) a '{series.name}'.")
+    return model.adjust_projected(series, factors).seasadj
+
+def factor_files(data, args):
+    """Factores proyectados que escribe la etapa 'adjust' (ninguno con ajuste concurrente)."""
+    from models.projection import FactorStore
+    if args.adjustment != 'projected':
+        return []
+    return FactorStore(os.path.join('data', 'factors')).files(MODELS[model_name(args)][1], data.columns)
+
+def run_adjust(data, args):
+    """Desestacionaliza cada serie con el método seleccionado."""
+    import pandas as pd
+    from tqdm import tqdm
+    from models.projection import FactorStore
+    model_class = selected_model(args)
+    if args.adjustment == 'concurrent' and model_class.supports_batch and not data.isna().any().any():
+        # Todas las series tienen el mismo largo: se ajustan como filas de una sola matriz
+        logging.info(f"Desestacionalizando {data.shape[1]} series en un solo lote con {model_class.__name__}...")
+        try:
+            seasadj = model_class().adjust_batch(data.to_numpy(dtype=float).T)
+            logging.info("Proceso de desestacionalización completado.")
+            return pd.DataFrame(seasadj.T, index=data.index, columns=[f"{col}_std" for col in data.columns])
+        except ValueError as e:
+            logging.warning(f"Ajuste por lotes falló ({e}); se ajustará serie por serie.")
 
-    # =========================================================================
-    # APPLY STD METHODS
-    # =========================================================================
     deseasonalised_series = {}
+    store = FactorStore(os.path.join('data', 'factors'))
     
     # Use tqdm to show progress as we process each series_name
     for series_name in tqdm(data.columns, desc="Desestacionalizando series"):
@@ -180,7 +181,9 @@ def main(args):
         logging.info(f"Iniciando desestacionalización para la serie: {series_name}")
         
         try:
-            if args.x13:
+            if args.adjustment == 'projected':
+                deseasonalised_series[f"{series_name}_std"] = adjust_projected(series, args, store)
+            elif args.x13:
                 logging.info("Aplicando desestacionalización X13-ARIMA-SEATS...")
                 deseasonalised_series[f"{series_name}_std"] = apply_x13(series)
             elif args.stl:
@@ -189,76 +192,115 @@ def main(args):
             elif args.cissa:
                 logging.info("Aplicando desestacionalización CiSSA...")
                 deseasonalised_series[f"{series_name}_std"] = apply_cissa(series)
-        except RuntimeError as e:
+            elif args.x11:
+                logging.info("Aplicando desestacionalización X-11...")
+                deseasonalised_series[f"{series_name}_std"] = apply_x11(series)
+        except (RuntimeError, ValueError) as e:
             logging.error(str(e), exc_info=args.show_traceback)
             continue
     
-    deseasonalised_df = pd.DataFrame(deseasonalised_series)
-    results = pd.concat([data, deseasonalised_df], axis=1)
     logging.info("Proceso de desestacionalización completado.")
+    return pd.DataFrame(deseasonalised_series)
+
+def outlier_window():
+    """Serie indicadora del periodo outlier de pandemia."""
+    import pandas as pd
+    outlier_serie = pd.Series(pd.date_range(start='2020-01-01', end='2022-05-01', freq='MS'))
+    outlier_serie.index = pd.DatetimeIndex(outlier_serie)
+    outlier_serie.loc[:] = 1
+    return outlier_serie
+
+# Módulo y clase de cada modelo; se importan solo al usarse (ver model_class)
+MODELS = {'x13': ('models.x13_model', 'X13Model'), 'stl': ('models.stl', 'STLModel'),
+          'cissa': ('models.cissa', 'CiSSAModel'), 'x11': ('models.x11', 'X11Model')}
+MODEL_LABELS = {'X13Model': 'X13-ARIMA-SEATS', 'STLModel': 'STL', 'CiSSAModel': 'CiSSA', 'X11Model': 'X-11'}
+
+def model_class(name):
+    """Clase del modelo `name` ('x13', 'stl', 'cissa' o 'x11'), importando su módulo."""
+    module, cls = MODELS[name]
+    return getattr(importlib.import_module(module), cls)
+
+def selected_model(args):
+    return model_class(model_name(args))
+
+def diagnosed_models(args):
+    """Clases de modelo a diagnosticar: las de '--diagnose-models' o el método seleccionado."""
+    if args.diagnose_models:
+        return [model_class(name) for name in args.diagnose_models]
+    return [selected_model(args)]
+
+def run_diagnostics_parallel(tasa, outlier_serie, models, args, costs=None):
+    """Diagnostica cada modelo en su propio proceso y reporta el tiempo de cada uno."""
+    from utils.diagnose import diagnose_model
+    from utils.taskgraph import TaskGraph
+    executor = None if args.diag_executor == 'auto' else args.diag_executor
+    # Los workers de cada modelo se reparten las CPUs disponibles
+    max_workers = max(1, (os.cpu_count() or 1) // len(models))
+    # Solo este grafo guarda los tiempos: los de cada modelo corren en otros procesos
+    graph = TaskGraph('process', max_workers=len(models), costs=costs)
+    for model in models:
+        # Con el costo estimado, los modelos más lentos (X13) parten primero
+        graph.add(model.__name__, diagnose_model, tasa, outlier_serie, model, executor, max_workers,
+                  cost=('diagnose', model.__name__, len(tasa)))
+    # Los errores de cada modelo se reportan abajo; los del pool (p. ej. al iniciarlo) se propagan
+    graph.run(raise_errors=False)
+    for model in models:
+        label = MODEL_LABELS[model.__name__]
+        if model.__name__ in graph.timings:
+            logging.info(f"Diagnóstico para {label} completado en {graph.timings[model.__name__]:.1f} s.")
+        else:
+            error = graph.errors.get(model.__name__)
+            logging.error(f"Error al ejecutar diagnóstico con {label}: {type(error).__name__}: {error}")
+    if graph.errors:
+        sys.exit(1)
+
+def run_diagnostics(data, args, costs=None):
+    """
+    Ejecuta los diagnósticos de outlier para el método seleccionado o los de
+    '--diagnose-models'. Retorna los nombres de clase de los modelos diagnosticados.
+    """
+    from utils.diagnose import Diagnose
+    logging.info("Iniciando diagnóstico de series temporales...")
     
-    # =========================================================================
-    # RUN DIAGNOSTICS
-    # =========================================================================
-    
-    if args.diagnose:
-        logging.info("Iniciando diagnóstico de series temporales...")
+    try:
+        tasa = data[['td']].copy()
+        tasa.index.name = 'ds'
+        tasa = tasa['td']
+        logging.info("Datos de diagnóstico preparados exitosamente.")
+
+        outlier_serie = outlier_window()
+        logging.info("Serie de outliers de pandemia creada exitosamente.")
+
+        if args.diagnose_models:
+            run_diagnostics_parallel(tasa, outlier_serie, diagnosed_models(args), args, costs=costs)
+            return [model.__name__ for model in diagnosed_models(args)]
+
+        diag = Diagnose(tasa)
+        diag.set_outlier(outlier_serie)
+        logging.info("Diagnóstico inicializado correctamente.")
         
+        model = selected_model(args)
+        model_label = MODEL_LABELS[model.__name__]
+        logging.info(f"Ejecutando diagnóstico para {model_label}...")
         try:
-            tasa = data[['td']].copy()
-            tasa.index.name = 'ds'
-            tasa = tasa['td']
-            logging.info("Datos de diagnóstico preparados exitosamente.")
-    
-            outlier_serie = pd.Series(pd.date_range(start='2020-01-01', end='2022-05-01', freq='MS'))
-            outlier_serie.index = pd.DatetimeIndex(outlier_serie)
-            outlier_serie.loc[:] = 1
-            logging.info("Serie de outliers de pandemia creada exitosamente.")
-    
-            diag = Diagnose(tasa)
-            diag.set_outlier(outlier_serie)
-            logging.info("Diagnóstico inicializado correctamente.")
-            
-            if args.x13:
-                logging.info("Ejecutando diagnóstico para X13-ARIMA-SEATS...")
-                try:
-                    diag.outlier_diags(X13Model)
-                    logging.info("Diagnóstico para X13-ARIMA-SEATS completado exitosamente.")
-                except Exception as e:
-                    logging.error(f"Error al ejecutar diagnóstico con X13-ARIMA-SEATS: {type(e).__name__}: {e}", 
-                                  exc_info=args.show_traceback)
-                    sys.exit(1)
-    
-            if args.stl:
-                logging.info("Ejecutando diagnóstico para STL...")
-                try:
-                    diag.outlier_diags(STLModel)
-                    logging.info("Diagnóstico para STL completado exitosamente.")
-                except Exception as e:
-                    logging.error(f"Error al ejecutar diagnóstico con STL: {type(e).__name__}: {e}", 
-                                  exc_info=args.show_traceback)
-                    sys.exit(1)
-    
-            if args.cissa:
-                logging.info("Ejecutando diagnóstico para CiSSA...")
-                try:
-                    diag.outlier_diags(CiSSAModel)
-                    logging.info("Diagnóstico para CiSSA completado exitosamente.")
-                except Exception as e:
-                    logging.error(f"Error al ejecutar diagnóstico con CiSSA: {type(e).__name__}: {e}", 
-                                  exc_info=args.show_traceback)
-                    sys.exit(1)
-    
+            diag.outlier_diags(model, executor=None if args.diag_executor == 'auto' else args.diag_executor, costs=costs)
+            logging.info(f"Diagnóstico para {model_label} completado exitosamente.")
         except Exception as e:
-            logging.critical(f"Error crítico durante la preparación de diagnóstico: {type(e).__name__}: {e}", 
-                             exc_info=args.show_traceback)
+            logging.error(f"Error al ejecutar diagnóstico con {model_label}: {type(e).__name__}: {e}", 
+                          exc_info=args.show_traceback)
             sys.exit(1)
 
+    except Exception as e:
+        logging.critical(f"Error crítico durante la preparación de diagnóstico: {type(e).__name__}: {e}", 
+                         exc_info=args.show_traceback)
+        sys.exit(1)
+    return [model.__name__]
 
-    # =========================================================================
-    # CALCULATE UNEMPLOYMENT RATES
-    # =========================================================================
-    
+def compute_rates(data, deseasonalised_df, args):
+    """Calcula las tasas de desocupación originales y desestacionalizadas."""
+    import pandas as pd
+    from tqdm import tqdm
+    results = pd.concat([data, deseasonalised_df], axis=1)
     logging.info("Iniciando cálculo de tasas de desempleo...")
     
     # List of columns required for calculation
@@ -304,67 +346,64 @@ def main(args):
     except Exception as e:
         logging.error(f"Error inesperado durante el cálculo de tasas de desempleo: {type(e).__name__}: {e}", exc_info=args.show_traceback)
         sys.exit(1)
+    return results
 
+COL_MEANING = {
+    'dh15': 'Desocupados hombres 15 a 24', 
+    'dm15': 'Desocupados mujeres 15 a 24', 
+    'dh25': 'Desocupados hombres 25 o más', 
+    'dm25': 'Desocupados mujeres 25 o más', 
+    'oh15': 'Ocupados hombres 15 a 24', 
+    'om15': 'Ocupados mujeres 15 a 24', 
+    'oh25': 'Ocupados hombres 25 o más', 
+    'om25': 'Ocupados mujeres 25 o más',
+    'd': 'Total desocupados', 
+    'o': 'Total ocupados', 
+    'dh': 'Desocupados hombres', 
+    'dm': 'Desocupados mujeres', 
+    'oh': 'Ocupados hombres', 
+    'om': 'Ocupados mujeres', 
+    'fh': 'Fuerza de trabajo hombres', 
+    'fm': 'Fuerza de trabajo mujeres', 
+    'ft': 'Fuerza de trabajo total',
+    'tdh': 'Tasa desocupados hombres',
+    'tdm': 'Tasa desocupados mujeres', 
+    'td': 'Tasa desocupados'
+}
 
-    # =========================================================================
-    # PLOTTING
-    # =========================================================================
-    
-    # Create plot directory if needed
-    if args.plot:
-        if not os.path.exists(args.plot_dir):
-            os.makedirs(args.plot_dir, exist_ok=True)
-            logging.info(f"Directorio de gráficos creado: {args.plot_dir}")
-    
-        logging.info("Iniciando generación de gráficos...")
-            
-        model_name = 'x13' if args.x13 else 'stl' if args.stl else 'cissa'
-        
-        col_meaning = {
-            'dh15': 'Desocupados hombres 15 a 24', 
-            'dm15': 'Desocupados mujeres 15 a 24', 
-            'dh25': 'Desocupados hombres 25 o más', 
-            'dm25': 'Desocupados mujeres 25 o más', 
-            'oh15': 'Ocupados hombres 15 a 24', 
-            'om15': 'Ocupados mujeres 15 a 24', 
-            'oh25': 'Ocupados hombres 25 o más', 
-            'om25': 'Ocupados mujeres 25 o más',
-            'd': 'Total desocupados', 
-            'o': 'Total ocupados', 
-            'dh': 'Desocupados hombres', 
-            'dm': 'Desocupados mujeres', 
-            'oh': 'Ocupados hombres', 
-            'om': 'Ocupados mujeres', 
-            'fh': 'Fuerza de trabajo hombres', 
-            'fm': 'Fuerza de trabajo mujeres', 
-            'ft': 'Fuerza de trabajo total',
-            'tdh': 'Tasa desocupados hombres',
-            'tdm': 'Tasa desocupados mujeres', 
-            'td': 'Tasa desocupados'
-        }
-        
-        try:
-            # Wrap the iteration over data.columns with tqdm for a progress bar
-            for series in tqdm(data.columns, desc="Generating plots"):
-                if series in results.columns and f"{series}_std" in results.columns:
-                    plot_series(
-                        original_series=results[series],
-                        trend_series=results[f"{series}_std"],
-                        method_name=model_name,
-                        output_dir=args.plot_dir,
-                        usetex=args.use_tex
-                    )
-                    logging.info(f"Gráfico generado para {col_meaning.get(series, series)}.")
-                else:
-                    logging.warning(f"Faltan datos para graficar la serie '{col_meaning.get(series, series)}'.")
-        except Exception as e:
-            logging.error(f"Error al generar gráficos: {type(e).__name__}: {e}", exc_info=args.show_traceback)
+def model_name(args):
+    return 'x13' if args.x13 else 'stl' if args.stl else 'cissa' if args.cissa else 'x11'
 
+def run_plots(data, results, args):
+    """Genera un gráfico por serie desestacionalizada en '--plot_dir'."""
+    from tqdm import tqdm
+    # Create plot directory if needed
+    if not os.path.exists(args.plot_dir):
+        os.makedirs(args.plot_dir, exist_ok=True)
+        logging.info(f"Directorio de gráficos creado: {args.plot_dir}")
 
+    logging.info("Iniciando generación de gráficos...")
     
-    # =========================================================================
-    # SAVE RESULTS
-    # =========================================================================
+    try:
+        # Wrap the iteration over data.columns with tqdm for a progress bar
+        for series in tqdm(data.columns, desc="Generating plots"):
+            if series in results.columns and f"{series}_std" in results.columns:
+                plot_series(
+                    original_series=results[series],
+                    trend_series=results[f"{series}_std"],
+                    method_name=model_name(args),
+                    output_dir=args.plot_dir,
+                    usetex=args.use_tex
+                )
+                logging.info(f"Gráfico generado para {COL_MEANING.get(series, series)}.")
+            else:
+                logging.warning(f"Faltan datos para graficar la serie '{COL_MEANING.get(series, series)}'.")
+    except Exception as e:
+        logging.error(f"Error al generar gráficos: {type(e).__name__}: {e}", exc_info=args.show_traceback)
+    return os.path.join(args.plot_dir, f'{model_name(args)}_decomposition.png')
+
+def save_results(results, args):
+    """Guarda los resultados en '--output_dir/--output'."""
     logging.info("Iniciando el guardado de resultados...")
     
     if not os.path.exists(args.output_dir):
@@ -389,6 +428,86 @@ def main(args):
     except Exception as e:
         logging.error(f"Error desconocido al guardar resultados: {type(e).__name__}: {e}", exc_info=args.show_traceback)
         sys.exit(1)
+    return output_file
+
+#%% MAIN
+def main(args):
+    import pandas as pd
+    from utils.preprocess import ENE
+
+    logging.info("Starting the STD process...")
+    
+    if not os.path.isfile(args.input):
+        logging.warning(f"El archivo de entrada '{args.input}' no existe."
+            "Inferiendo a partir de datos anuales y/o mensuales."
+            "Este proceso puede requerir conexión a la base de datos pública del INE.")
+
+    # Cada etapa guarda la huella de sus entradas en data/.pipeline y se omite si
+    # nada cambió desde la última ejecución (salvo que se fuerce con '--force').
+    ene = ENE(dims_extra=[dim for dim in args.cube_dims.split(',') if dim])
+    pipeline = Pipeline(os.path.join(ene.data_path, '.pipeline'), force=args.force)
+        
+    # =========================================================================
+    # TRANSFORM ENE
+    # =========================================================================
+
+    # La descarga consulta al INE a lo más una vez al día
+    pipeline.run('download', lambda: run_download(ene),
+                 inputs=[pd.Timestamp.today().date().isoformat(), ene.base_url],
+                 keep=lambda status: 'error' not in status.values())
+    pipeline.run('aggregate', lambda: run_aggregate(ene, args.input, dedup=args.dedup_ingest),
+                 inputs=[dir_signature(os.path.join(ene.raw_path, 'monthly')),
+                         dir_signature(os.path.join(ene.raw_path, 'anual')), args.dedup_ingest, args.cube_dims],
+                 output_files=[os.path.join(ene.preprocess_path, ene.final_name)])
+
+    # =========================================================================
+    # IMPORT DATA
+    # =========================================================================
+    data = pipeline.run('import', lambda: run_import(args), inputs=[file_signature(args.input)])
+
+    # =========================================================================
+    # APPLY STD METHODS
+    # =========================================================================
+    deseasonalised_df = pipeline.run('adjust', lambda: run_adjust(data, args),
+                                     inputs=[data, model_name(args), args.adjustment, args.refit_days],
+                                     output_files=factor_files(data, args))
+    
+    # =========================================================================
+    # RUN DIAGNOSTICS
+    # =========================================================================
+    
+    if args.diagnose or args.diagnose_models:
+        diagnostics_dir = os.path.join(ene.data_path, 'diagnostics', outlier_window().index[-1].strftime('%Y%m%d'))
+        # Los tiempos de las tareas afinan el orden de despacho de las próximas ejecuciones
+        costs = CostModel(os.path.join(pipeline.state_dir, 'costs.json'))
+        pipeline.run('diagnose', lambda: run_diagnostics(data, args, costs),
+                     inputs=[data['td'], model_name(args), args.diagnose_models, outlier_window()],
+                     output_files=[os.path.join(ene.data_path, 'diagnostics', 'diagnostics.sqlite'),
+                                   *[os.path.join(diagnostics_dir, MODELS[name][1], 'metrics.md')
+                                     for name in args.diagnose_models or [model_name(args)]]])
+
+    # =========================================================================
+    # CALCULATE UNEMPLOYMENT RATES
+    # =========================================================================
+    results = pipeline.run('rates', lambda: compute_rates(data, deseasonalised_df, args),
+                           inputs=[data, deseasonalised_df])
+
+    # =========================================================================
+    # PLOTTING
+    # =========================================================================
+    if args.plot:
+        pipeline.run('plot', lambda: run_plots(data, results, args),
+                     inputs=[results, model_name(args), args.plot_dir, args.use_tex],
+                     output_files=[os.path.join(args.plot_dir, f'{model_name(args)}_decomposition.png')])
+    
+    # =========================================================================
+    # SAVE RESULTS
+    # =========================================================================
+    output_file = os.path.join(args.output_dir, args.output)
+    pipeline.run('save', lambda: save_results(results, args),
+                 inputs=[results, output_file], output_files=[output_file])
+
+    logging.info(f"Etapas: {pipeline.report}")
 
 
 
@@ -436,17 +555,31 @@ if __name__ == "__main__":
     # desired OUTPUT DIRECTORY for OUTPUT FILE
     parser.add_argument('--output_dir', type=str, default=DEFAULT_OUTPUT_DIR, help="Directorio deseado para el archivo de salida. Por defecto: './outputs/'.")
     
+    # =========================================================================
+    # INGEST
+    parser.add_argument('--dedup_ingest', action='store_true', help="Ingesta incremental: lee cada archivo ENE una sola vez entre ejecuciones, con las mismas tasas que la agregación por defecto.")
+    parser.add_argument('--cube_dims', type=str, default='', help="Dimensiones adicionales de los microdatos (separadas por coma) para el cubo de conteos de '--dedup_ingest'.")
+    
     # =========================================================================
     # SEASONAL TREND DECOMPOSITION METHOD
     parser.add_argument('--x13', action='store_true', help='Aplica desestacionalización X13-ARIMA-SEATS.')
     parser.add_argument('--stl', action='store_true', help='Aplica desestacionalización STL.')
     parser.add_argument('--cissa', action='store_true', help='Aplica desestacionalización CiSSA.')
+    parser.add_argument('--x11', action='store_true', help='Aplica desestacionalización X-11 en proceso (no requiere x13as).')
+    # concurrent: refit every run; projected: apply stored year-ahead factors, refit only when needed
+    parser.add_argument('--adjustment', type=str, default='concurrent', choices=['concurrent', 'projected'],
+                        help="Ajuste 'concurrent' (reajusta el modelo en cada ejecución) o 'projected' (aplica factores proyectados guardados en 'data/factors'). Por defecto: 'concurrent'.")
+    parser.add_argument('--refit_days', type=int, default=365, help="Con '--adjustment projected', días tras los cuales se reajusta el modelo. Por defecto: 365.")
     
     # =========================================================================
     # DIAGNOSTICS
     # choose whether to run diagnosis
     parser.add_argument('-d', '--diagnose', action='store_true', help='Aplica diagnósticos')
     # desired LOGGING DIRECTORY for LOGGING FILE
+    parser.add_argument('--diagnose-models', dest='diagnose_models', type=lambda value: [name.strip() for name in value.split(',') if name.strip()],
+                        default=None, help="Modelos a diagnosticar en paralelo, cada uno en su propio proceso (p. ej. 'x13,stl,cissa'). Implica '--diagnose'.")
+    parser.add_argument('--diag_executor', type=str, default='auto', choices=['auto', 'thread', 'process', 'serial'],
+                        help="Ejecutor de las tareas de diagnóstico. 'auto' usa hilos para X13 y procesos para los demás. Por defecto: 'auto'.")
     parser.add_argument('--output_dir_diag', type=str, default=DEFAULT_DIAGNOSTICS_DIR, help="Directorio deseado para los resultados de diagnóstocos si '-d' o '--diagnose' es llamado. Por defecto: './diagnostics/'.")
         
     # =========================================================================
@@ -473,6 +606,27 @@ if __name__ == "__main__":
     # Show Traceback
     parser.add_argument('--show_traceback', action='store_true', help="Habilita mostrar el Traceback de errorer para debugging.")
     
+    # =========================================================================
+    # PIPELINE
+    # force a stage (and only that stage) to run even if its inputs are unchanged
+    parser.add_argument('--force', action='append', default=[], choices=STAGES + ['all'], metavar='STAGE',
+                        help=f"Fuerza la ejecución de una etapa aunque sus entradas no hayan cambiado. Puede repetirse. Opciones: {', '.join(STAGES + ['all'])}.")
+    
+    # =========================================================================
+    # PROFILING
+    # structured timing trace of stages, model calls, diagnostics and x13as calls
+    parser.add_argument('--profile', type=str, default=None, metavar='TRACE_JSON',
+                        help="Guarda una traza JSON con la duración de cada etapa, ajuste, diagnóstico y llamada a x13as (formato Chrome/Perfetto) y muestra un resumen al terminar.")
+    parser.add_argument('--profiler', type=str, default=None, choices=PROFILERS,
+                        help="Con '--profile', guarda además un perfil del proceso principal junto a la traza: 'cprofile' (.prof) o 'pyinstrument' (.html).")
+    # peak RSS and tracemalloc allocations per stage and per model call
+    parser.add_argument('--memory', action='store_true',
+                        help="Mide la memoria máxima (RSS y tracemalloc) de cada etapa y de cada ajuste de modelo, y la muestra en el resumen (y en la traza si se usa '--profile'). Hace más lenta la ejecución.")
+    parser.add_argument('--memory_budget_mb', type=float, default=None,
+                        help="Advierte cuando una etapa o llamada agrega más de esta memoria (MB) sobre la que había al partir. Implica '--memory'.")
+    parser.add_argument('--memory_top', type=int, default=0,
+                        help="Con '--memory', líneas de código con más memoria retenida a registrar por etapa (cada etapa tarda unos segundos más). Por defecto: 0 (no se registran).")
+
     # =========================================================================
     # CHECK ARGUMENTS
     
@@ -568,16 +722,25 @@ if __name__ == "__main__":
     # =========================================================================   
     # Check if only one STD method has been called
     # If more than one, raise an Exception and abort
-    std_methods = [args.x13, args.stl, args.cissa]
+    std_methods = [args.x13, args.stl, args.cissa, args.x11]
     if sum(std_methods) > 1:
-        logging.error("Solo se puede seleccionar un método de desestacionalización a la vez (--x13, --stl, --cissa).", 
+        logging.error("Solo se puede seleccionar un método de desestacionalización a la vez (--x13, --stl, --cissa, --x11).", 
                       exc_info=args.show_traceback)
         sys.exit(1)
     elif not any(std_methods):
-        logging.error("Debe seleccionar al menos un método de desestacionalización (--x13, --stl, --cissa).", 
+        logging.error("Debe seleccionar al menos un método de desestacionalización (--x13, --stl, --cissa, --x11).", 
                       exc_info=args.show_traceback)
         sys.exit(1)
     
+    # =========================================================================
+    # Check models requested for parallel diagnostics
+    if args.diagnose_models is not None:
+        unknown = [name for name in args.diagnose_models if name not in MODELS]
+        if unknown or not args.diagnose_models:
+            logging.error(f"Modelos inválidos en '--diagnose-models': {unknown}. Valores permitidos: {list(MODELS)}.",
+                          exc_info=args.show_traceback)
+            sys.exit(1)
+    
     # =========================================================================
     # Check LaTeX
     if args.use_tex and not shutil.which('latex'):
@@ -589,6 +752,14 @@ if __name__ == "__main__":
 
         
     # =========================================================================
-    main(args)
+    if args.profiler and not args.profile:
+        logging.error("'--profiler' requiere '--profile'.", exc_info=args.show_traceback)
+        sys.exit(1)
+    if args.profile or args.memory or args.memory_budget_mb:
+        with profile_run(args.profile, args.profiler, memory=args.memory or args.memory_budget_mb is not None,
+                         budget_mb=args.memory_budget_mb, top=args.memory_top):
+            main(args)
+    else:
+        main(args)
 
 # python main.py input_file output_file --x13 --stl --cissa --verbose
\ No newline at end of file
@@ -1,8 +1,22 @@
 import pandas as pd
-from statsmodels.tsa.x13 import x13_arima_analysis
+
+from utils.instrument import traced_method
 
 
 class BaseModel():
+    # Los modelos que pueden desestacionalizar varias series de igual largo en una sola
+    # llamada (filas de una matriz) lo indican aquí e implementan adjust_batch
+    supports_batch = False
+    # Forma en que los factores estacionales se remueven de la serie ('additive' o 'multiplicative')
+    factor_mode = 'additive'
+
+    def __init_subclass__(cls, **kwargs):
+        # Cada ajuste queda como un span '<Modelo>.adjust' en la traza de '--profile'
+        super().__init_subclass__(**kwargs)
+        for method in ('fit', 'adjust', 'adjust_batch'):
+            if method in cls.__dict__:
+                setattr(cls, method, traced_method(cls.__dict__[method]))
+
     def __init__(self, hiperparams:dict) -> None:
         self.hiperparams = hiperparams
         self.endog = None
@@ -10,6 +24,7 @@ class BaseModel():
         self.model_obj = None
         self._seasadj = None
 
+    @traced_method
     def fit(self, endog:pd.Series, exog:pd.Series=None):
         self.endog = endog
         self.exog = exog
@@ -18,6 +33,9 @@ class BaseModel():
     def adjust(self):
         return self
 
+    def adjust_batch(self, values):
+        raise NotImplementedError(f"{type(self).__name__} no soporta ajuste por lotes")
+
     def trend_cycle(self) -> pd.Series:
         pass
 
@@ -27,6 +45,41 @@ class BaseModel():
     def residue(self) -> pd.Series:
         pass
 
+    def seasonal_factors(self) -> pd.Series:
+        """Factores estacionales implícitos del último ajuste (serie original vs. ajustada)."""
+        if self.factor_mode == 'multiplicative':
+            return (self.endog / self.seasadj).rename('factor')
+        return (self.endog - self.seasadj).rename('factor')
+
+    def projected_factors(self, horizon=12) -> pd.Series:
+        """
+        Factores estacionales del ajuste más `horizon` meses proyectados.
+
+        La proyección usa la fórmula de factores de año adelante de X-11:
+        S[t+12] = S[t] + (S[t] - S[t-12]) / 2, aplicada mes a mes.
+        """
+        factors = self.seasonal_factors()
+        if len(factors) < 24:
+            raise ValueError("Se requieren al menos 2 años de factores para proyectar")
+        values = list(factors.to_numpy())
+        for _ in range(horizon):
+            values.append(values[-12] + (values[-12] - values[-24]) / 2)
+        index = pd.date_range(start=factors.index[0], periods=len(values), freq='MS')
+        return pd.Series(values, index=index, name='factor')
+
+    def adjust_projected(self, endog:pd.Series, factors:pd.Series):
+        """Desestacionaliza `endog` con factores ya calculados, sin reajustar el modelo."""
+        missing = endog.index.difference(factors.index)
+        if len(missing) > 0:
+            raise ValueError(f"No hay factores proyectados para {len(missing)} fechas (desde {missing[0].date()})")
+        self.endog = endog
+        factors = factors.reindex(endog.index)
+        if self.factor_mode == 'multiplicative':
+            self._seasadj = (endog / factors).rename('seasadj')
+        else:
+            self._seasadj = (endog - factors).rename('seasadj')
+        return self
+
     @property
     def seasadj(self) -> pd.Series:
         if isinstance(self._seasadj, pd.Series):
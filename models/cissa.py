@@ -1,13 +1,15 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.linalg import hankel, dft
 from scipy.signal import lfilter
-from scipy import stats
 from statsmodels.regression.linear_model import yule_walker  # Import yule_walker from statsmodels
 from models.base import BaseModel
 
 class CiSSAModel(BaseModel):
+    # Ventanas de igual largo comparten L y la base circulante: se reconstruyen juntas
+    supports_batch = True
+
     def __init__(self, hiperparams = {'use_max_L': True, 'L': None}, outlier: pd.Series = None) -> None:
         super().__init__(hiperparams)        
 
@@ -24,6 +26,10 @@ class CiSSAModel(BaseModel):
         self._seasadj = self.trend + self.resid
         return self
 
+    def adjust_batch(self, values) -> np.ndarray:
+        """Desestacionaliza cada fila de `values` (series de igual largo) con una sola reconstrucción CiSSA."""
+        return get_cissa_batch(values)
+
     def trend_cycle(self) -> pd.Series:
         if self.model_obj is None:
             raise ValueError("Debe llamar al método adjust antes de obtener la tendencia.")
@@ -194,6 +200,60 @@ def group(Z, psd, data_per_unit_period, period_ranges, include_noise=True):
 
     return rc, sh, kg
 
+def circulant_basis(L):
+    """
+    Base ortonormal real de la matriz circulante de orden L (columnas = frecuencias).
+    """
+    if L % 2:
+        nf2 = (L + 1) // 2 - 1
+    else:
+        nf2 = L // 2 - 1
+    nft = nf2 + abs(L % 2 - 2)
+
+    U = dft(L) / np.sqrt(L)
+    U[:, 0] = np.real(U[:, 0])
+
+    for k in range(1, int(nf2) + 1):
+        u_k = U[:, k]
+        U[:, k] = np.sqrt(2) * np.real(u_k)
+        U[:, L - k] = np.sqrt(2) * np.imag(u_k)
+    U = np.real(U)
+
+    if L % 2 == 0:
+        U[:, int(nft - 1)] = np.real(U[:, int(nft - 1)])
+    return U
+
+def diagaver(U, W):
+    """
+    Promedio diagonal vectorizado de las componentes elementales U[:, k] W[k, :].
+
+    Equivale a `diagaver_single_thread` sobre cada componente: la suma de cada
+    antidiagonal de la matriz de rango uno es la convolución de U[:, k] con W[k, :].
+    `W` puede ser (L, N) o (series, L, N); retorna (..., L, N + L - 1).
+    """
+    L, N = W.shape[-2], W.shape[-1]
+    R = np.zeros(W.shape[:-1] + (N + L - 1,))
+    for i in range(L):
+        R[..., i:i + N] += U[i, :, None] * W
+    counts = np.convolve(np.ones(L), np.ones(N))
+    return R / counts
+
+def frequency_components(R, L):
+    """Suma los pares de frecuencias conjugadas de R (..., T, L). Retorna (..., T, nft)."""
+    if L % 2:
+        nf2 = (L + 1) // 2 - 1
+    else:
+        nf2 = L // 2 - 1
+    nft = nf2 + abs(L % 2 - 2)
+
+    Z = np.zeros(R.shape[:-1] + (int(nft),))
+    Z[..., 0] = R[..., 0]
+    for k in range(1, int(nf2) + 1):
+        Z[..., k] = R[..., k] + R[..., L - k]
+    if L % 2 == 0:
+        Z[..., int(nft - 1)] = R[..., int(nft - 1)]
+    return Z
+
 def cissa(x, L, H=0):
     """
     Perform Circulant Singular Spectrum Analysis (CiSSA).
@@ -219,12 +279,6 @@ def cissa(x, L, H=0):
     else:
         H = L
 
-    if L % 2:
-        nf2 = (L + 1) // 2 - 1
-    else:
-        nf2 = L // 2 - 1
-    nft = nf2 + abs(L % 2 - 2)
-
     xe = extend(x, H)
     col = xe[0:L]
     row = xe[L - 1:]
@@ -241,33 +295,13 @@ def cissa(x, L, H=0):
             C[i, j] = ((L - k) / L) * gam[k] + (k / L) * gam[L - k]
             C[j, i] = C[i, j]
 
-    U = dft(L) / np.sqrt(L)
-    U[:, 0] = np.real(U[:, 0])
-
-    for k in range(1, int(nf2) + 1):
-        u_k = U[:, k]
-        U[:, k] = np.sqrt(2) * np.real(u_k)
-        U[:, L - k] = np.sqrt(2) * np.imag(u_k)
-    U = np.real(U)
-
-    if L % 2 == 0:
-        U[:, int(nft - 1)] = np.real(U[:, int(nft - 1)])
+    U = circulant_basis(L)
 
     psd = np.abs(np.diag(U.T @ C @ U))
     W = U.T @ X
 
-    R = np.zeros((T + 2 * H, L))
-    for k in range(L):
-        R[:, k:k + 1] = diagaver_single_thread(U[:, k:k + 1] @ W[k:k + 1, :])
-
-    Z = np.zeros((T + 2 * H, int(nft)))
-    Z[:, 0:1] = R[:, 0:1]
-    for k in range(1, int(nf2) + 1):
-        Z[:, k:k + 1] = R[:, k:k + 1] + R[:, L - k:L - k + 1]
-    if L % 2 == 0:
-        Z[:, int(nft - 1):int(nft)] = R[:, int(nft - 1):int(nft)]
-
-    Z = Z[H:T + H, :]
+    R = diagaver(U, W).T
+    Z = frequency_components(R, L)[H:T + H, :]
     psd = psd.reshape(-1, 1)
     return Z, psd
 
@@ -307,6 +341,38 @@ def get_cissa(series, L=12, use_max_L=True):
 
     return rc, sh, kg
 
+def get_cissa_batch(values, L=12, use_max_L=True):
+    """
+    CiSSA por lotes: desestacionaliza cada fila de `values` (series de igual largo).
+
+    Equivale a aplicar `get_cissa` a cada fila y sumar 'long term cycle' y 'noise',
+    pero la base circulante, la proyección y el promedio diagonal se calculan una
+    sola vez para todas las filas. Solo la extensión AR se estima serie a serie.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    B, T = values.shape
+    if use_max_L:
+        L = max(((T // 2 - 1) // 12) * 12, 12)
+    elif L % 12 != 0:
+        raise ValueError("L must be a multiple of 12")
+    if L >= T - L + 1:
+        raise ValueError(f'The window length must be less than T/2. Got L = {L}, T = {T}')
+
+    H = L
+    xe = np.stack([extend(row.reshape(-1, 1), H).flatten() for row in values])
+    U = circulant_basis(L)
+    X = sliding_window_view(xe, xe.shape[-1] - L + 1, axis=-1)
+    W = np.einsum('lk,bln->bkn', U, X)
+    R = np.swapaxes(diagaver(U, W), -1, -2)
+    Z = frequency_components(R, L)[:, H:T + H, :]
+
+    period_ranges = {
+        'seasonality': (1, 1),
+        'long term cycle': (1.5, 8)
+    }
+    kg = build_groupings(period_ranges, 12, np.zeros(L), Z[0])
+    return Z[..., kg['long term cycle']].sum(axis=-1) + Z[..., kg['noise']].sum(axis=-1)
+
 # Example usage (this would be in main.py or another script)
 if __name__ == "__main__":
     # Load your data here
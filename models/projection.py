@@ -0,0 +1,62 @@
+import os
+import json
+import time
+from os.path import join
+
+import pandas as pd
+
+
+class FactorStore():
+    """
+    Guarda los factores estacionales proyectados de cada serie y modelo.
+
+    Un ajuste completo (anual o según calendario) escribe `<modelo>/<serie>.csv` con
+    los factores históricos más los proyectados y un `.json` con los metadatos del
+    ajuste. Las ejecuciones mensuales desestacionalizan con esos factores mientras
+    cubran las fechas nuevas y el ajuste no haya expirado.
+    """
+    def __init__(self, root) -> None:
+        self.root = root
+
+    def _paths(self, model_name, series_name):
+        folder = join(self.root, model_name)
+        return join(folder, f'{series_name}.csv'), join(folder, f'{series_name}.json')
+
+    def files(self, model_name, series_names) -> list:
+        """Archivos (`.csv` y `.json`) que `save` escribe para las series `series_names`."""
+        return [path for series_name in series_names for path in self._paths(model_name, series_name)]
+
+    def save(self, model, series_name, factors:pd.Series):
+        csv_path, meta_path = self._paths(type(model).__name__, series_name)
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+        factors.rename('factor').rename_axis('ds').to_csv(csv_path, sep=';')
+        meta = {'fitted_until': model.endog.index[-1].date().isoformat(),
+                'start': model.endog.index[0].date().isoformat(),
+                'fitted_at': time.time(),
+                'hiperparams': repr(model.hiperparams),
+                'factor_mode': model.factor_mode}
+        with open(meta_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+
+    def load(self, model_name, series_name):
+        """Retorna (factores, metadatos) o (None, None) si no hay factores guardados."""
+        csv_path, meta_path = self._paths(model_name, series_name)
+        if not (os.path.isfile(csv_path) and os.path.isfile(meta_path)):
+            return None, None
+        factors = pd.read_csv(csv_path, sep=';', index_col='ds', parse_dates=['ds'])['factor']
+        with open(meta_path, 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+        return factors, meta
+
+    @staticmethod
+    def needs_refit(model, endog:pd.Series, factors, meta, max_age_days=365) -> bool:
+        """Indica si hay que reajustar: sin factores, factores vencidos o que no cubren la serie."""
+        if factors is None or meta is None:
+            return True
+        if time.time() - meta['fitted_at'] > max_age_days * 86400:
+            return True
+        if meta['hiperparams'] != repr(model.hiperparams) or meta['factor_mode'] != model.factor_mode:
+            return True
+        if endog.index[0].date().isoformat() != meta['start']:
+            return True
+        return len(endog.index.difference(factors.index)) > 0
@@ -2,11 +2,14 @@
 from models.base import BaseModel #models.base
 
 # Paquetes
-from statsmodels.tsa.seasonal import STL
+import numpy as np
 import pandas as pd
 
 # Definimos la subclase
 class STLModel(BaseModel):
+    # Las ventanas de igual largo (SlidingSpans, RevisionHistory) pueden ajustarse juntas con stl_decompose
+    supports_batch = True
+
     # Inicializador
     def __init__(self, hiperparams = {'seasonal': 13, 'robust': True}) -> None:
         # Herencia de características
@@ -21,6 +24,9 @@ class STLModel(BaseModel):
         if self.endog is None:
             raise ValueError("Debe llamar al método fit con una serie antes de ajustar.")
 
+        # statsmodels solo se importa en el ajuste serie a serie: el ajuste por lotes no lo necesita
+        from statsmodels.tsa.seasonal import STL
+
         # Configurar STL con hiperparámetros
         stl = STL(self.endog, **self.hiperparams)
         # Ajustamos y guardamos en la variable correspondiente
@@ -30,6 +36,13 @@ class STLModel(BaseModel):
         self._seasadj = self.model_obj.trend + self.model_obj.resid
         return self
 
+    def adjust_batch(self, values) -> np.ndarray:
+        """
+        Desestacionaliza cada fila de `values` (series de igual largo) en una sola llamada
+        con el motor NumPy `stl_decompose`. Retorna la tendencia más el residuo de cada fila.
+        """
+        return stl_decompose(values, **self.hiperparams)['seasadj']
+
     def trend_cycle(self) -> pd.Series:
         """
         Devuelve la componente de tendencia-ciclo de la serie ajustada.
@@ -60,6 +73,171 @@ class STLModel(BaseModel):
         # Retornamos
         return self.model_obj.resid
 
+
+# --------------------------------------------------------------------------------------------------
+# Motor STL vectorizado
+# --------------------------------------------------------------------------------------------------
+# Traducción a NumPy de la rutina de Cleveland et al. (1990) usada por statsmodels, con los
+# suavizados loess evaluados para todas las series (filas) y todos los puntos a la vez.
+# Solo se implementan saltos (jumps) de 1, que son los valores por defecto de statsmodels.
+
+def _loess(y, xs, nleft, length, degree, rw=None):
+    """
+    Loess en las posiciones `xs` (base 1) usando la ventana [nleft, nleft + ancho) de cada una.
+
+    `y` y `rw` son (series, m). Retorna (valores, ok), ambos de forma (series, len(xs));
+    ok es False donde todos los pesos fueron cero. El ajuste lineal se obtiene de las
+    sumas ponderadas de la ventana, sin materializar los pesos finales de cada punto.
+    """
+    m = y.shape[-1]
+    width = min(length, m)
+    xs = np.asarray(xs, dtype=float)
+    positions = np.asarray(nleft)[:, None] + np.arange(width)
+    h = np.maximum(xs - positions[:, 0], positions[:, -1] - xs)
+    if length > m:
+        h = h + (length - m) // 2
+    # Distancias con signo al punto evaluado: el ajuste lineal es invariante a la traslación
+    offset = positions - xs[:, None]
+    dist = np.abs(offset)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tricube = np.where(dist <= 0.001 * h[:, None], 1.0, (1 - (dist / h[:, None])**3)**3)
+    kernel = np.where(dist <= 0.999 * h[:, None], tricube, 0.0)
+    windows = y[:, positions - 1]
+    if rw is None:
+        total = np.broadcast_to(kernel.sum(axis=-1), y.shape[:1] + xs.shape)
+        first = np.broadcast_to((kernel * offset).sum(axis=-1), total.shape)
+        second = np.broadcast_to((kernel * offset**2).sum(axis=-1), total.shape)
+        sum_y = np.einsum('bqw,qw->bq', windows, kernel)
+        sum_xy = np.einsum('bqw,qw->bq', windows, kernel * offset)
+    else:
+        weights = kernel * rw[:, positions - 1]
+        total = weights.sum(axis=-1)
+        first = np.einsum('bqw,qw->bq', weights, offset)
+        second = np.einsum('bqw,qw->bq', weights, offset**2)
+        weights *= windows
+        sum_y = weights.sum(axis=-1)
+        sum_xy = np.einsum('bqw,qw->bq', weights, offset)
+    ok = total > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        safe = np.where(ok, total, 1.0)
+        mean, level = first / safe, sum_y / safe
+        values = level
+        if degree > 0:
+            spread = second / safe - mean**2
+            linear = (h > 0) & (np.sqrt(spread) > 0.001 * (m - 1))
+            slope = np.where(linear, -mean / spread, 0.0)
+            values = level + slope * (sum_xy / safe - mean * level)
+    return values, ok
+
+
+def _window_starts(m, length):
+    """Inicio (base 1) de la ventana de loess de cada punto de una serie de largo m."""
+    xs = np.arange(1, m + 1)
+    if length >= m:
+        return np.ones(m, dtype=int)
+    return np.clip(xs - (length + 1) // 2 + 1, 1, m - length + 1)
+
+
+def _smooth(y, length, degree, rw=None):
+    """Loess de `y` (series, m) en cada uno de sus puntos; donde falla se conserva el valor original."""
+    m = y.shape[-1]
+    values, ok = _loess(y, np.arange(1, m + 1), _window_starts(m, length), length, degree, rw)
+    return np.where(ok, values, y)
+
+
+def _cycle_subseries(y, period, length, degree, rw=None):
+    """
+    Suaviza cada subserie mensual y la extiende un periodo hacia cada lado.
+    Retorna un arreglo (series, n + 2 * period).
+
+    Las subseries de igual largo (a lo más dos grupos de meses) se apilan como filas
+    y se suavizan, junto con sus dos extrapolaciones, en una sola llamada a `_loess`.
+    """
+    rows, n = y.shape
+    out = np.empty((rows, n + 2 * period))
+    lengths = [len(range(month, n, period)) for month in range(period)]
+    for k in sorted(set(lengths)):
+        months = [month for month in range(period) if lengths[month] == k]
+        sub = np.concatenate([y[:, month::period] for month in months])
+        sub_rw = None if rw is None else np.concatenate([rw[:, month::period] for month in months])
+        # Posiciones 0 y k + 1: extrapolación al periodo anterior y posterior de la subserie
+        xs = np.arange(k + 2)
+        nleft = np.r_[1, _window_starts(k, length), max(1, k - length + 1)]
+        values, ok = _loess(sub, xs, nleft, length, degree, sub_rw)
+        smooth = np.where(ok[:, 1:-1], values[:, 1:-1], sub)
+        first = np.where(ok[:, 0], values[:, 0], smooth[:, 0])
+        last = np.where(ok[:, -1], values[:, -1], smooth[:, -1])
+        block = np.column_stack([first, smooth, last])
+        for i, month in enumerate(months):
+            out[:, month::period] = block[i * rows:(i + 1) * rows]
+    return out
+
+
+def _moving_average(y, length):
+    cumsum = np.concatenate([np.zeros((y.shape[0], 1)), np.cumsum(y, axis=-1)], axis=-1)
+    return (cumsum[:, length:] - cumsum[:, :-length]) / length
+
+
+def _robustness_weights(y, fit):
+    """Pesos bicuadrados sobre los residuos, escalados por 6 veces su mediana."""
+    resid = np.abs(y - fit)
+    cmad = 6 * np.median(resid, axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.where(resid <= 0.999 * cmad, (1 - (resid / cmad)**2)**2, 0.0)
+    weights = np.where(resid <= 0.001 * cmad, 1.0, weights)
+    # Ajuste exacto: statsmodels deja todos los pesos en 1
+    return np.where(cmad == 0, 1.0, weights)
+
+
+def stl_decompose(y, period=12, seasonal=7, trend=None, low_pass=None, seasonal_deg=1, trend_deg=1,
+                  low_pass_deg=1, robust=False, seasonal_jump=1, trend_jump=1, low_pass_jump=1,
+                  inner_iter=None, outer_iter=None):
+    """
+    Descomposición STL de `y`, de forma (n,) o (series, n), con los mismos parámetros y
+    valores por defecto que `statsmodels.tsa.seasonal.STL`.
+
+    Retorna un dict con 'trend', 'seasonal', 'resid' y 'seasadj' de la misma forma que `y`.
+    """
+    if 1 != seasonal_jump or 1 != trend_jump or 1 != low_pass_jump:
+        raise ValueError("stl_decompose solo soporta saltos (jumps) iguales a 1")
+    if seasonal < 3 or seasonal % 2 == 0:
+        raise ValueError("seasonal debe ser un entero impar mayor o igual a 3")
+    if trend is None:
+        trend = int(np.ceil(1.5 * period / (1 - 1.5 / seasonal)))
+        trend += trend % 2 == 0
+    if low_pass is None:
+        low_pass = period + 1
+        low_pass += low_pass % 2 == 0
+    if inner_iter is None:
+        inner_iter = 2 if robust else 5
+    if outer_iter is None:
+        outer_iter = 15 if robust else 0
+
+    y = np.asarray(y, dtype=float)
+    vector = y.ndim == 1
+    y = np.atleast_2d(y)
+    if y.shape[-1] < 2 * period:
+        raise ValueError("Serie debe tener al menos dos periodos completos para STL")
+
+    n = y.shape[-1]
+    trend_values = np.zeros_like(y)
+    season = np.zeros_like(y)
+    rw = None
+    for outer in range(outer_iter + 1):
+        for _ in range(inner_iter):
+            cycle = _cycle_subseries(y - trend_values, period, seasonal, seasonal_deg, rw)
+            # Filtro pasa bajo: medias móviles period, period y 3 seguidas de loess
+            low = _moving_average(_moving_average(_moving_average(cycle, period), period), 3)
+            low = _smooth(low, low_pass, low_pass_deg)
+            season = cycle[:, period:period + n] - low
+            trend_values = _smooth(y - season, trend, trend_deg, rw)
+        if outer < outer_iter:
+            rw = _robustness_weights(y, trend_values + season)
+
+    result = {'trend': trend_values, 'seasonal': season, 'resid': y - season - trend_values,
+              'seasadj': y - season}
+    return {key: value[0] for key, value in result.items()} if vector else result
+
 # --------------------------------------------------------------------------------------------------
 # Ejemplo de uso
 # --------------------------------------------------------------------------------------------------
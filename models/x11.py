@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from models.base import BaseModel
+
+
+# Razón I/C usada por X-11 para los pesos asimétricos de Musgrave de cada Henderson
+HENDERSON_IC = {9: 1.0, 13: 3.5, 23: 4.5}
+SEASONAL_FILTERS = {
+    '3x3': np.array([1, 2, 3, 2, 1]) / 9,
+    '3x5': np.array([1, 2, 3, 3, 3, 2, 1]) / 15,
+    '3x9': np.array([1, 2, 3, 3, 3, 3, 3, 3, 3, 2, 1]) / 27,
+}
+MA_2X12 = np.r_[1, 2 * np.ones(11), 1] / 24
+
+
+class X11Model(BaseModel):
+    """
+    Desestacionalización X-11 en proceso, sin el binario x13as.
+
+    Implementa la cascada clásica de filtros de X-11 (media móvil 2x12, medias
+    estacionales 3x3/3x5 por mes y Henderson con extremos de Musgrave) en NumPy
+    vectorizado. No incluye el pre-ajuste regARIMA ni el tratamiento de valores
+    extremos de X-13, por lo que los extremos de la serie difieren más de x13as.
+    """
+    supports_batch = True
+
+    def __init__(self, hiperparams={'mode': 'additive', 'henderson': 13, 'seasonal_filter': '3x5'}) -> None:
+        super().__init__(hiperparams)
+
+    def adjust(self):
+        if self.endog is None:
+            raise ValueError("Debe llamar al método fit con una serie antes de ajustar.")
+
+        self.model_obj = x11_decompose(self.endog.to_numpy(dtype=float), **self.hiperparams)
+        index = self.endog.index
+        self.trend = pd.Series(self.model_obj['trend'], index=index, name='trend')
+        self.seasonal = pd.Series(self.model_obj['seasonal'], index=index, name='seasonal')
+        self.resid = pd.Series(self.model_obj['irregular'], index=index, name='irregular')
+        self._seasadj = pd.Series(self.model_obj['seasadj'], index=index, name='seasadj')
+        return self
+
+    def adjust_batch(self, values) -> np.ndarray:
+        """Desestacionaliza cada fila de `values` (series de igual largo) en una sola llamada."""
+        return x11_decompose(np.asarray(values, dtype=float), **self.hiperparams)['seasadj']
+
+    def trend_cycle(self) -> pd.Series:
+        if self.model_obj is None:
+            raise ValueError("Debe llamar al método adjust antes de obtener la tendencia.")
+        return self.trend
+
+    def seasonality(self) -> pd.Series:
+        if self.model_obj is None:
+            raise ValueError("Debe llamar al método adjust antes de obtener la estacionalidad.")
+        return self.seasonal
+
+    def residue(self) -> pd.Series:
+        if self.model_obj is None:
+            raise ValueError("Debe llamar al método adjust antes de obtener el residuo.")
+        return self.resid
+
+
+def henderson_weights(length):
+    """Pesos simétricos del filtro de Henderson de largo `length` (impar)."""
+    h = (length - 1) // 2
+    n = h + 2
+    j = np.arange(-h, h + 1)
+    num = 315 * ((n - 1)**2 - j**2) * (n**2 - j**2) * ((n + 1)**2 - j**2) * (3 * n**2 - 16 - 11 * j**2)
+    den = 8 * n * (n**2 - 1) * (4 * n**2 - 1) * (4 * n**2 - 9) * (4 * n**2 - 25)
+    return num / den
+
+
+def musgrave_weights(weights, available, ic_ratio):
+    """
+    Pesos asimétricos de Musgrave para un filtro simétrico cuando solo hay
+    `available` puntos disponibles (el objetivo y los anteriores/posteriores).
+    """
+    N = len(weights)
+    M = available
+    D = 4 / (np.pi * ic_ratio**2)
+    k = np.arange(1, M + 1)
+    i = np.arange(M + 1, N + 1)
+    cut = weights[M:]
+    center = (M + 1) / 2
+    return (weights[:M] + cut.sum() / M
+            + (k - center) * D / (1 + M * (M - 1) * (M + 1) * D / 12) * ((i - center) * cut).sum())
+
+
+def henderson_filter(y, length=13):
+    """Filtro de Henderson sobre el último eje de `y`, con extremos de Musgrave."""
+    h = (length - 1) // 2
+    w = henderson_weights(length)
+    n = y.shape[-1]
+    out = np.empty_like(y)
+    out[..., h:n - h] = sliding_window_view(y, length, axis=-1) @ w
+    for m in range(h):
+        # Extremo derecho: el objetivo tiene m puntos posteriores
+        u = musgrave_weights(w, h + 1 + m, HENDERSON_IC[length])
+        out[..., n - 1 - m] = y[..., n - 1 - m - h:] @ u
+        out[..., m] = y[..., :m + h + 1] @ u[::-1]
+    return out
+
+
+def ma_2x12(y):
+    """Media móvil centrada 2x12; los 6 valores de cada extremo repiten el más cercano calculado."""
+    out = np.empty_like(y)
+    n = y.shape[-1]
+    out[..., 6:n - 6] = sliding_window_view(y, 13, axis=-1) @ MA_2X12
+    out[..., :6] = out[..., 6:7]
+    out[..., n - 6:] = out[..., n - 7:n - 6]
+    return out
+
+
+def _truncated_filter(y, weights):
+    """Filtro simétrico en el último eje; en los extremos se renormalizan los pesos disponibles."""
+    h = len(weights) // 2
+    pad = [(0, 0)] * (y.ndim - 1) + [(h, h)]
+    num = sliding_window_view(np.pad(y, pad), len(weights), axis=-1) @ weights
+    den = sliding_window_view(np.pad(np.ones(y.shape[-1]), (h, h)), len(weights)) @ weights
+    return num / den
+
+
+def seasonal_ma(si, weights, period=12):
+    """Aplica la media estacional a cada subserie mensual (mismo mes de cada año)."""
+    out = np.empty_like(si)
+    for month in range(period):
+        out[..., month::period] = _truncated_filter(si[..., month::period], weights)
+    return out
+
+
+def x11_decompose(y, mode='additive', henderson=13, seasonal_filter='3x5', period=12):
+    """
+    Descomposición X-11 de `y`, de forma (n,) o (series, n).
+
+    Retorna un dict con 'trend', 'seasonal', 'irregular' y 'seasadj' de la misma forma que `y`.
+    """
+    if period != 12:
+        raise ValueError("X11Model solo soporta series mensuales (period=12)")
+    if mode not in ('additive', 'multiplicative'):
+        raise ValueError("Valores permitidos para mode son: 'additive', 'multiplicative'")
+    if seasonal_filter not in SEASONAL_FILTERS:
+        raise ValueError(f"Filtros estacionales permitidos: {list(SEASONAL_FILTERS)}")
+    if henderson not in HENDERSON_IC:
+        raise ValueError(f"Largos de Henderson permitidos: {list(HENDERSON_IC)}")
+    y = np.asarray(y, dtype=float)
+    if y.shape[-1] < 3 * period:
+        raise ValueError("Serie debe ser de 3 años o más para desestacionalizar con X-11")
+    if mode == 'multiplicative' and (y <= 0).any():
+        raise ValueError("El modo multiplicativo requiere una serie estrictamente positiva")
+
+    remove = np.subtract if mode == 'additive' else np.divide
+
+    def seasonal_factors(si, weights):
+        s = seasonal_ma(si, weights, period)
+        # Normalización: los factores de un año suman 0 (aditivo) o promedian 1 (multiplicativo)
+        return remove(s, ma_2x12(s))
+
+    # B: estimación inicial con tendencia 2x12 y media estacional 3x3
+    tc = ma_2x12(y)
+    s = seasonal_factors(remove(y, tc), SEASONAL_FILTERS['3x3'])
+    sa = remove(y, s)
+    # C/D: tendencia Henderson sobre la serie desestacionalizada y media estacional final
+    tc = henderson_filter(sa, henderson)
+    s = seasonal_factors(remove(y, tc), SEASONAL_FILTERS[seasonal_filter])
+    sa = remove(y, s)
+    tc = henderson_filter(sa, henderson)
+    return {'trend': tc, 'seasonal': s, 'irregular': remove(sa, tc), 'seasadj': sa}
@@ -3,6 +3,7 @@ from statsmodels.tsa.x13 import x13_arima_analysis, X13Error
 import os
 from os import path
 from models.base import BaseModel
+from utils.instrument import TRACER
 import traceback
 
 
@@ -12,13 +13,14 @@ class X13Model(BaseModel):
         super().__init__(hiperparams)
     def adjust(self):
         try:
-            self.model_obj = x13_arima_analysis(
-                endog=self.endog,
-                exog=self.exog,
-                maxorder=self.hiperparams.get('maxorder'),
-                x12path=x13as_path,
-                outlier=self.hiperparams.get('outlier'),
-            )
+            with TRACER.span('x13as', n=len(self.endog)):
+                self.model_obj = x13_arima_analysis(
+                    endog=self.endog,
+                    exog=self.exog,
+                    maxorder=self.hiperparams.get('maxorder'),
+                    x12path=x13as_path,
+                    outlier=self.hiperparams.get('outlier'),
+                )
         except X13Error as e:
             raise e
         except Exception as e:
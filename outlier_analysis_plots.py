@@ -1,6 +1,8 @@
 from plotly import graph_objects as go
 import pandas as pd
 
+from diagnostics.store import DiagnosticsStore
+
 generic_layouts = {
     # "legend_title":"Serie temporal:", 
     #    "yaxis_title":"<b>Tasa de Desocupación</b>",
@@ -23,13 +25,13 @@ generic_layouts = {
                     }
 
 rt = "./data/diagnostics/"
-x13 = pd.read_csv(rt+"/X13Model_out20220501/mse_comp_real.csv")
-stl = pd.read_csv(rt+"/STLModel_out20220501/mse_comp_real.csv")
-cissa = pd.read_csv(rt+"/CiSSAModel_out20220501/mse_comp_real.csv")
+store = DiagnosticsStore(rt + "diagnostics.sqlite")
+end = "2022-05-01"
+data = store.pivot("mse_comp_real", end=end)
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=x13['ds'], y=x13.iloc[:,1], name="X13-ARIMA"))
-fig.add_trace(go.Scatter(x=stl['ds'], y=stl.iloc[:,1], name="STL"))
-fig.add_trace(go.Scatter(x=cissa['ds'], y=cissa.iloc[:,1], name="CiSSA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["X13Model"], name="X13-ARIMA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["STLModel"], name="STL"))
+fig.add_trace(go.Scatter(x=data.index, y=data["CiSSAModel"], name="CiSSA"))
 fig.update_layout(
     title="Comparativa cambio del MSE (Diagnóstico Compuesto-Real) al agregar datos a la serie.",
     yaxis_title="<b>MSE Periodo pre-pandemia</b>",
@@ -37,13 +39,11 @@ fig.update_layout(
 fig.update_layout(**generic_layouts)
 fig.show()
 
-x13 = pd.read_csv(rt+"/X13Model_out20220501/CY.csv")
-stl = pd.read_csv(rt+"/STLModel_out20220501/CY.csv")
-cissa = pd.read_csv(rt+"/CiSSAModel_out20220501/CY.csv")
+data = store.pivot("CY", end=end)
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=x13['ds'], y=x13.iloc[:,1], name="X13-ARIMA"))
-fig.add_trace(go.Scatter(x=stl['ds'], y=stl.iloc[:,1], name="STL"))
-fig.add_trace(go.Scatter(x=cissa['ds'], y=cissa.iloc[:,1], name="CiSSA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["X13Model"], name="X13-ARIMA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["STLModel"], name="STL"))
+fig.add_trace(go.Scatter(x=data.index, y=data["CiSSAModel"], name="CiSSA"))
 fig.update_layout(
     title="Cambio en MSE Periodo pre-pandemia para diagnóstico Revision History, valor CY.",
     yaxis_title="<b>MSE Periodo pre-pandemia</b>",
@@ -51,13 +51,11 @@ fig.update_layout(
 fig.update_layout(**generic_layouts)
 fig.show()
 
-x13 = pd.read_csv(rt+"/X13Model_out20220501/RY.csv")
-stl = pd.read_csv(rt+"/STLModel_out20220501/RY.csv")
-cissa = pd.read_csv(rt+"/CiSSAModel_out20220501/RY.csv")
+data = store.pivot("RY", end=end)
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=x13['ds'], y=x13.iloc[:,1], name="X13-ARIMA"))
-fig.add_trace(go.Scatter(x=stl['ds'], y=stl.iloc[:,1], name="STL"))
-fig.add_trace(go.Scatter(x=cissa['ds'], y=cissa.iloc[:,1], name="CiSSA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["X13Model"], name="X13-ARIMA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["STLModel"], name="STL"))
+fig.add_trace(go.Scatter(x=data.index, y=data["CiSSAModel"], name="CiSSA"))
 fig.update_layout(
     title="Cambio en MSE Periodo pre-pandemia para diagnóstico Revision History, valor RY.",
     yaxis_title="<b>MSE Periodo pre-pandemia</b>",
@@ -65,13 +63,11 @@ fig.update_layout(
 fig.update_layout(**generic_layouts)
 fig.show()
 
-x13 = pd.read_csv(rt+"/X13Model_out20220501/A%_pre.csv")
-stl = pd.read_csv(rt+"/STLModel_out20220501/A%_pre.csv")
-cissa = pd.read_csv(rt+"/CiSSAModel_out20220501/A%_pre.csv")
+data = store.pivot("A%_pre", end=end)
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=x13['ds'], y=x13.iloc[:,1], name="X13-ARIMA"))
-fig.add_trace(go.Scatter(x=stl['ds'], y=stl.iloc[:,1], name="STL"))
-fig.add_trace(go.Scatter(x=cissa['ds'], y=cissa.iloc[:,1], name="CiSSA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["X13Model"], name="X13-ARIMA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["STLModel"], name="STL"))
+fig.add_trace(go.Scatter(x=data.index, y=data["CiSSAModel"], name="CiSSA"))
 fig.update_layout(
     title="Valores A% para cada Modelo en periodo pre-pandemia",
     yaxis_title="<b>Valores de A% pre-pandemia</b>",
@@ -79,13 +75,11 @@ fig.update_layout(
 fig.update_layout(**generic_layouts)
 fig.show()
 
-x13 = pd.read_csv(rt+"/X13Model_out20220501/MM%_pre.csv")
-stl = pd.read_csv(rt+"/STLModel_out20220501/MM%_pre.csv")
-cissa = pd.read_csv(rt+"/CiSSAModel_out20220501/MM%_pre.csv")
+data = store.pivot("MM%_pre", end=end)
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=x13['ds'], y=x13.iloc[:,1], name="X13-ARIMA"))
-fig.add_trace(go.Scatter(x=stl['ds'], y=stl.iloc[:,1], name="STL"))
-fig.add_trace(go.Scatter(x=cissa['ds'], y=cissa.iloc[:,1], name="CiSSA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["X13Model"], name="X13-ARIMA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["STLModel"], name="STL"))
+fig.add_trace(go.Scatter(x=data.index, y=data["CiSSAModel"], name="CiSSA"))
 fig.update_layout(
     title="Valores MM% para cada Modelo en periodo pre-pandemia",
     yaxis_title="<b>Valores de MM% pre-pandemia</b>",
@@ -93,13 +87,11 @@ fig.update_layout(
 fig.update_layout(**generic_layouts)
 fig.show()
 
-x13 = pd.read_csv(rt+"/X13Model_out20220501/A%_pos.csv")
-stl = pd.read_csv(rt+"/STLModel_out20220501/A%_pos.csv")
-cissa = pd.read_csv(rt+"/CiSSAModel_out20220501/A%_pos.csv")
+data = store.pivot("A%_pos", end=end)
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=x13['ds'], y=x13.iloc[:,1], name="X13-ARIMA"))
-fig.add_trace(go.Scatter(x=stl['ds'], y=stl.iloc[:,1], name="STL"))
-fig.add_trace(go.Scatter(x=cissa['ds'], y=cissa.iloc[:,1], name="CiSSA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["X13Model"], name="X13-ARIMA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["STLModel"], name="STL"))
+fig.add_trace(go.Scatter(x=data.index, y=data["CiSSAModel"], name="CiSSA"))
 fig.update_layout(
     title="Valores A% para cada Modelo. Diagnóstico de todo el periodo ",
     yaxis_title="<b>Valores de A% pre-pandemia</b>",
@@ -107,13 +99,11 @@ fig.update_layout(
 fig.update_layout(**generic_layouts)
 fig.show()
 
-x13 = pd.read_csv(rt+"/X13Model_out20220501/MM%_pos.csv")
-stl = pd.read_csv(rt+"/STLModel_out20220501/MM%_pos.csv")
-cissa = pd.read_csv(rt+"/CiSSAModel_out20220501/MM%_pos.csv")
+data = store.pivot("MM%_pos", end=end)
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=x13['ds'], y=x13.iloc[:,1], name="X13-ARIMA"))
-fig.add_trace(go.Scatter(x=stl['ds'], y=stl.iloc[:,1], name="STL"))
-fig.add_trace(go.Scatter(x=cissa['ds'], y=cissa.iloc[:,1], name="CiSSA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["X13Model"], name="X13-ARIMA"))
+fig.add_trace(go.Scatter(x=data.index, y=data["STLModel"], name="STL"))
+fig.add_trace(go.Scatter(x=data.index, y=data["CiSSAModel"], name="CiSSA"))
 fig.update_layout(
     title="Valores MM% para cada Modelo. Diagnóstico de todo el periodo ",
     yaxis_title="<b>Valores de MM% pre-pandemia</b>",
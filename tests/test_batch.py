@@ -0,0 +1,38 @@
+import glob
+from os.path import join
+
+import numpy as np
+import pandas as pd
+
+from utils.batch import BatchRunner, LongReader
+
+
+def _long_csv(path, n_series=6, months=48):
+    dates = pd.date_range('2015-01-01', periods=months, freq='MS')
+    rng = np.random.default_rng(0)
+    frames = [pd.DataFrame({'series_id': f'{prefix}_{k}', 'date': dates,
+                            'value': 10 + np.sin(np.arange(months) * np.pi / 6) + rng.normal(0, 0.1, months)})
+              for k in range(n_series) for prefix in ('region', 'sector')]
+    pd.concat(frames).to_csv(path, index=False)
+
+
+def _run(input_path, output_dir, **kwargs):
+    runner = BatchRunner(output_dir, executor='serial', group_size=2, fmt='csv', **kwargs)
+    return runner.run(LongReader(input_path))
+
+
+def _dataset(output_dir):
+    return pd.concat([pd.read_csv(path) for path in glob.glob(join(output_dir, 'model=*', 'part-*'))])
+
+
+def test_rerun_replaces_previous_parts(tmp_path):
+    input_path, output_dir = str(tmp_path / 'largas.csv'), str(tmp_path / 'salida')
+    _long_csv(input_path)
+    _run(input_path, output_dir, routes=[('region_*', 'x11')], part_rows=100)
+    _run(input_path, output_dir, part_rows=100)
+    summary = _run(input_path, output_dir)
+    parts = glob.glob(join(output_dir, 'model=*', 'part-*'))
+    assert summary['complete'] and summary['parts'] == len(parts) == 1
+    data = _dataset(output_dir)
+    assert len(data) == summary['rows_out'] == 12 * 48
+    assert not data.duplicated(['series_id', 'date']).any()
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from utils.cube import CuboENE
+
+
+def _raw(rows):
+    return pd.DataFrame(rows, columns=['ano_encuesta', 'mes_encuesta', 'cae_especifico', 'sexo', 'edad', 'region', 'fact_cal'])
+
+
+def _cubo():
+    # Enero de 2020 está en los tres archivos; la región 2 solo tiene registros en uno
+    cubo = CuboENE(dims_extra=['region'])
+    cubo.agregar(_raw([(2020, 1, 8, 1, 30, 1, 10.0)] * 3), fuente='a.csv')
+    cubo.agregar(_raw([(2020, 1, 8, 1, 30, 1, 10.0)] * 3), fuente='b.csv')
+    cubo.agregar(_raw([(2020, 1, 8, 1, 30, 1, 10.0)] * 3 + [(2020, 1, 8, 1, 30, 2, 10.0)] * 3), fuente='c.csv')
+    return cubo
+
+
+def test_rollup_is_additive_across_breakdowns():
+    cubo = _cubo()
+    meses = ['ano_encuesta', 'mes_encuesta']
+    total = cubo.rollup(meses, estado='desocupado')
+    por_region = cubo.rollup(meses + ['region'], estado='desocupado')
+    assert total.loc[(2020, 1)] == 40.0
+    assert por_region.loc[(2020, 1, 2)] == 10.0
+    assert por_region.groupby(level=meses).sum().loc[(2020, 1)] == total.loc[(2020, 1)]
+
+
+def test_quitar_updates_the_month_divisor():
+    cubo = _cubo().quitar('a.csv')
+    assert cubo.rollup(['ano_encuesta', 'mes_encuesta'], estado='desocupado').loc[(2020, 1)] == 45.0
+    assert cubo.niveles().loc[(2020, 1), 'dh25'] == 4.5
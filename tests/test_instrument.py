@@ -0,0 +1,77 @@
+import time
+import logging
+
+import pytest
+
+from utils.instrument import Tracer, MEMORY_OVERHEAD
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    tracer = Tracer()
+    yield tracer
+    tracer.disable()
+
+
+def _rows(tracer):
+    return {row['name']: row for row in tracer.summary()}
+
+
+def test_span_tree_and_self_time(tracer, tmp_path):
+    tracer.enable(str(tmp_path))
+    with tracer.span('run'):
+        with tracer.span('stage:adjust', series=2) as attrs:
+            attrs['status'] = 'ejecutada'
+            for _ in range(2):
+                with tracer.span('fit'):
+                    time.sleep(0.02)
+    events = {event['name']: event for event in tracer.events()}
+    assert events['run']['parent'] is None
+    assert events['stage:adjust']['parent'] == events['run']['id']
+    assert events['fit']['parent'] == events['stage:adjust']['id']
+    assert events['stage:adjust']['attrs'] == {'series': 2, 'status': 'ejecutada'}
+    rows = _rows(tracer)
+    assert rows['fit']['calls'] == 2 and rows['fit']['total_s'] >= 0.04
+    assert rows['stage:adjust']['self_s'] < 0.01
+    assert 'stage:adjust' in tracer.format_summary()
+
+
+def test_span_records_error_and_reraises(tracer, tmp_path):
+    tracer.enable(str(tmp_path))
+    with pytest.raises(KeyError):
+        with tracer.span('stage:import'):
+            raise KeyError('td')
+    assert tracer.events()[0]['attrs']['error'] == 'KeyError'
+
+
+def test_budget_warns_once_on_memory_added(tracer, tmp_path, caplog):
+    tracer.enable(str(tmp_path), memory=True, budget_mb=5)
+    with caplog.at_level(logging.WARNING):
+        for _ in range(2):
+            with tracer.span('stage:adjust'):
+                data = b'\x01' * (20 * 2**20)
+                del data
+        with tracer.span('stage:rates'):
+            data = b'\x01' * 2**10
+    spans = [event for event in tracer.events() if event['name'] == 'stage:adjust']
+    assert all(span['attrs']['memory']['over_budget'] for span in spans)
+    assert spans[0]['attrs']['memory']['py_peak_mb'] >= 20
+    assert len([record for record in caplog.records if "'stage:adjust'" in record.getMessage()]) == 1
+    assert 'over_budget' not in tracer.events()[-1]['attrs']['memory']
+
+
+def test_memory_overhead_is_reported_apart(tracer, tmp_path):
+    tracer.enable(str(tmp_path), memory=True, top=5)
+    keep = []
+    with tracer.span('run'):
+        for _ in range(3):
+            with tracer.span('stage:adjust'):
+                keep.append(b'\x01' * 2**20)
+    rows = _rows(tracer)
+    stages = [event for event in tracer.events() if event['name'] == 'stage:adjust']
+    assert all(event['attrs']['memory']['top_allocations'] for event in stages)
+    overhead = sum(event['attrs']['memory']['overhead_s'] for event in stages)
+    assert rows[MEMORY_OVERHEAD]['calls'] == 4
+    # El tiempo propio de 'run' excluye la medición (las fotos) de sus hijos
+    assert rows['run']['self_s'] == pytest.approx(rows['run']['total_s'] - rows['stage:adjust']['total_s'] - overhead, abs=1e-9)
+    assert rows['run']['self_s'] < overhead
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.seasonal import STL
+from statsmodels.tsa.x13 import _find_x12
+
+from diagnostics.x11_comparison import synthetic_series, compare_x11
+from models.cissa import CiSSAModel
+from models.stl import STLModel
+from models.x11 import X11Model
+
+
+SERIES = [synthetic_series(10, seed) for seed in range(3)]
+
+
+def _rows(series):
+    return np.vstack([serie.to_numpy(dtype=float) for serie in series])
+
+
+@pytest.mark.parametrize('hiperparams', [{'seasonal': 13, 'robust': True}, {'seasonal': 7, 'robust': False}])
+def test_stl_batch_matches_statsmodels(hiperparams):
+    batch = STLModel(hiperparams).adjust_batch(_rows(SERIES))
+    for serie, seasadj in zip(SERIES, batch):
+        fit = STL(serie, **hiperparams).fit()
+        np.testing.assert_allclose(seasadj, (fit.trend + fit.resid).to_numpy(), rtol=0, atol=1e-10)
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+def test_cissa_batch_matches_loop():
+    batch = CiSSAModel().adjust_batch(_rows(SERIES))
+    loop = _rows([CiSSAModel().fit(serie).adjust().seasadj for serie in SERIES])
+    np.testing.assert_array_equal(batch, loop)
+
+
+def test_x11_batch_matches_loop():
+    batch = X11Model().adjust_batch(_rows(SERIES))
+    loop = _rows([X11Model().fit(serie).adjust().seasadj for serie in SERIES])
+    np.testing.assert_allclose(batch, loop, rtol=0, atol=1e-12)
+
+
+def test_x11_recovers_stable_seasonality():
+    # Tendencia lineal más un patrón estacional fijo: lejos de los extremos, los filtros
+    # simétricos de X-11 reproducen exactamente ambas componentes
+    years = 20
+    pattern = np.array([3, -1, 2, 0, -2, 1, -3, 2, -1, 0, 1, -2], dtype=float)
+    pattern -= pattern.mean()
+    trend = 10 + 0.05 * np.arange(12 * years)
+    index = pd.date_range('2000-01-01', periods=12 * years, freq='MS')
+    model = X11Model().fit(pd.Series(trend + np.tile(pattern, years), index=index)).adjust()
+    interior = slice(6 * 12, -6 * 12)
+    np.testing.assert_allclose(model.seasadj.to_numpy()[interior], trend[interior], rtol=0, atol=1e-3)
+    np.testing.assert_allclose(model.seasonal.to_numpy()[interior], np.tile(pattern, years)[interior], rtol=0, atol=1e-3)
+
+
+@pytest.mark.skipif(not _find_x12(os.getenv('X13PATH')), reason='x13as no está instalado (defina X13PATH)')
+@pytest.mark.parametrize('serie', [synthetic_series(n_years, seed=0) for n_years in (10, 20)], ids=['10y', '20y'])
+def test_x11_close_to_x13as(serie):
+    # Sin pre-ajuste regARIMA los extremos difieren más: se compara el interior
+    metrics = compare_x11(serie)
+    assert metrics['corr_estacional'] > 0.95
+    assert metrics['rmse_interior'] < 0.1
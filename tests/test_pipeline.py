@@ -0,0 +1,20 @@
+from utils.pipeline import Pipeline
+
+
+def test_stage_is_reused_when_inputs_match(tmp_path):
+    calls = []
+    for _ in range(2):
+        pipeline = Pipeline(str(tmp_path))
+        pipeline.run('download', lambda: calls.append(1) or {'2024-01': 'descargado'}, inputs=['2024-02-01'])
+    assert len(calls) == 1 and pipeline.report['download'] == 'reutilizada'
+
+
+def test_stage_not_recorded_when_keep_rejects_result(tmp_path):
+    calls = []
+    keep = lambda status: 'error' not in status.values()
+    for _ in range(2):
+        pipeline = Pipeline(str(tmp_path))
+        status = pipeline.run('download', lambda: calls.append(1) or {'2024-01': 'error'}, inputs=['2024-02-01'], keep=keep)
+        assert status == {'2024-01': 'error'} and pipeline.report['download'] == 'ejecutada'
+    assert len(calls) == 2
+    assert not (tmp_path / 'download.pkl').exists()
@@ -0,0 +1,49 @@
+import glob
+import shutil
+from os.path import join
+
+import pandas as pd
+
+from benchmarks.synthetic_ene import generar_anuales, generar_mensuales
+from utils.preprocess import ENE
+
+
+def _datos(path):
+    generar_anuales(join(path, 'raw', 'anual'), [2019], filas=300, columnas_extra=0)
+    generar_mensuales(join(path, 'raw', 'monthly'), [(2020, month) for month in range(1, 7)],
+                      filas=300, columnas_extra=0, layout='raw')
+    # Como en los datos reales, un mismo mes de encuesta no trae exactamente los mismos
+    # registros en los tres archivos de trimestre móvil que lo contienen
+    for k, file in enumerate(sorted(glob.glob(join(path, 'raw', 'monthly', '*.csv')))):
+        raw = pd.read_csv(file, sep=';', encoding='latin1')
+        raw.sample(frac=0.9, random_state=k).to_csv(file, sep=';', index=False, encoding='latin1')
+
+
+def _tasas(path, dedup):
+    ene = ENE(data_path=path)
+    ene.groupby_cae('anual')
+    ene.groupby_cae('mensual', dedup=dedup)
+    return pd.read_csv(join(path, 'preprocess', ene.final_name), sep=';')
+
+
+def test_dedup_ingest_matches_default_rates(tmp_path):
+    _datos(str(tmp_path / 'default'))
+    shutil.copytree(tmp_path / 'default', tmp_path / 'dedup')
+    default = _tasas(str(tmp_path / 'default'), dedup=False)
+    dedup = _tasas(str(tmp_path / 'dedup'), dedup=True)
+    pd.testing.assert_frame_equal(default, dedup)
+    # Segunda ejecución: los archivos ya están en el cubo y no se vuelven a leer
+    assert _tasas(str(tmp_path / 'dedup'), dedup=True).equals(dedup)
+
+
+def test_dedup_ingest_drops_removed_files(tmp_path):
+    _datos(str(tmp_path / 'default'))
+    shutil.copytree(tmp_path / 'default', tmp_path / 'dedup')
+    _tasas(str(tmp_path / 'dedup'), dedup=True)
+    for path in ('default', 'dedup'):
+        last = sorted(glob.glob(str(tmp_path / path / 'raw' / 'monthly' / '*.csv')))[-1]
+        shutil.move(last, str(tmp_path / f'{path}.csv'))
+    dedup = _tasas(str(tmp_path / 'dedup'), dedup=True)
+    cubo = ENE(data_path=str(tmp_path / 'dedup')).cargar_cubo()
+    assert len(cubo.fuentes) == 5
+    pd.testing.assert_frame_equal(_tasas(str(tmp_path / 'default'), dedup=False), dedup)
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from utils.scheduler import CostModel, MODEL_COST, utilization
+
+
+def test_utilization_on_hand_built_intervals():
+    # Dos workers ocupados de 0 a 4; luego una sola tarea hasta 6
+    report = utilization([(0, 4), (0, 2), (2, 4), (4, 6)], workers=2)
+    assert report == {'workers': 2, 'tasks': 4, 'wall_s': 6, 'busy_s': 10,
+                      'utilization': pytest.approx(10 / 12, abs=1e-3), 'tail_s': 2}
+
+
+def test_utilization_never_full_and_empty():
+    assert utilization([(0, 1), (0, 2)], workers=3)['tail_s'] == 2
+    assert utilization([], workers=4)['tasks'] == 0
+
+
+def test_cost_model_priors_and_learning(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    costs = CostModel()
+    ratio = costs.estimate('history', 'X13Model', 100) / costs.estimate('history', 'STLModel', 100)
+    assert ratio == pytest.approx(MODEL_COST['X13Model'] / MODEL_COST['STLModel'])
+    costs.observe('adjust', 'STLModel', 100, 1.0)
+    assert costs.rate('adjust', 'STLModel') == pytest.approx(0.01)
+    costs.observe('adjust', 'STLModel', 100, 2.0)
+    assert costs.rate('adjust', 'STLModel') == pytest.approx(0.7 * 0.01 + 0.3 * 0.02)
+    # Los pares sin mediciones se escalan con lo aprendido
+    assert costs.rate('adjust', 'X13Model') == pytest.approx(12 * costs.rate('adjust', 'STLModel'))
+    costs.save()
+    assert not list(tmp_path.iterdir())
+
+
+def test_cost_model_roundtrip(tmp_path):
+    path = tmp_path / 'state' / 'costs.json'
+    costs = CostModel(str(path))
+    costs.observe('vintage', 'CiSSAModel', 50, 0.5)
+    costs.save()
+    assert json.loads(path.read_text()) == {'vintage|CiSSAModel': 0.01}
+    assert CostModel(str(path)).rate('vintage', 'CiSSAModel') == pytest.approx(0.01)
+    with pytest.raises(ValueError):
+        costs.estimate('nope', 'STLModel', 10)
@@ -0,0 +1,91 @@
+import json
+import threading
+import http.client
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.server import AdjustBatcher, Service, ServiceBusy, make_server
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    dates = pd.date_range('2012-01-01', periods=96, freq='MS')
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({'ano': dates.year, 'mes': dates.month})
+    for k, name in enumerate(['td', 'tdh', 'tdm']):
+        data[name] = 8 + k + np.sin(np.arange(96) * np.pi / 6) + rng.normal(0, 0.1, 96)
+    path = tmp_path / 'tasa.csv'
+    data.to_csv(path, sep=';', index=False)
+    return str(path)
+
+
+@pytest.fixture
+def server(input_file):
+    service = Service(input_file, max_concurrent=2, queue_timeout=0.05)
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _request(server, method, path, body=None):
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=30)
+    connection.request(method, path, body=None if body is None else json.dumps(body).encode())
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read())
+    connection.close()
+    return result
+
+
+def test_adjust_and_health(server):
+    status, result = _request(server, 'POST', '/adjust', {'model': 'stl', 'series': ['td', 'tdh']})
+    assert status == 200 and set(result['series']) == {'td_std', 'tdh_std'} and len(result['index']) == 96
+    status, health = _request(server, 'GET', '/health')
+    assert status == 200 and health['requests'] == 1 and health['series'] == ['td', 'tdh', 'tdm']
+
+
+@pytest.mark.parametrize('body', [[1, 2], {'model': 'stl', 'series': 5}, {'model': 'stl', 'series': [1]},
+                                  {'model': ['stl']}, {'model': 'nope'}, {'model': 'stl', 'series': ['nope']}])
+def test_malformed_payloads_are_400(server, body):
+    status, result = _request(server, 'POST', '/adjust', body)
+    assert status == 400 and 'error' in result
+
+
+def test_unknown_route_is_404(server):
+    assert _request(server, 'POST', '/nope', {})[0] == 404
+    assert _request(server, 'GET', '/nope')[0] == 404
+
+
+def test_busy_service_returns_503(server):
+    service, started, release = server.service, threading.Event(), threading.Event()
+    service._slots = threading.BoundedSemaphore(1)
+    holder = threading.Thread(target=service.run, args=(lambda payload: started.set() or release.wait(), {}))
+    holder.start()
+    started.wait()
+    try:
+        with pytest.raises(ServiceBusy):
+            service.run(lambda payload: None, {})
+        assert _request(server, 'POST', '/adjust', {'model': 'stl'})[0] == 503
+    finally:
+        release.set()
+        holder.join()
+
+
+def test_batcher_groups_concurrent_requests(input_file):
+    data = Service(input_file).data
+    batcher = AdjustBatcher(window=0.2)
+    results = {}
+    threads = [threading.Thread(target=lambda name=name: results.__setitem__(name, batcher.submit('stl', data[name])))
+               for name in data.columns]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert batcher.batches == 1
+    single = AdjustBatcher(window=0).submit('stl', data['tdm'])
+    np.testing.assert_allclose(results['tdm'].to_numpy(), single.to_numpy(), rtol=0, atol=1e-10)
+    assert results['td'].name == 'td'
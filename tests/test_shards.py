@@ -0,0 +1,65 @@
+import os
+import time
+
+import pytest
+
+from utils.shards import ShardJob, ShardWorker
+
+
+SHARDS = [{'id': f'shard-{k}', 'kind': 'otro'} for k in range(2)]
+
+
+@pytest.fixture
+def job_dir(tmp_path):
+    ShardJob(str(tmp_path)).create(SHARDS)
+    return str(tmp_path)
+
+
+def _expire(job, shard_id):
+    old = time.time() - 3600
+    os.utime(job._lock(shard_id), (old, old))
+
+
+def test_live_lock_is_not_claimed(job_dir):
+    a, b = ShardJob(job_dir), ShardJob(job_dir)
+    assert a.claim('shard-0', 'a', lease=60)
+    assert not b.claim('shard-0', 'b', lease=60)
+    assert a.owns('shard-0') and not b.owns('shard-0')
+    a.release('shard-0')
+    assert not os.path.exists(a._lock('shard-0'))
+
+
+def test_stale_lock_is_reclaimed_and_old_owner_cannot_release_it(job_dir):
+    a, b = ShardJob(job_dir), ShardJob(job_dir)
+    assert a.claim('shard-0', 'a', lease=60)
+    _expire(a, 'shard-0')
+    assert b.claim('shard-0', 'b', lease=60)
+    assert b.owns('shard-0') and not a.owns('shard-0')
+    # El dueño anterior termina tarde: no debe borrar el lock nuevo
+    a.release('shard-0')
+    assert b.owns('shard-0')
+
+
+def test_stale_reclaim_race_keeps_the_new_lock(job_dir):
+    a, b, c = ShardJob(job_dir), ShardJob(job_dir), ShardJob(job_dir)
+    assert a.claim('shard-0', 'a', lease=60)
+    _expire(a, 'shard-0')
+    path = a._lock('shard-0')
+    # b y c ven el mismo lock vencido; b lo reclama primero y crea el suyo
+    stale = c._owner(path)
+    assert b.claim('shard-0', 'b', lease=60)
+    assert not c._take(path, stale, 'stale-c')
+    assert b.owns('shard-0')
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.startswith('shard-0.lock.')]
+
+
+def test_failed_shards_stop_after_max_attempts_until_retry(job_dir):
+    job = ShardJob(job_dir)
+    counts = ShardWorker(job, worker='w', max_attempts=2).run()
+    assert counts == {'completed': 0, 'failed': 4}
+    assert set(job.status(max_attempts=2).values()) == {'agotado'}
+    assert ShardWorker(job, worker='w', max_attempts=2).run()['failed'] == 0
+    assert job.retry(['shard-1']) == ['shard-1']
+    assert job.status(max_attempts=2) == {'shard-0': 'agotado', 'shard-1': 'pendiente'}
+    assert ShardWorker(job, worker='w', max_attempts=2).run()['failed'] == 2
+    assert len(job.attempts('shard-1')) == 2 and not os.listdir(job.locks)
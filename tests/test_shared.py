@@ -0,0 +1,77 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from diagnostics.x13_diags import RevisionHistory
+from models.stl import STLModel
+from utils import shared
+from utils.shared import SharedArray, SharedSeries
+
+
+def _serie(n=40):
+    index = pd.date_range('2018-01-01', periods=n, freq='MS', name='ds')
+    values = 8 + np.sin(np.arange(n) * np.pi / 6) + np.random.default_rng(0).normal(0, 0.1, n)
+    return pd.Series(values, index=index, name='td')
+
+
+def test_attach_sees_the_creators_block():
+    with SharedArray((3, 4), fill=np.nan) as matrix:
+        name = matrix.handle[0]
+        view = SharedArray.attach(matrix.handle)
+        view[:, 1] = 7.0
+        assert np.isnan(matrix.array[:, 0]).all() and (matrix.array[:, 1] == 7.0).all()
+        del view
+        shared._release(name)
+    local = SharedArray(3, shared=False)
+    assert SharedArray.attach(local.handle) is local.array
+
+
+def test_close_with_live_views_unlinks_the_block():
+    matrix = SharedArray((4, 2), fill=0.0)
+    name = matrix.handle[0]
+    # Una vista en un ciclo de referencias, como un DataFrame temporal sin copiar
+    frame = pd.DataFrame(matrix.array, copy=False)
+    cycle = [frame]
+    cycle.append(cycle)
+    del frame, cycle
+    matrix.close()
+    assert matrix.array is None
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    matrix.close()
+
+
+def test_attached_blocks_are_bounded(monkeypatch):
+    monkeypatch.setattr(shared, 'MAX_ATTACHED', 2)
+    blocks = [SharedArray(2, fill=k) for k in range(3)]
+    try:
+        for block in blocks:
+            assert SharedArray.attach(block.handle)[0] == block.array[0]
+        assert len(shared._ATTACHED) <= 2
+    finally:
+        for name in list(shared._ATTACHED):
+            shared._release(name)
+        for block in blocks:
+            block.close()
+
+
+def test_shared_series_reads_slices():
+    serie = _serie()
+    with SharedSeries(serie) as source:
+        part = SharedSeries.read(source.handle, 5, 17)
+    pd.testing.assert_series_equal(part, serie.iloc[5:17])
+    assert part.index.freqstr == 'MS'
+    for name in list(shared._ATTACHED):
+        shared._release(name)
+
+
+def test_revision_history_process_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    serie = _serie()
+    serial = RevisionHistory(STLModel()).fit(serie)
+    parallel = RevisionHistory(STLModel(), executor='process', max_workers=2).fit(serie)
+    pd.testing.assert_frame_equal(serial.A, parallel.A)
+    pd.testing.assert_frame_equal(serial.C, parallel.C)
+    assert not list(tmp_path.iterdir())
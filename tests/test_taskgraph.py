@@ -0,0 +1,64 @@
+import pytest
+
+from utils.taskgraph import TaskGraph
+
+
+def _record(order, name):
+    order.append(name)
+    return name
+
+
+def _fail():
+    raise ValueError('falla')
+
+
+def test_longest_chain_dispatched_first():
+    order = []
+    graph = TaskGraph('serial')
+    graph.add('corta', _record, order, 'corta', cost=5)
+    graph.add('a', _record, order, 'a', cost=1)
+    graph.add('b', lambda order, name, _: _record(order, name), order, 'b', deps=['a'], cost=100)
+    graph.add('media', _record, order, 'media', cost=10)
+    assert graph.priorities() == {'corta': 5, 'a': 101, 'b': 100, 'media': 10}
+    graph.run()
+    assert order == ['a', 'b', 'media', 'corta']
+
+
+@pytest.mark.parametrize('executor', ['serial', 'thread'])
+def test_failing_task_skips_dependents_and_reraises(executor):
+    done = []
+    graph = TaskGraph(executor, max_workers=2)
+    graph.add('mala', _fail)
+    graph.add('hija', lambda _: 'hija', deps=['mala'], on_done=done.append)
+    graph.add('nieta', lambda _: 'nieta', deps=['hija'], on_done=done.append)
+    graph.add('otra', lambda: 'otra', on_done=done.append)
+    with pytest.raises(ValueError, match='falla'):
+        graph.run()
+    assert done == ['otra'] and graph.results == {'otra': 'otra'}
+    assert isinstance(graph.errors['hija'], RuntimeError) and isinstance(graph.errors['nieta'], RuntimeError)
+
+
+def test_add_rejects_unknown_deps_and_duplicates():
+    graph = TaskGraph('serial').add('a', sum, [1])
+    with pytest.raises(ValueError):
+        graph.add('a', sum, [1])
+    with pytest.raises(ValueError):
+        graph.add('b', sum, deps=['c'])
+
+
+def test_run_without_raising_keeps_task_errors():
+    graph = TaskGraph('thread', max_workers=2)
+    graph.add('mala', _fail)
+    graph.add('otra', lambda: 'otra')
+    assert graph.run(raise_errors=False) == {'otra': 'otra'}
+    assert isinstance(graph.errors['mala'], ValueError)
+
+
+def test_run_without_raising_propagates_pool_errors(monkeypatch):
+    graph = TaskGraph('thread').add('a', sum, [1])
+
+    def broken_pool():
+        raise OSError('sin recursos para el pool')
+    monkeypatch.setattr(graph, '_pool', broken_pool)
+    with pytest.raises(OSError):
+        graph.run(raise_errors=False)
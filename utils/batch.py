@@ -0,0 +1,361 @@
+"""
+Desestacionalización por lotes de miles de series en formato largo (series_id, date, value).
+
+La entrada se lee por bloques y cada serie completa se envía, en grupos, a un pool de
+workers; los resultados se escriben a medida que llegan en archivos particionados por
+modelo (`<salida>/model=stl/part-00000.parquet`, o `.csv` sin pyarrow). La memoria
+queda acotada por el tamaño de bloque, los grupos en vuelo y las filas por archivo;
+del número de series solo depende el conjunto de ids ya leídos (unas decenas de bytes
+por serie), con el que se detectan series no contiguas.
+
+    python -m utils.batch -i series_largas.csv -o output/batch --model stl --route 'region_*=x13'
+"""
+import os
+import csv
+import glob
+import json
+import time
+import zlib
+import shutil
+import fnmatch
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from os.path import join
+
+import numpy as np
+import pandas as pd
+
+from main import MODELS, model_class
+from utils.instrument import TRACER
+from utils.taskgraph import EXECUTORS, _SerialExecutor
+
+
+FORMATS = ('auto', 'parquet', 'csv')
+
+
+def shard_of(series_id, shards) -> int:
+    """Partición estable (entre procesos y máquinas) de `series_id` entre `shards` partes."""
+    return zlib.crc32(series_id.encode()) % shards
+
+
+class LongReader():
+    """
+    Itera las series de un CSV largo como (series_id, pd.Series mensual), leyendo
+    `chunksize` filas a la vez.
+
+    Por defecto las filas de cada serie deben venir contiguas (p. ej. ordenadas por
+    series_id); si una serie reaparece más adelante se lanza ValueError. Para detectarlo
+    se guardan los ids ya leídos, lo único que crece con el número de series. Con `buckets`
+    la entrada puede venir en cualquier orden: primero se reparte por hash de series_id
+    en `buckets` archivos temporales y luego se lee cada uno completo.
+    """
+    def __init__(self, path, sep=',', columns=('series_id', 'date', 'value'), chunksize=200_000, buckets=None) -> None:
+        self.path = path
+        self.sep = sep
+        self.columns = list(columns)
+        self.chunksize = chunksize
+        self.buckets = buckets
+        self.rows = 0
+
+    def _chunks(self, path):
+        id_col, date_col, value_col = self.columns
+        reader = pd.read_csv(path, sep=self.sep, usecols=self.columns, chunksize=self.chunksize,
+                             dtype={id_col: str, date_col: str, value_col: float})
+        for chunk in reader:
+            self.rows += len(chunk)
+            yield chunk.rename(columns={id_col: 'series_id', date_col: 'date', value_col: 'value'})
+
+    @staticmethod
+    def _serie(series_id, rows:pd.DataFrame) -> pd.Series:
+        dates = pd.to_datetime(rows['date']).dt.to_period('M').dt.to_timestamp()
+        serie = pd.Series(rows['value'].to_numpy(dtype=float), index=pd.DatetimeIndex(dates), name=series_id)
+        if serie.index.has_duplicates:
+            raise ValueError(f"La serie '{series_id}' tiene fechas repetidas")
+        # Meses faltantes quedan como NaN: índice mensual regular que los modelos esperan
+        return serie.sort_index().asfreq('MS')
+
+    def _contiguous(self, chunks):
+        seen, pending = set(), []
+        for chunk in chunks:
+            ids = chunk['series_id'].to_numpy()
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            bounds = list(zip(starts, np.r_[starts[1:], len(ids)]))
+            for start, end in bounds:
+                series_id = ids[start]
+                if pending and pending[0]['series_id'].iat[0] != series_id:
+                    yield self._finish(pending, seen)
+                    pending = []
+                if not pending and series_id in seen:
+                    raise ValueError(f"La serie '{series_id}' no es contigua en '{self.path}': "
+                                     "ordene la entrada por series_id o use buckets")
+                pending.append(chunk.iloc[start:end])
+        if pending:
+            yield self._finish(pending, seen)
+
+    def _finish(self, pending, seen):
+        rows = pd.concat(pending) if len(pending) > 1 else pending[0]
+        series_id = rows['series_id'].iat[0]
+        seen.add(series_id)
+        return series_id, self._serie(series_id, rows)
+
+    def _bucketed(self):
+        tmp = tempfile.mkdtemp(prefix='ine-batch-')
+        try:
+            paths = [join(tmp, f'bucket-{k:04d}.csv') for k in range(self.buckets)]
+            for chunk in self._chunks(self.path):
+                bucket = chunk['series_id'].map(lambda series_id: shard_of(series_id, self.buckets))
+                for k, rows in chunk.groupby(bucket):
+                    rows.to_csv(paths[k], mode='a', index=False, header=not os.path.exists(paths[k]))
+            for path in paths:
+                if not os.path.exists(path):
+                    continue
+                rows = pd.read_csv(path, dtype={'series_id': str, 'date': str, 'value': float})
+                for series_id, group in rows.groupby('series_id', sort=False):
+                    yield series_id, self._serie(series_id, group)
+                os.remove(path)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def __iter__(self):
+        if self.buckets:
+            return self._bucketed()
+        return self._contiguous(self._chunks(self.path))
+
+
+def _adjust_group(items) -> tuple:
+    """
+    Desestacionaliza un grupo de series [(series_id, modelo, fechas, valores)]. Las series
+    de un mismo modelo con igual índice y sin NaN se ajustan juntas con adjust_batch.
+    Retorna (resultados, errores). Nivel de módulo para poder enviarse a procesos.
+    """
+    results, errors = [], []
+    groups = {}
+    for series_id, name, dates, values in items:
+        groups.setdefault((name, dates[0], len(dates), bool(np.isnan(values).any())), []).append((series_id, dates, values))
+    with TRACER.span('batch:group', series=len(items)):
+        for (name, _, _, has_nan), members in groups.items():
+            if not has_nan and len(members) > 1:
+                try:
+                    model = model_class(name)()
+                    if model.supports_batch:
+                        seasadj = model.adjust_batch(np.vstack([values for _, _, values in members]))
+                        results.extend((series_id, name, dates, values, adjusted)
+                                       for (series_id, dates, values), adjusted in zip(members, seasadj))
+                        continue
+                except Exception as e:
+                    # Se reintenta serie por serie: así el error queda solo en las series que lo causan
+                    logging.debug(f"Ajuste conjunto de {len(members)} series ({name}) falló: {type(e).__name__}: {e}")
+            for series_id, dates, values in members:
+                try:
+                    serie = pd.Series(values, index=pd.DatetimeIndex(dates, freq='MS'), name=series_id)
+                    model = model_class(name)()
+                    model.fit(serie)
+                    model.adjust()
+                    seasadj = model.seasadj.to_numpy(dtype=float)
+                    if np.isnan(seasadj).all():
+                        raise ValueError('el ajuste no produjo valores (¿meses faltantes?)')
+                    results.append((series_id, name, dates, values, seasadj))
+                except Exception as e:
+                    errors.append((series_id, name, f'{type(e).__name__}: {e}'))
+    return results, errors
+
+
+class PartitionWriter():
+    """
+    Escribe los resultados en `output_dir/model=<modelo>/part-NNNNN.<formato>` cada vez
+    que un modelo acumula `part_rows` filas. Cada archivo se escribe con un nombre
+    temporal y se renombra al terminar, de modo que nunca queda una partición a medias.
+    Al crearlo se borran las particiones de una ejecución anterior en `output_dir`, para
+    que el directorio contenga solo las de esta.
+    """
+    def __init__(self, output_dir, fmt='auto', part_rows=500_000) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Valores permitidos para fmt son: {FORMATS}")
+        if fmt == 'auto':
+            try:
+                import pyarrow  # noqa: F401
+                fmt = 'parquet'
+            except ImportError:
+                fmt = 'csv'
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.part_rows = part_rows
+        self.parts = []
+        self.rows = 0
+        self._buffers = {}
+        self._buffered = {}
+        os.makedirs(output_dir, exist_ok=True)
+        stale = glob.glob(join(output_dir, 'model=*', 'part-*'))
+        for path in stale:
+            os.remove(path)
+        if stale:
+            logging.info(f"Se borraron {len(stale)} particiones de una ejecución anterior en '{output_dir}'")
+
+    def add(self, series_id, name, dates, values, seasadj):
+        buffer = self._buffers.setdefault(name, [])
+        buffer.append(pd.DataFrame({'series_id': series_id, 'date': pd.DatetimeIndex(dates),
+                                    'value': values, 'seasadj': seasadj}))
+        self._buffered[name] = self._buffered.get(name, 0) + len(dates)
+        if self._buffered[name] >= self.part_rows:
+            self._flush(name)
+
+    def _flush(self, name):
+        buffer = self._buffers.pop(name, [])
+        self._buffered.pop(name, None)
+        if not buffer:
+            return
+        data = pd.concat(buffer, ignore_index=True)
+        directory = join(self.output_dir, f'model={name}')
+        os.makedirs(directory, exist_ok=True)
+        path = join(directory, f'part-{len(self.parts):05d}.{self.fmt}')
+        tmp_path = path + '.tmp'
+        if self.fmt == 'parquet':
+            data.to_parquet(tmp_path, index=False)
+        else:
+            data.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.parts.append(path)
+        self.rows += len(data)
+
+    def close(self):
+        for name in list(self._buffers):
+            self._flush(name)
+
+
+class BatchRunner():
+    """
+    Enruta cada serie a un modelo y la desestacionaliza en un pool de workers.
+
+    `routes` es una lista de (patrón, modelo) con patrones fnmatch sobre series_id; la
+    primera coincidencia gana y las demás series usan `model`. Las series se envían en
+    grupos de `group_size` y nunca hay más de `max_pending` grupos en vuelo, de modo que
+    la lectura se detiene mientras los workers están ocupados.
+
+    >>> runner = BatchRunner('output/batch', model='stl', routes=[('region_*', 'x13')])
+    >>> runner.run(LongReader('series_largas.csv'))
+    """
+    def __init__(self, output_dir, model='stl', routes=(), executor='process', max_workers=None,
+                 group_size=64, max_pending=None, fmt='auto', part_rows=500_000) -> None:
+        unknown = [name for name in [model, *(name for _, name in routes)] if name not in MODELS]
+        if unknown:
+            raise ValueError(f"Modelos inválidos: {unknown}. Valores permitidos: {list(MODELS)}")
+        if executor not in EXECUTORS:
+            raise ValueError(f"Valores permitidos para executor son: {EXECUTORS}")
+        self.model = model
+        self.routes = list(routes)
+        self.executor = executor
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.group_size = group_size
+        self.max_pending = max_pending or 2 * self.max_workers
+        self.writer = PartitionWriter(output_dir, fmt=fmt, part_rows=part_rows)
+        self.errors_path = join(output_dir, 'errors.csv')
+        self.counts = {'series': 0, 'adjusted': 0, 'errors': 0}
+
+    def route(self, series_id) -> str:
+        for pattern, name in self.routes:
+            if fnmatch.fnmatchcase(series_id, pattern):
+                return name
+        return self.model
+
+    def _pool(self):
+        if self.executor == 'thread':
+            return ThreadPoolExecutor(max_workers=self.max_workers)
+        if self.executor == 'process':
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return _SerialExecutor()
+
+    def _collect(self, future, group, errors_file):
+        try:
+            results, errors = future.result()
+        except Exception as e:
+            # El worker murió o el grupo falló completo: sus series quedan como errores
+            results, errors = [], [(series_id, name, f'{type(e).__name__}: {e}') for series_id, name, _, _ in group]
+        for result in results:
+            self.writer.add(*result)
+        for series_id, name, message in errors:
+            errors_file.writerow([series_id, name, message])
+            logging.warning(f"Serie '{series_id}' ({name}) no se pudo desestacionalizar: {message}")
+        self.counts['adjusted'] += len(results)
+        self.counts['errors'] += len(errors)
+
+    def run(self, reader) -> dict:
+        """
+        Ajusta todas las series de `reader`. Si la ejecución se interrumpe (p. ej. un
+        error de lectura), lo ya ajustado se escribe igual y summary.json queda con
+        `complete` en False antes de relanzar el error.
+        """
+        start = time.perf_counter()
+        running = {}
+        complete = False
+        try:
+            with self._pool() as pool, open(self.errors_path, 'w', encoding='utf-8', newline='') as file:
+                errors_file = csv.writer(file)
+                errors_file.writerow(['series_id', 'model', 'error'])
+                group = []
+                try:
+                    for series_id, serie in reader:
+                        self.counts['series'] += 1
+                        group.append((series_id, self.route(series_id), serie.index.to_numpy(), serie.to_numpy(dtype=float)))
+                        if len(group) < self.group_size:
+                            continue
+                        running[pool.submit(_adjust_group, group)] = group
+                        group = []
+                        while len(running) >= self.max_pending:
+                            done, _ = wait(running, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                self._collect(future, running.pop(future), errors_file)
+                    if group:
+                        running[pool.submit(_adjust_group, group)] = group
+                finally:
+                    # Los grupos en vuelo se escriben aunque la lectura se haya interrumpido
+                    for future in list(running):
+                        self._collect(future, running.pop(future), errors_file)
+            complete = True
+        finally:
+            self.writer.close()
+            summary = {**self.counts, 'rows_in': getattr(reader, 'rows', None), 'rows_out': self.writer.rows,
+                       'parts': len(self.writer.parts), 'format': self.writer.fmt, 'complete': complete,
+                       'seconds': round(time.perf_counter() - start, 3)}
+            with open(join(self.writer.output_dir, 'summary.json'), 'w', encoding='utf-8') as file:
+                json.dump(summary, file, indent=2)
+        return summary
+
+
+def _route(value):
+    pattern, _, name = value.rpartition('=')
+    if not pattern or name not in MODELS:
+        raise argparse.ArgumentTypeError(f"Ruta inválida '{value}': use PATRÓN=MODELO con MODELO en {list(MODELS)}")
+    return pattern, name
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Desestacionaliza series en formato largo (series_id, date, value) por lotes.')
+    parser.add_argument('-i', '--input', required=True, help='CSV largo con una fila por serie y mes.')
+    parser.add_argument('-o', '--output', default=join('output', 'batch'), help="Directorio de salida. Por defecto: 'output/batch'.")
+    parser.add_argument('--sep', default=',', help="Separador del CSV. Por defecto: ','.")
+    parser.add_argument('--columns', default='series_id,date,value', help="Columnas de id, fecha y valor. Por defecto: 'series_id,date,value'.")
+    parser.add_argument('--model', default='stl', choices=list(MODELS), help="Modelo por defecto. Por defecto: 'stl'.")
+    parser.add_argument('--route', type=_route, action='append', default=[], metavar='PATRÓN=MODELO',
+                        help="Modelo para las series cuyo id coincide con el patrón (fnmatch). Puede repetirse.")
+    parser.add_argument('--executor', default='process', choices=EXECUTORS)
+    parser.add_argument('--workers', type=int, default=None, help='Workers del pool. Por defecto: número de CPUs.')
+    parser.add_argument('--group_size', type=int, default=64, help='Series por tarea. Por defecto: 64.')
+    parser.add_argument('--chunksize', type=int, default=200_000, help='Filas leídas por bloque. Por defecto: 200000.')
+    parser.add_argument('--buckets', type=int, default=None, help='Entrada no ordenada por series_id: número de particiones temporales.')
+    parser.add_argument('--format', default='auto', choices=FORMATS, help="'parquet' requiere pyarrow; 'auto' lo usa si está instalado.")
+    parser.add_argument('--part_rows', type=int, default=500_000, help='Filas por archivo de salida. Por defecto: 500000.')
+    parser.add_argument('--log_level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+
+    columns = [column.strip() for column in args.columns.split(',')]
+    if len(columns) != 3:
+        parser.error("--columns debe tener tres nombres: id, fecha y valor")
+    reader = LongReader(args.input, sep=args.sep, columns=columns, chunksize=args.chunksize, buckets=args.buckets)
+    runner = BatchRunner(args.output, model=args.model, routes=args.route, executor=args.executor,
+                         max_workers=args.workers, group_size=args.group_size, fmt=args.format, part_rows=args.part_rows)
+    summary = runner.run(reader)
+    logging.info(f"{summary['adjusted']} de {summary['series']} series desestacionalizadas en {summary['seconds']:.1f} s "
+                 f"({summary['parts']} archivos {summary['format']} en '{args.output}', {summary['errors']} errores)")
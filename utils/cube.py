@@ -0,0 +1,146 @@
+import os
+import pickle
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+ESTADOS = {'ocupado': [1, 2, 3, 4, 5, 6, 7], 'desocupado': [8, 9]}
+
+
+class CuboENE():
+    """
+    Cubo de conteos de la ENE por mes de encuesta, condición de actividad, sexo, edad
+    simple y dimensiones adicionales de los microdatos.
+
+    Guarda dos medidas: `n` (registros) y `fact_cal` (suma del factor de expansión).
+    Cualquier desagregación nueva (otros tramos de edad, agregados de fuerza de
+    trabajo, etc.) se obtiene con `rollup` sin volver a leer los archivos crudos.
+
+    Los conteos se guardan por archivo de origen (`fuente`): cada mes de encuesta
+    aparece en los tres archivos de trimestre móvil que lo contienen, y su valor es el
+    promedio entre ellos (una celda sin registros en un archivo cuenta como 0), igual
+    que en la agregación sin cubo de `ENE.groupby_cae`.
+    """
+    BASE_DIMS = ['ano_encuesta', 'mes_encuesta', 'cae_especifico', 'sexo', 'edad']
+    MEDIDAS = ['n', 'fact_cal']
+    # Formato del pickle: cubos de otra versión se reconstruyen
+    VERSION = 2
+
+    def __init__(self, dims_extra=(), datos:pd.DataFrame=None, fuentes:dict=None) -> None:
+        self.dims = self.BASE_DIMS + [dim for dim in dims_extra if dim not in self.BASE_DIMS]
+        self.datos = datos if datos is not None else pd.DataFrame(columns=self.dims + ['fuente'] + self.MEDIDAS)
+        # {archivo: firma (tamaño, mtime) con que se leyó}
+        self.fuentes = fuentes if fuentes is not None else {}
+
+    @classmethod
+    def cargar(cls, path, dims_extra=()):
+        """Carga el cubo desde `path`. Si no existe o sus dimensiones o versión difieren, retorna un cubo vacío."""
+        cubo = cls(dims_extra)
+        if not os.path.isfile(path):
+            return cubo
+        with open(path, 'rb') as file:
+            estado = pickle.load(file)
+        if estado.get('version') != cls.VERSION:
+            logging.warning("El cubo tiene un formato anterior, se reconstruirá.")
+            return cubo
+        if estado['dims'] != cubo.dims:
+            logging.warning(f"Dimensiones del cubo cambiaron ({estado['dims']} -> {cubo.dims}), se reconstruirá.")
+            return cubo
+        return cls(dims_extra, datos=estado['datos'], fuentes=estado['fuentes'])
+
+    def guardar(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump({'version': self.VERSION, 'dims': self.dims, 'datos': self.datos, 'fuentes': self.fuentes},
+                        file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def columnas(self) -> list:
+        """Columnas de los microdatos necesarias para alimentar el cubo."""
+        return self.dims + ['fact_cal']
+
+    def agregar(self, raw:pd.DataFrame, fuente, firma=None):
+        """Agrega los conteos de `raw`, leídos del archivo `fuente`; reemplaza los de una lectura anterior de ese archivo."""
+        faltantes = [dim for dim in self.dims if dim not in raw.columns]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en los microdatos para el cubo: {faltantes}")
+        self.quitar(fuente)
+        self.fuentes[fuente] = firma
+        if raw.empty:
+            return self
+        pesos = raw['fact_cal'] if 'fact_cal' in raw.columns else pd.Series(1.0, index=raw.index)
+        nuevo = (raw[self.dims].assign(n=1, fact_cal=pesos)
+                 .groupby(self.dims, observed=True, dropna=False)[self.MEDIDAS].sum()
+                 .reset_index())
+        nuevo.insert(len(self.dims), 'fuente', fuente)
+        self.datos = nuevo if self.datos.empty else pd.concat([self.datos, nuevo], axis=0, ignore_index=True)
+        return self
+
+    def quitar(self, fuente):
+        """Descarta los conteos del archivo `fuente` (p. ej. si cambió o ya no existe)."""
+        self.fuentes.pop(fuente, None)
+        if not self.datos.empty:
+            self.datos = self.datos.loc[self.datos['fuente'] != fuente].reset_index(drop=True)
+        return self
+
+    def _sumar(self, datos, by, medida) -> pd.Series:
+        """
+        Suma `medida` por `by`, promediando cada mes de encuesta entre los archivos que lo
+        contienen. El divisor es el número de archivos del cubo con ese mes, aunque la
+        celda no tenga registros en todos: así los roll-ups son aditivos entre desagregaciones.
+        """
+        meses = ['ano_encuesta', 'mes_encuesta']
+        otras = [dim for dim in by if dim not in meses]
+        suma = datos.groupby(meses + otras, observed=True)[medida].sum()
+        archivos = self.datos.groupby(meses)['fuente'].nunique()
+        divisor = archivos.reindex(pd.MultiIndex.from_arrays([suma.index.get_level_values(mes) for mes in meses]))
+        por_mes = suma / divisor.to_numpy()
+        return por_mes.groupby(level=list(by), observed=True).sum()
+
+    def _con_derivadas(self, edades=None) -> pd.DataFrame:
+        datos = self.datos
+        estado = np.select([datos['cae_especifico'].isin(codigos) for codigos in ESTADOS.values()],
+                           list(ESTADOS.keys()), default='inactivo')
+        datos = datos.assign(estado=estado)
+        if edades is not None:
+            datos = datos.assign(tramo_edad=pd.cut(datos['edad'], bins=edades, right=False))
+        return datos
+
+    def rollup(self, by, medida='fact_cal', edades=None, **filtros) -> pd.Series:
+        """
+        Suma la medida sobre las dimensiones `by`.
+
+        Además de las dimensiones del cubo se puede agrupar o filtrar por `estado`
+        ('ocupado', 'desocupado', 'inactivo') y, si se entregan los bordes `edades`,
+        por `tramo_edad` (intervalos [a, b)). Los filtros aceptan un valor o una lista.
+
+        >>> cubo.rollup(['ano_encuesta', 'mes_encuesta', 'sexo'], estado='desocupado', edades=[15, 30, 200])
+        """
+        if medida not in self.MEDIDAS:
+            raise ValueError(f"Valores permitidos para medida son: {self.MEDIDAS}")
+        datos = self._con_derivadas(edades)
+        for dim, valor in filtros.items():
+            valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+            datos = datos.loc[datos[dim].isin(valores)]
+        return self._sumar(datos, by, medida)
+
+    def niveles(self, medida='n') -> pd.DataFrame:
+        """
+        Niveles por mes de ocupados y desocupados por sexo y tramo 15-24 / resto, con los
+        nombres usados en `tasa_oficial.csv` (oh15, om15, ..., dm25).
+        """
+        date_set = ['ano_encuesta', 'mes_encuesta']
+        datos = self._con_derivadas()
+        datos = datos.loc[datos['estado'] != 'inactivo']
+        datos = datos.assign(tramo=np.where(datos['edad'].between(15, 24), '15', '25'),
+                             sexo=datos['sexo'].map({1: 'h', 2: 'm'}))
+        datos = datos.dropna(subset=['sexo'])
+        datos['columna'] = datos['estado'].str[0] + datos['sexo'] + datos['tramo']
+        niveles = self._sumar(datos, date_set + ['columna'], medida).unstack('columna', fill_value=0)
+        columnas = [f'{estado[0]}{sexo}{tramo}' for estado in ['ocupado', 'desocupado']
+                    for tramo in ['15', '25'] for sexo in ['h', 'm']]
+        niveles = niveles.reindex(columns=columnas, fill_value=0).sort_index()
+        niveles.columns.name = None
+        return niveles
@@ -1,11 +1,22 @@
 from diagnostics import outlier_analysis as oa
+from diagnostics.adjustment_cache import ADJUSTMENT_CACHE
+from diagnostics.store import DiagnosticsStore
+from diagnostics.x13_diags import adjust_into
+import numpy as np
 import pandas as pd
 import os
 from os.path import join, realpath
 import logging
+
+from utils.taskgraph import TaskGraph
+from utils.instrument import traced_method
+from utils.shared import SharedArray, SharedSeries
+
+
 class Diagnose():
-    def __init__(self, serie) -> None:
+    def __init__(self, serie, store:DiagnosticsStore=None) -> None:
         self.serie = serie
+        self.store = DiagnosticsStore() if store is None else store
 
     def set_outlier(self, outlier_serie:pd.Series):
         self.outlier = outlier_serie
@@ -16,54 +27,177 @@ class Diagnose():
     def diags(self,  model):
         pass
 
-    def outlier_diags(self, model):
+    @traced_method
+    def outlier_diags(self, model, executor=None, max_workers=None, costs=None):
+        """
+        Diagnósticos de outlier para `model`, como un grafo de tareas independientes.
+
+        `executor` ('thread', 'process' o 'serial'); por defecto hilos para X13 (el trabajo
+        ocurre en el binario x13as) y procesos para los modelos en Python. Cada resultado
+        se agrega a `self.store` apenas termina la tarea que lo produce; en el directorio
+        de la ventana quedan solo `metrics.md` y `timings.csv` (segundos y aciertos de los
+        caches por tarea). `costs` (CostModel) se pasa al grafo de tareas.
+
+        Con procesos cada worker tiene sus propios caches: los pasos de 'evolution', que
+        comparten el ajuste SARIMAX del tramo pre-outlier, se agrupan en una tarea por
+        worker para que cada uno lo ajuste una sola vez.
+        """
         logging.info(f"Running diagnostics for {model.__name__}")
-        out_analist = oa.OutlierAnalysis()    
-        span_analist = oa.SlidingOutliers(model())
-        history_analist = oa.RevisionOutlier(model())
+        if executor is None:
+            executor = 'thread' if model.__name__ == 'X13Model' else 'process'
 
         results_path = join(realpath('.'), 'data', 'diagnostics', self.end.replace('-', ''), model.__name__)
         os.makedirs(results_path, exist_ok=True)
-        
+
+        def write(name):
+            return lambda result: save_diagnostic(self.store, model.__name__, self.start, self.end, name, result)
+
+        def write_metrics(text):
+            with open(join(results_path, 'metrics.md'), 'w', encoding='utf-8') as file:
+                file.write(text)
+
+        graph = TaskGraph(executor, max_workers=max_workers, costs=costs, counters=cache_counters)
+        # Cada mes posterior al outlier y cada vintage de revision history son una tarea:
+        # son la parte más costosa del diagnóstico. Con los costos, el grafo despacha
+        # primero las tareas largas (vintages largos, X13) y los workers terminan juntos
+        n = len(self.serie)
+        out_analist = oa.OutlierAnalysis()
         out_analist.fit(self.serie, outlier=self.outlier)
-        instance_model = model()
-        out_analist.model_evolution(instance_model).to_csv(join(results_path, 'mse_comp_real.csv'))
+        steps = []
+        evolution_dates = out_analist.evolution_dates()
+        if executor == 'process':
+            # Grupos intercalados (los pasos más largos quedan repartidos entre los grupos)
+            groups = max(1, min(graph.workers, len(evolution_dates)))
+            for k in range(groups):
+                last_dates = evolution_dates[k::groups]
+                steps.append(f'evolution[{k + 1}/{groups}]')
+                graph.add(steps[-1], _evolution_steps, self.serie, self.outlier, model, last_dates,
+                          cost=('evolution', model.__name__, sum(len(self.serie[:last_date]) for last_date in last_dates)))
+            graph.add('evolution', _evolution_groups, self.serie, self.outlier, deps=steps, on_done=write('evolution'))
+        else:
+            for last_date in evolution_dates:
+                steps.append(f'evolution[{last_date.date()}]')
+                graph.add(steps[-1], _evolution_step, self.serie, self.outlier, model, last_date,
+                          cost=('evolution', model.__name__, len(self.serie[:last_date])))
+            graph.add('evolution', _evolution, self.serie, self.outlier, deps=steps, on_done=write('evolution'))
+        for method in SLIDING:
+            graph.add(method, _sliding, method, self.serie, self.outlier, model, on_done=write(method),
+                      cost=('sliding', model.__name__, n))
+        graph.add('metrics', _metrics, model.__name__, self.start, self.end,
+                  deps=list(SLIDING), on_done=write_metrics)
+        # Los vintages escriben en una matriz compartida (en memoria compartida con
+        # procesos) que la tarea 'history' lee sin que los resultados pasen por pickle
+        dates = oa.RevisionOutlier.vintage_dates(self.serie)
+        shared = executor == 'process'
+        with SharedArray((n, len(dates)), fill=np.nan, shared=shared) as history, \
+                SharedSeries(self.serie, shared=shared) as source:
+            vintages = []
+            for k, date_n in enumerate(dates):
+                vintages.append(f'history[{date_n.date()}]')
+                graph.add(vintages[-1], adjust_into, history.handle, source.handle, model(), k, 0, k + 4,
+                          cost=('vintage', model.__name__, k + 4))
+            graph.add('history', _history, self.serie, self.outlier, model, history.handle, deps=vintages,
+                      on_done=write('history'))
+            graph.run()
+
+        self.timings = graph.timings
+        self.report = graph.report
+        timings = pd.DataFrame.from_dict(graph.counts, orient='index').reindex(list(graph.timings))
+        timings.insert(0, 'segundos', pd.Series(graph.timings))
+        timings.rename_axis('tarea').to_csv(join(results_path, 'timings.csv'))
+        # Sumados sobre las tareas: con procesos, cada worker cuenta en su propio cache
+        counts = timings.drop(columns='segundos').sum()
+        lookups = counts['adjust_hits'] + counts['adjust_misses']
+        logging.info(f"Cache de ajustes ({executor}): {counts['adjust_hits']:.0f} reutilizados, "
+                     f"{counts['adjust_misses']:.0f} calculados ({counts['adjust_hits'] / lookups if lookups else 0:.0%}); "
+                     f"pronósticos: {counts['forecast_hits']:.0f} reutilizados, {counts['forecast_misses']:.0f} ajustados")
+        return graph.results
+
+
+# Diagnósticos de SlidingOutliers; cada uno es una tarea del grafo
+SLIDING = ('A_mse', 'MM_mse', 'A_analysis', 'MM_analysis')
+
+
+def save_diagnostic(store, model_name, start, end, name, result):
+    """Agrega a `store` el resultado de la tarea `name` del grafo de diagnóstico ('evolution', SLIDING o 'history')."""
+    if name == 'evolution':
+        store.append(model_name, start, end, 'mse_comp_real', result)
+    elif name in ('A_mse', 'MM_mse'):
+        store.append(model_name, start, end, name, result)
+    elif name in ('A_analysis', 'MM_analysis'):
+        prefix = name.replace('_analysis', '%')
+        store.append_many(model_name, start, end, {
+            f'{prefix}_pre': result['pre'], f'{prefix}_pos': result['pos'],
+            f'{prefix}_pre_percentage': result['pre_percentage'],
+            f'{prefix}_pos_percentage': result['pos_percentage']})
+    elif name == 'history':
+        store.append_many(model_name, start, end, result)
+    else:
+        raise ValueError(f"Diagnóstico desconocido: '{name}'")
+
+
+def diagnose_model(serie, outlier_serie, model, executor=None, max_workers=None, store=None):
+    """Diagnóstico completo de `model`; punto de entrada de los workers de `--diagnose-models`."""
+    diag = Diagnose(serie, store=store)
+    diag.set_outlier(outlier_serie)
+    diag.outlier_diags(model, executor=executor, max_workers=max_workers)
+    return diag.timings
+
+
+# Tareas del grafo de diagnóstico: funciones de módulo para poder ejecutarse en otros procesos
+
+def cache_counters() -> dict:
+    """Aciertos y fallos acumulados de los caches de ajustes y de pronósticos de este proceso."""
+    return {'adjust_hits': ADJUSTMENT_CACHE.hits, 'adjust_misses': ADJUSTMENT_CACHE.misses,
+            'forecast_hits': oa.FORECAST_FITS.hits, 'forecast_misses': oa.FORECAST_FITS.misses}
+
+def _evolution_step(serie, outlier, model, last_date):
+    out_analist = oa.OutlierAnalysis()
+    out_analist.fit(serie, outlier=outlier)
+    return out_analist.evolution_step(model(), last_date)
+
+def _evolution_steps(serie, outlier, model, last_dates):
+    # Varios pasos en el mismo worker: comparten sus caches (el SARIMAX pre-outlier)
+    return [_evolution_step(serie, outlier, model, last_date) for last_date in last_dates]
+
+def _evolution_groups(serie, outlier, *groups):
+    # Deshace el intercalado de outlier_diags: el grupo k tiene los pasos k, k + len(groups), ...
+    mses = [None] * sum(len(group) for group in groups)
+    for k, group in enumerate(groups):
+        mses[k::len(groups)] = group
+    return _evolution(serie, outlier, *mses)
+
+def _evolution(serie, outlier, *mses):
+    out_analist = oa.OutlierAnalysis()
+    out_analist.fit(serie, outlier=outlier)
+    return out_analist.model_evolution(None, mses=list(mses))
+
+def _sliding(method, serie, outlier, model):
+    span_analist = oa.SlidingOutliers(model())
+    return getattr(span_analist, method)(serie, outlier=outlier)
+
+def _history(serie, outlier, model, matrix=None, *fitted):
+    # `matrix`: handle de la matriz que llenaron las tareas de vintage, y `fitted` lo que
+    # estas retornaron; sin ella, todos los vintages se ajustan aquí
+    history_analist = oa.RevisionOutlier(model())
+    history_analist.fit(serie, vintages=None if matrix is None else (SharedArray.attach(matrix), fitted))
+    return {'RY': history_analist.A_analysis(outlier=outlier),
+            'CY': history_analist.C_analysis(outlier=outlier)}
 
-        with open(join(results_path,'metrics.md'), 'w', encoding='utf-8') as file:
-            file.write(f"""## Diagnósticos para {model.__name__}, respecto a outlier {self.start}|{self.end}
+def _metrics(model_name, start, end, A_mse, MM_mse, saa, smma):
+    return (f"""## Diagnósticos para {model_name}, respecto a outlier {start}|{end}
 
-            """)
-            file.write(f"""
-Contraste de entrenamiento entre modelo con datos hasta la pandemia ({self.start}), y modelo con datos hasta último registro
-            """)
-            file.write(
+            """
+            f"""
+Contraste de entrenamiento entre modelo con datos hasta la pandemia ({start}), y modelo con datos hasta último registro
+            """
 r"Diagnostivo Slidings Spans. MSE entre valores A% para los dos modelos, de la forma"
-"$$\\frac{max_j A_t^j - min_j A_t^j}{min_j A_t^j}$$")
-            mse = f"**MSE**: {str(span_analist.A_mse(self.serie, outlier=self.outlier))}\n\n"
-            file.write(mse)
-            file.write(
+"$$\\frac{max_j A_t^j - min_j A_t^j}{min_j A_t^j}$$"
+            f"**MSE**: {str(A_mse)}\n\n"
 r"Diagnostivo Slidings Spans. MSE entre valores MM% para los dos modelos, de la forma"
-"$$max_j \\frac{A_t^j}{A_{t-1}^j} - min_j \\frac{A_t^j}{A_{t-1}^j}$$")
-            mse = f"**MSE**: {str(span_analist.MM_mse(self.serie, outlier=self.outlier))}\n\n"
-            file.write(mse)
-            saa = span_analist.A_analysis(self.serie, outlier=self.outlier)
-            smma = span_analist.MM_analysis(self.serie, outlier=self.outlier)
-            test = f"**Test A%** pre-pandemia: {round(saa['pre_percentage'], 3)}\n"
-            file.write(test)
-            test = f"**Test A%** todos los datos: {round(saa['pos_percentage'], 3)}\n"
-            file.write(test)
-            test = f"**Test MM%** pre-pandemia: {round(smma['pre_percentage'], 3)}\n"
-            file.write(test)
-            test = f"**Test MM%** todos los datos: {round(smma['pos_percentage'], 3)}\n"
-            file.write(test)
-
-        saa['pre'].to_csv(join(results_path, 'A%_pre.csv'))
-        saa['pos'].to_csv(join(results_path, 'A%_pos.csv'))
-
-        smma['pre'].to_csv(join(results_path, 'MM%_pre.csv'))
-        smma['pos'].to_csv(join(results_path, 'MM%_pos.csv'))
-
-
-        history_analist.fit(self.serie)
-        history_analist.A_analysis(outlier=self.outlier).to_csv(join(results_path, 'RY.csv'))
-        history_analist.C_analysis(outlier=self.outlier).to_csv(join(results_path, 'CY.csv'))
\ No newline at end of file
+"$$max_j \\frac{A_t^j}{A_{t-1}^j} - min_j \\frac{A_t^j}{A_{t-1}^j}$$"
+            f"**MSE**: {str(MM_mse)}\n\n"
+            f"**Test A%** pre-pandemia: {round(saa['pre_percentage'], 3)}\n"
+            f"**Test A%** todos los datos: {round(saa['pos_percentage'], 3)}\n"
+            f"**Test MM%** pre-pandemia: {round(smma['pre_percentage'], 3)}\n"
+            f"**Test MM%** todos los datos: {round(smma['pos_percentage'], 3)}\n")
@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from os.path import join
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+INE_BASE_URL = 'https://www.ine.gob.cl/docs/default-source/ocupacion-y-desocupacion/bbdd'
+TRIM_MOVIL = {1:'def', 2:'efm', 3:'fma', 4:'mam', 5:'amj', 6:'mjj', 7:'jja', 8:'jas', 9:'aso', 10:'son', 11:'ond', 12:'nde'}
+
+
+def nombre_archivo(year:int, month:int) -> str:
+    """Nombre del archivo ENE publicado para el trimestre móvil centrado en year-month."""
+    return f"ene-{year:04d}-{month:02d}-{TRIM_MOVIL[month]}.csv"
+
+
+class Downloader():
+    """
+    Descarga archivos mensuales de la ENE con una sesión HTTP compartida.
+
+    Los archivos se escriben por partes directamente a disco (`<archivo>.part`) y se
+    renombran al terminar, de modo que una descarga interrumpida se retoma con una
+    petición `Range` en la siguiente ejecución. Para cada archivo se guarda en
+    `manifest.json` su ETag, Last-Modified, tamaño y sha256, lo que permite revalidar
+    archivos existentes con peticiones condicionales y verificar su integridad.
+    """
+    def __init__(self, dest_dir, base_url=None, max_workers=6, retries=3, backoff=0.5,
+                 timeout=30, chunk_size=1 << 16) -> None:
+        self.dest_dir = dest_dir
+        self.base_url = (base_url or os.getenv('ENE_BASE_URL') or INE_BASE_URL).rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        os.makedirs(self.dest_dir, exist_ok=True)
+
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=('HEAD', 'GET'), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.manifest_path = join(self.dest_dir, 'manifest.json')
+        self._lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def url(self, year:int, month:int) -> str:
+        return f"{self.base_url}/{year}/csv/{nombre_archivo(year, month)}"
+
+    def _load_manifest(self) -> dict:
+        if os.path.isfile(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                    return json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Manifest de descargas ilegible, se regenerará: {e}")
+        return {}
+
+    def _update_manifest(self, name, entry):
+        with self._lock:
+            if entry is None:
+                self.manifest.pop(name, None)
+            else:
+                self.manifest[name] = entry
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.manifest, file, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    def fetch(self, year:int, month:int, revalidate=False) -> str:
+        """
+        Descarga (o revalida) el archivo de year-month.
+
+        Retorna uno de: 'descargado', 'vigente' (ya existía o el servidor respondió 304),
+        'no_disponible', 'incompleto' (quedó un .part para retomar) o 'error'.
+        """
+        name = nombre_archivo(year, month)
+        final_path = join(self.dest_dir, name)
+        part_path = final_path + '.part'
+        meta = self.manifest.get(name, {})
+
+        if os.path.exists(final_path) and not revalidate:
+            return 'vigente'
+
+        headers = {}
+        offset = 0
+        if os.path.exists(final_path):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        elif os.path.exists(part_path) and (meta.get('etag') or meta.get('last_modified')):
+            offset = os.path.getsize(part_path)
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = meta.get('etag') or meta.get('last_modified')
+
+        url = self.url(year, month)
+        try:
+            response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            if response.status_code == 206 and not response.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+                # El servidor no respetó el rango: se descarta la respuesta y se pide el archivo completo
+                response.close()
+                offset = 0
+                response = self.session.get(url, stream=True, timeout=self.timeout)
+            with response:
+                if response.status_code == 304:
+                    return 'vigente'
+                if response.status_code not in (200, 206):
+                    return 'no_disponible'
+                return self._stream(response, name, url, final_path, part_path,
+                                    resume=response.status_code == 206 and offset > 0)
+        except requests.RequestException as e:
+            logging.error(f"Error descargando {url}: {type(e).__name__}: {e}")
+            return 'error'
+
+    def _stream(self, response, name, url, final_path, part_path, resume) -> str:
+        hasher = hashlib.sha256()
+        entry = {'url': url,
+                 'etag': response.headers.get('ETag'),
+                 'last_modified': response.headers.get('Last-Modified')}
+        if resume:
+            with open(part_path, 'rb') as file:
+                for block in iter(lambda: file.read(self.chunk_size), b''):
+                    hasher.update(block)
+        else:
+            # El validador queda registrado antes de escribir para poder retomar con If-Range
+            self._update_manifest(name, entry)
+
+        expected = response.headers.get('Content-Length')
+        written = 0
+        with open(part_path, 'ab' if resume else 'wb') as file:
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if not chunk:
+                    continue
+                if written == 0 and not resume and chunk.lstrip()[:1] == b'<':
+                    # El sitio del INE responde con una página HTML cuando el archivo no existe
+                    file.close()
+                    os.remove(part_path)
+                    return 'no_disponible'
+                file.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+
+        if expected is not None and written != int(expected):
+            logging.warning(f"Descarga incompleta de {name} ({written}/{expected} bytes), se retomará en la próxima ejecución")
+            return 'incompleto'
+
+        os.replace(part_path, final_path)
+        entry.update({'sha256': hasher.hexdigest(), 'size': os.path.getsize(final_path)})
+        self._update_manifest(name, entry)
+        return 'descargado'
+
+    def fetch_many(self, months, revalidate=False) -> dict:
+        """Descarga concurrentemente una lista de (year, month). Retorna {(year, month): estado}."""
+        months = list(months)
+        if not months:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            status = executor.map(lambda ym: self.fetch(*ym, revalidate=revalidate), months)
+            return dict(zip(months, status))
+
+    def verify(self) -> list:
+        """Retorna los archivos del manifest cuyo sha256 no coincide con el contenido en disco."""
+        corrupt = []
+        for name, entry in list(self.manifest.items()):
+            path = join(self.dest_dir, name)
+            if 'sha256' not in entry or not os.path.exists(path):
+                continue
+            hasher = hashlib.sha256()
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(self.chunk_size), b''):
+                    hasher.update(block)
+            if hasher.hexdigest() != entry['sha256']:
+                corrupt.append(name)
+        return corrupt
+
+    def discard(self, name):
+        """Borra un archivo descargado y su entrada del manifest, para descargarlo de nuevo."""
+        for path in (join(self.dest_dir, name), join(self.dest_dir, name) + '.part'):
+            if os.path.exists(path):
+                os.remove(path)
+        self._update_manifest(name, None)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,427 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import logging
+import tempfile
+import threading
+import itertools
+import tracemalloc
+from functools import wraps
+from contextlib import contextmanager
+
+
+# Fila del resumen con el tiempo de la medición de memoria de todos los spans
+MEMORY_OVERHEAD = '(medición de memoria)'
+
+# Los procesos hijos creados con 'spawn' activan la traza (y la medición de memoria) al importar este módulo
+TRACE_ENV = 'INE_TRACE_DIR'
+MEMORY_ENV = 'INE_TRACE_MEMORY'
+
+
+def _proc_status() -> dict:
+    """VmRSS y VmHWM (memoria residente actual y máxima) del proceso en bytes; {} fuera de Linux."""
+    try:
+        with open('/proc/self/status', encoding='ascii') as file:
+            status = file.read()
+    except OSError:
+        return {}
+    return {key: int(value) * 1024 for key, value in re.findall(r'(VmRSS|VmHWM):\s+(\d+) kB', status)}
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    """Foto de la memoria viva de Python, sin las asignaciones de la propia medición."""
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__),
+                                                      tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def _reset_hwm() -> bool:
+    """Reinicia el máximo de memoria residente del proceso (VmHWM). False si el sistema no lo permite."""
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class Tracer():
+    """
+    Traza de intervalos (spans) anidados con su duración, para ver en qué se fue el
+    tiempo de una ejecución sin volver a correrla bajo un profiler.
+
+    Desactivada por defecto: `span` no registra nada hasta llamar a `enable`. Cada span
+    guarda su padre (el span abierto en el mismo hilo), proceso, hilo y atributos. Los
+    procesos hijos (p. ej. los workers de TaskGraph) escriben sus spans en `trace_dir`
+    al cerrar cada span de primer nivel, y `events` los junta con los del proceso
+    principal. `write` genera un JSON en el formato de Chrome (chrome://tracing, Perfetto).
+
+    Con `enable(memory=True)` cada span registra además la memoria máxima de Python
+    (tracemalloc) y la residente del proceso (RSS) durante el span, y los spans cuyo
+    nombre empieza con un prefijo de `snapshots` guardan las `top` líneas que más memoria
+    retuvieron (solo con `top` > 0: cada foto toma segundos con muchas trazas y deja
+    memoria en el proceso). El tiempo de la medición de cada span queda en `overhead_s`,
+    fuera de su duración y del tiempo propio de su padre; el resumen lo reporta aparte
+    en la fila MEMORY_OVERHEAD. La memoria de Python es global al proceso: con spans
+    simultáneos en varios hilos, el máximo de cada uno incluye el de los otros. Lo mismo
+    vale para el RSS máximo, cuyo reinicio (clear_refs) es del proceso completo: un span
+    solo lo reinicia si ningún otro hilo tiene un span abierto, y si no, registra el
+    máximo del proceso (`process_peak_rss_mb`) en vez de su propio máximo y crecimiento.
+    `budget_mb` se compara con la memoria que el span agregó (`rss_growth_mb`, o el
+    máximo de Python sobre el que tenía al partir), no con el tamaño del proceso.
+
+    >>> TRACER.enable()
+    >>> with TRACER.span('stage:adjust', series=20):
+    ...     model.fit(serie).adjust()
+    >>> print(TRACER.format_summary())
+    """
+    def __init__(self) -> None:
+        self.enabled = False
+        self.trace_dir = None
+        self.origin = time.time()
+        self._owner = None
+        self._pid = os.getpid()
+        self._events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self.memory = False
+        self.budget_mb = None
+        self.top = 0
+        self.snapshots = ('stage:',)
+        self._hwm = False
+        self._warned = set()
+        # Spans con medición de memoria abiertos por hilo
+        self._open = {}
+
+    def enable(self, trace_dir=None, owner=True, memory=False, budget_mb=None, top=0, snapshots=('stage:',)):
+        """
+        Activa la traza. `owner=False` en procesos hijos: sus spans se escriben en `trace_dir`.
+        Con `memory`, mide la memoria de cada span y advierte (una vez por nombre de span)
+        cuando la memoria que agregó supera `budget_mb`.
+        """
+        self.trace_dir = trace_dir or tempfile.mkdtemp(prefix='ine-trace-')
+        os.makedirs(self.trace_dir, exist_ok=True)
+        os.environ[TRACE_ENV] = self.trace_dir
+        self._owner = os.getpid() if owner else None
+        self.origin = time.time()
+        self.memory, self.budget_mb, self.top, self.snapshots = memory, budget_mb, top, tuple(snapshots)
+        if memory:
+            os.environ[MEMORY_ENV] = json.dumps({'budget_mb': budget_mb, 'top': top, 'snapshots': list(snapshots)})
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._hwm = _reset_hwm()
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        os.environ.pop(TRACE_ENV, None)
+        os.environ.pop(MEMORY_ENV, None)
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory = False
+
+    def reset(self):
+        with self._lock:
+            self._events = []
+        for file in glob.glob(os.path.join(self.trace_dir or '', '*.jsonl')):
+            os.remove(file)
+
+    def _stack(self) -> list:
+        if os.getpid() != self._pid:
+            # Proceso hijo creado con fork: los spans abiertos y registrados son del padre
+            self._pid = os.getpid()
+            self._events = []
+            self._lock = threading.Lock()
+            self._local = threading.local()
+            self._open = {}
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+            self._local.memory = []
+        return self._local.stack
+
+    def _memory_start(self, name) -> dict:
+        frames = self._local.memory
+        if frames:
+            # El span padre guarda su máximo hasta ahora antes de reiniciar los contadores
+            parent = frames[-1]
+            parent['peak'] = max(parent['peak'], tracemalloc.get_traced_memory()[1])
+            parent['hwm'] = max(parent['hwm'], _proc_status().get('VmHWM', 0))
+        # La foto inicial se toma antes de reiniciar los contadores para no contarla en el span
+        snapshot = _snapshot() if self.top and name.startswith(self.snapshots) else None
+        tracemalloc.reset_peak()
+        thread = threading.get_ident()
+        with self._lock:
+            # El reinicio de VmHWM es del proceso: con spans abiertos en otros hilos se omite
+            reset = self._hwm and not any(count for other, count in self._open.items() if other != thread)
+            self._open[thread] = self._open.get(thread, 0) + 1
+            if reset:
+                _reset_hwm()
+        frame = {'peak': 0, 'hwm': 0, 'current': tracemalloc.get_traced_memory()[0], 'snapshot': snapshot,
+                 'rss': _proc_status().get('VmRSS', 0), 'reset': reset}
+        frames.append(frame)
+        return frame
+
+    def _memory_end(self, name, frame) -> dict:
+        self._local.memory.pop()
+        thread = threading.get_ident()
+        with self._lock:
+            self._open[thread] -= 1
+            if not self._open[thread]:
+                del self._open[thread]
+        current, peak = tracemalloc.get_traced_memory()
+        status = _proc_status()
+        peak = max(frame['peak'], peak)
+        memory = {'py_peak_mb': peak / 2**20, 'py_delta_mb': (current - frame['current']) / 2**20}
+        # Lo que el span agregó sobre la memoria con que partió
+        growth_mb = (peak - frame['current']) / 2**20
+        if status:
+            memory['rss_mb'] = status['VmRSS'] / 2**20
+            # Sin reinicio de VmHWM el máximo es el del proceso desde que partió (o desde
+            # el último reinicio de otro span)
+            hwm = max(frame['hwm'], status['VmHWM'])
+            memory['peak_rss_mb' if frame['reset'] else 'process_peak_rss_mb'] = hwm / 2**20
+            if frame['reset']:
+                memory['rss_growth_mb'] = growth_mb = (hwm - frame['rss']) / 2**20
+        if frame['snapshot'] is not None:
+            stats = _snapshot().compare_to(frame.pop('snapshot'), 'lineno')
+            memory['top_allocations'] = [{'where': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                                          'size_mb': stat.size_diff / 2**20, 'count': stat.count_diff}
+                                         for stat in sorted(stats, key=lambda stat: stat.size_diff, reverse=True)[:self.top]]
+        if self.budget_mb is not None and growth_mb > self.budget_mb:
+            memory['over_budget'] = True
+            if name not in self._warned:
+                self._warned.add(name)
+                logging.warning(f"El span '{name}' agregó {growth_mb:.0f} MB de memoria sobre la que tenía al partir "
+                                f"(presupuesto: {self.budget_mb:.0f} MB, proceso {self._pid}).")
+        return memory
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Registra la duración del bloque como un span `name`. Entrega el dict de atributos
+        para que el bloque pueda agregar otros (p. ej. el estado de una etapa).
+        """
+        if not self.enabled:
+            yield {}
+            return
+        stack = self._stack()
+        span_id = f'{self._pid}-{next(self._ids)}'
+        parent = stack[-1] if stack else None
+        stack.append(span_id)
+        measured = time.perf_counter()
+        frame = self._memory_start(name) if self.memory else None
+        wall, start = time.time(), time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            if frame is not None:
+                attrs['memory'] = self._memory_end(name, frame)
+                # Medición antes y después del span: no es parte de su duración
+                attrs['memory']['overhead_s'] = time.perf_counter() - measured - seconds
+            event = {'id': span_id, 'parent': parent, 'name': name, 'start': wall, 'seconds': seconds,
+                     'pid': self._pid, 'tid': threading.get_ident(), 'attrs': attrs}
+            with self._lock:
+                self._events.append(event)
+            if not stack and self._pid != self._owner:
+                self._flush()
+
+    def _flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        with open(os.path.join(self.trace_dir, f'{self._pid}.jsonl'), 'a', encoding='utf-8') as file:
+            for event in events:
+                file.write(json.dumps(event, default=str) + '\n')
+
+    def events(self) -> list:
+        """Spans del proceso actual y de los procesos hijos, ordenados por inicio."""
+        with self._lock:
+            events = list(self._events)
+        for path in glob.glob(os.path.join(self.trace_dir or '', '*.jsonl')):
+            with open(path, encoding='utf-8') as file:
+                events.extend(json.loads(line) for line in file if line.strip())
+        return sorted(events, key=lambda event: event['start'])
+
+    def summary(self) -> list:
+        """
+        Por nombre de span: llamadas, tiempo total, tiempo propio (sin los spans hijos
+        del mismo proceso ni la medición de memoria de estos) y máximo, ordenado por
+        tiempo total. Con memoria, la fila MEMORY_OVERHEAD suma el tiempo de medición.
+        """
+        events = self.events()
+        children = {}
+        overhead = {'name': MEMORY_OVERHEAD, 'calls': 0, 'total_s': 0.0, 'self_s': 0.0, 'max_s': 0.0}
+        for event in events:
+            seconds = event['attrs'].get('memory', {}).get('overhead_s', 0.0)
+            if 'memory' in event['attrs']:
+                overhead['calls'] += 1
+                overhead['total_s'] += seconds
+                overhead['self_s'] += seconds
+                overhead['max_s'] = max(overhead['max_s'], seconds)
+            if event['parent'] is not None:
+                children[event['parent']] = children.get(event['parent'], 0.0) + event['seconds'] + seconds
+        rows = {}
+        for event in events:
+            row = rows.setdefault(event['name'], {'name': event['name'], 'calls': 0, 'total_s': 0.0, 'self_s': 0.0, 'max_s': 0.0})
+            row['calls'] += 1
+            row['total_s'] += event['seconds']
+            row['self_s'] += event['seconds'] - children.get(event['id'], 0.0)
+            row['max_s'] = max(row['max_s'], event['seconds'])
+            memory = event['attrs'].get('memory')
+            if memory:
+                row['py_peak_mb'] = max(row.get('py_peak_mb', 0.0), memory['py_peak_mb'])
+                row['peak_rss_mb'] = max(row.get('peak_rss_mb', 0.0), memory.get('peak_rss_mb', memory.get('process_peak_rss_mb', 0.0)))
+                row['rss_growth_mb'] = max(row.get('rss_growth_mb', 0.0), memory.get('rss_growth_mb', 0.0))
+        if overhead['calls']:
+            rows[MEMORY_OVERHEAD] = overhead
+        return sorted(rows.values(), key=lambda row: row['total_s'], reverse=True)
+
+    def process_peaks(self) -> dict:
+        """Memoria residente máxima (MB) de cada proceso, según sus spans, para dimensionar los pools de workers."""
+        peaks = {}
+        for event in self.events():
+            memory = event['attrs'].get('memory', {})
+            rss = max(memory.get('peak_rss_mb', 0.0), memory.get('process_peak_rss_mb', 0.0))
+            peaks[event['pid']] = max(peaks.get(event['pid'], 0.0), rss)
+        return peaks
+
+    def format_summary(self, limit=30) -> str:
+        wall = time.time() - self.origin
+        summary = self.summary()
+        memory = any('py_peak_mb' in row for row in summary)
+        header = f"{'span':<40} {'llamadas':>8} {'total s':>9} {'propio s':>9} {'máx s':>8} {'% total':>7}"
+        lines = [header + (f" {'py MB':>8} {'RSS MB':>8} {'+RSS MB':>8}" if memory else '')]
+        for row in summary[:limit]:
+            line = (f"{row['name'][:40]:<40} {row['calls']:>8} {row['total_s']:>9.3f} {row['self_s']:>9.3f} "
+                    f"{row['max_s']:>8.3f} {100 * row['total_s'] / wall if wall else 0:>6.1f}%")
+            if memory:
+                line += f" {row.get('py_peak_mb', 0.0):>8.1f} {row.get('peak_rss_mb', 0.0):>8.1f} {row.get('rss_growth_mb', 0.0):>8.1f}"
+            lines.append(line)
+        lines.append(f"Tiempo total de la ejecución: {wall:.2f} s")
+        if memory:
+            peaks = self.process_peaks()
+            workers = [peak for pid, peak in peaks.items() if pid != self._owner]
+            lines.append(f"Memoria residente máxima: proceso principal {peaks.get(self._owner, 0.0):.0f} MB"
+                         + (f", workers {max(workers):.0f} MB (máximo de {len(workers)})" if workers else ''))
+            lines.extend(self._format_allocations())
+        return '\n'.join(lines)
+
+    def _format_allocations(self, limit=5) -> list:
+        """Líneas que más memoria retuvieron en el span con snapshot de mayor máximo."""
+        spans = [event for event in self.events() if event['attrs'].get('memory', {}).get('top_allocations')]
+        if not spans:
+            return []
+        span = max(spans, key=lambda event: event['attrs']['memory']['top_allocations'][0]['size_mb'])
+        lines = [f"Mayores asignaciones retenidas en '{span['name']}':"]
+        for stat in span['attrs']['memory']['top_allocations'][:limit]:
+            lines.append(f"  {stat['size_mb']:>9.2f} MB  {stat['count']:>8}  {stat['where']}")
+        return lines
+
+    def write(self, path):
+        """Guarda la traza en formato Chrome Trace Event (eventos completos 'X', tiempos en µs)."""
+        trace = []
+        for event in self.events():
+            trace.append({'name': event['name'], 'ph': 'X', 'ts': (event['start'] - self.origin) * 1e6,
+                          'dur': event['seconds'] * 1e6, 'pid': event['pid'], 'tid': event['tid'],
+                          'args': {'id': event['id'], 'parent': event['parent'], **event['attrs']}})
+            memory = event['attrs'].get('memory')
+            if memory and 'rss_mb' in memory:
+                # Contador de memoria residente al cierre de cada span
+                trace.append({'name': 'rss_mb', 'ph': 'C', 'ts': (event['start'] + event['seconds'] - self.origin) * 1e6,
+                              'pid': event['pid'], 'args': {'rss_mb': memory['rss_mb']}})
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms',
+                       'otherData': {'argv': sys.argv, 'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.origin))}},
+                      file, default=str)
+        return path
+
+
+TRACER = Tracer()
+if os.getenv(TRACE_ENV):
+    TRACER.enable(os.environ[TRACE_ENV], owner=False, memory=bool(os.getenv(MEMORY_ENV)),
+                  **json.loads(os.getenv(MEMORY_ENV) or '{}'))
+
+
+def traced(name):
+    """Decorador: cada llamada a la función es un span `name`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with TRACER.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_method(func):
+    """Decorador de métodos: el span se llama '<clase de la instancia>.<método>'."""
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not TRACER.enabled:
+            return func(self, *args, **kwargs)
+        with TRACER.span(f'{type(self).__name__}.{func.__name__}'):
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+@contextmanager
+def profile_run(trace_path=None, profiler=None, memory=False, budget_mb=None, top=0):
+    """
+    Activa la traza durante el bloque y al salir (también por error o sys.exit) guarda
+    el JSON en `trace_path` (si se entrega) y muestra la tabla resumen en stderr. Con
+    `profiler` guarda además un perfil del proceso principal junto a la traza: '.prof'
+    (cProfile, para pstats o snakeviz) o '.html' (pyinstrument, si está instalado). Con
+    `memory`, la tabla incluye la memoria máxima de cada span (ver Tracer).
+    """
+    if profiler not in (None, *PROFILERS):
+        raise ValueError(f"Valores permitidos para profiler son: {PROFILERS}")
+    if profiler and not trace_path:
+        raise ValueError("profiler requiere trace_path")
+    TRACER.enable(memory=memory, budget_mb=budget_mb, top=top)
+    session = None
+    if profiler == 'cprofile':
+        import cProfile
+        session = cProfile.Profile()
+        session.enable()
+    elif profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logging.warning("pyinstrument no está instalado; se omite el perfil (pip install pyinstrument).")
+        else:
+            session = Profiler()
+            session.start()
+    try:
+        with TRACER.span('run'):
+            yield TRACER
+    finally:
+        base = os.path.splitext(trace_path or '')[0]
+        if trace_path and os.path.dirname(trace_path):
+            os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+        if profiler == 'cprofile':
+            session.disable()
+            session.dump_stats(base + '.prof')
+            logging.info(f"Perfil cProfile guardado en '{base}.prof'.")
+        elif session is not None:
+            session.stop()
+            with open(base + '.html', 'w', encoding='utf-8') as file:
+                file.write(session.output_html())
+            logging.info(f"Perfil pyinstrument guardado en '{base}.html'.")
+        if trace_path:
+            TRACER.write(trace_path)
+            logging.info(f"Traza guardada en '{trace_path}'.")
+        print(TRACER.format_summary(), file=sys.stderr)
+        TRACER.disable()
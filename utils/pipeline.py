@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import glob
+import pickle
+import hashlib
+import logging
+from os.path import join
+
+from utils.instrument import TRACER
+
+
+STAGES = ['download', 'aggregate', 'import', 'adjust', 'diagnose', 'rates', 'plot', 'save']
+
+
+def file_signature(path) -> tuple:
+    """Firma barata de un archivo: (ruta, tamaño, mtime). None si no existe."""
+    if not os.path.exists(path):
+        return (path, None)
+    stat = os.stat(path)
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+
+def dir_signature(path, pattern='*.csv') -> list:
+    return [file_signature(file) for file in sorted(glob.glob(join(path, pattern)))]
+
+
+def _digest(obj, hasher):
+    # pandas se importa aquí para que cargar STAGES (p. ej. en 'main.py --help') no lo requiera
+    import pandas as pd
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        hasher.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+        names = obj.columns if isinstance(obj, pd.DataFrame) else [obj.name]
+        hasher.update(repr(list(names)).encode())
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            hasher.update(repr(key).encode())
+            _digest(obj[key], hasher)
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(f'<{type(obj).__name__}:{len(obj)}>'.encode())
+        for item in obj:
+            _digest(item, hasher)
+    else:
+        hasher.update(repr(obj).encode())
+
+
+def fingerprint(*inputs) -> str:
+    hasher = hashlib.sha256()
+    for item in inputs:
+        _digest(item, hasher)
+    return hasher.hexdigest()
+
+
+class Pipeline():
+    """
+    Ejecuta etapas con memoización en disco.
+
+    Cada etapa guarda en `state_dir` la huella de sus entradas (`<etapa>.json`) y su
+    resultado (`<etapa>.pkl`). Si al volver a ejecutar la huella no cambió, sus
+    archivos de salida siguen existiendo y la etapa no fue forzada, se reutiliza el
+    resultado previo en vez de recalcularlo.
+    """
+    def __init__(self, state_dir, force=()) -> None:
+        self.state_dir = state_dir
+        os.makedirs(self.state_dir, exist_ok=True)
+        force = set(force or ())
+        self.force = set(STAGES) if 'all' in force else force
+        self.report = {}
+
+    def _paths(self, name):
+        return join(self.state_dir, f'{name}.json'), join(self.state_dir, f'{name}.pkl')
+
+    def is_fresh(self, name, fp, output_files=()) -> bool:
+        state_path, result_path = self._paths(name)
+        if name in self.force or not os.path.isfile(state_path) or not os.path.isfile(result_path):
+            return False
+        if not all(os.path.exists(path) for path in output_files):
+            return False
+        try:
+            with open(state_path, 'r', encoding='utf-8') as file:
+                return json.load(file).get('fingerprint') == fp
+        except (OSError, ValueError):
+            return False
+
+    def run(self, name, func, inputs=(), output_files=(), keep=None):
+        """
+        Ejecuta `func()` salvo que la etapa `name` esté al día respecto a `inputs`.
+
+        `output_files` son archivos que la etapa escribe como efecto secundario; si
+        alguno falta la etapa se vuelve a ejecutar aunque la huella coincida. Si
+        `keep(result)` es falso el resultado no se registra y la etapa se vuelve a
+        ejecutar la próxima vez (p. ej. una descarga con errores).
+        """
+        with TRACER.span(f'stage:{name}') as attrs:
+            result = self._run(name, func, inputs, output_files, keep)
+            attrs['status'] = self.report[name]
+            return result
+
+    def _run(self, name, func, inputs, output_files, keep=None):
+        fp = fingerprint(name, *inputs)
+        state_path, result_path = self._paths(name)
+        if self.is_fresh(name, fp, output_files):
+            try:
+                with open(result_path, 'rb') as file:
+                    result = pickle.load(file)
+                logging.info(f"Etapa '{name}' al día, se reutiliza el resultado previo.")
+                self.report[name] = 'reutilizada'
+                return result
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                logging.warning(f"No se pudo leer el resultado previo de la etapa '{name}': {e}")
+
+        logging.info(f"Ejecutando etapa '{name}'...")
+        ti = time.time()
+        result = func()
+        elapsed = time.time() - ti
+        self.report[name] = 'ejecutada'
+        if keep is not None and not keep(result):
+            logging.warning(f"Etapa '{name}' no quedó registrada; se ejecutará de nuevo la próxima vez.")
+            return result
+
+        tmp_path = result_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, result_path)
+        with open(state_path, 'w', encoding='utf-8') as file:
+            json.dump({'fingerprint': fp, 'elapsed': elapsed, 'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}, file)
+        return result
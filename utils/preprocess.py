@@ -1,17 +1,19 @@
 import os 
-import io
 import glob
-from os.path import join, realpath
-import requests
-from calendar import monthrange
+from os.path import join, realpath, basename
 
 import logging
 import pandas as pd
 
+from utils.download import Downloader
+from utils.cube import CuboENE
+from utils.rolling import VentanaMovil
+
 
 class ENE():
-    def __init__(self):
-        self.data_path = join(realpath('.'), 'data')
+    def __init__(self, data_path=None, base_url=None, dims_extra=()):
+        self.data_path = join(realpath('.'), 'data') if data_path is None else data_path
+        self.base_url = base_url
         self.raw_path = join(self.data_path, 'raw')
         os.makedirs(self.raw_path, exist_ok=True)
         os.makedirs(join(self.raw_path, 'monthly'), exist_ok=True)
@@ -19,8 +21,10 @@ class ENE():
         self.preprocess_path = join(self.data_path, 'preprocess')
         os.makedirs(self.preprocess_path, exist_ok=True)
         self.final_name = 'tasa_oficial.csv'
+        self.cube_name = 'cubo_ene.pkl'
+        self.dims_extra = list(dims_extra)
         
-    def groupby_cae(self, tipo):
+    def groupby_cae(self, tipo, dedup=False):
         if tipo!='anual' and tipo!='mensual':
             raise ValueError("Valores permitidos para tipo son: 'anual', 'mensual'")
         csv_files = glob.glob(join(self.raw_path, tipo if tipo=='anual' else 'monthly', '*.csv'))
@@ -31,24 +35,18 @@ class ENE():
 
         date_set = ['ano_encuesta', 'mes_encuesta'] 
         columns = ['ano_trimestre', 'mes_central', 'ano_encuesta', 'mes_encuesta', 'sexo', 'cae_especifico', 'edad']
-        agg_nivel = pd.DataFrame()
-        # Leemos todos los csv en la lista de una vez, utilizando el sep=';' propio de las ENE trimestrales
-        for file in csv_files:
-            raw = pd.read_csv(file, usecols=columns, encoding='latin1', sep=';')
-            # Convertir a categorías.
-            categorical_columns = ['sexo', 'cae_especifico']
-            for col in categorical_columns:
-                raw[col] = raw[col].astype('category')
-            desocupado = self.nivel_estratificado(raw, estado='desocupado', date_set=date_set)
-            ocupado  = self.nivel_estratificado(raw, estado='ocupado',  date_set=date_set)
-            desocupado = pd.concat(desocupado, axis=1)
-            ocupado = pd.concat(ocupado, axis=1)
-            nivel = pd.concat([ocupado, desocupado], axis=1)
-            agg_nivel = pd.concat([agg_nivel, nivel], axis=0)
-
-        agg_nivel.sort_index(inplace=True)
-        if tipo=='mensual':
-            agg_nivel = agg_nivel.groupby(date_set).mean()
+        if tipo=='mensual' and dedup:
+            agg_nivel = self.niveles_dedup(csv_files, columns, date_set)
+        else:
+            agg_nivel = pd.DataFrame()
+            # Leemos todos los csv en la lista de una vez, utilizando el sep=';' propio de las ENE trimestrales
+            for file in csv_files:
+                nivel = self.nivel_archivo(file, columns, date_set)
+                agg_nivel = pd.concat([agg_nivel, nivel], axis=0)
+
+            agg_nivel.sort_index(inplace=True)
+            if tipo=='mensual':
+                agg_nivel = agg_nivel.groupby(date_set).mean()
         agg_nivel = self.trimestre_movil(agg_nivel)
         agg_nivel['d'] = agg_nivel[['dh15', 'dm15', 'dh25', 'dm25']].sum(axis=1)
         agg_nivel['o'] = agg_nivel[['oh15', 'om15', 'oh25', 'om25']].sum(axis=1)
@@ -77,6 +75,61 @@ class ENE():
         agg_nivel = agg_nivel.round(3)
         agg_nivel.to_csv(join(self.preprocess_path, self.final_name), sep=";", index=False)         
 
+    def leer_archivo(self, file, columns):
+        """Lee las columnas `columns` de un archivo ENE (las que no existan se omiten)."""
+        return pd.read_csv(file, usecols=lambda col: col in columns, encoding='latin1', sep=';')
+
+    def nivel_archivo(self, file, columns, date_set):
+        """Niveles de ocupados y desocupados por mes de encuesta para un archivo ENE."""
+        raw = self.leer_archivo(file, columns)
+        # Convertir a categorías.
+        categorical_columns = ['sexo', 'cae_especifico']
+        for col in categorical_columns:
+            raw[col] = raw[col].astype('category')
+        desocupado = self.nivel_estratificado(raw, estado='desocupado', date_set=date_set)
+        ocupado  = self.nivel_estratificado(raw, estado='ocupado',  date_set=date_set)
+        desocupado = pd.concat(desocupado, axis=1)
+        ocupado = pd.concat(ocupado, axis=1)
+        # Una celda sin registros en un mes del archivo es un nivel 0, no un dato faltante:
+        # el promedio entre los archivos del mes debe contarla
+        return pd.concat([ocupado, desocupado], axis=1).fillna(0)
+
+    def cargar_cubo(self) -> CuboENE:
+        """Cubo de conteos persistido por la ingesta deduplicada (ver `utils.cube.CuboENE`)."""
+        return CuboENE.cargar(join(self.preprocess_path, self.cube_name), dims_extra=self.dims_extra)
+
+    def niveles_dedup(self, csv_files, columns, date_set):
+        """
+        Ingesta deduplicada: cada archivo se lee una sola vez entre ejecuciones.
+
+        No se leen solo los meses nuevos de cada archivo: para obtener las mismas tasas
+        que la ruta sin deduplicar, cada mes debe promediarse entre los tres archivos que
+        lo contienen. El ahorro está en las ejecuciones siguientes; en una ejecución
+        desde cero se leen todos los archivos, igual que sin deduplicar.
+
+        Los conteos de cada archivo se guardan en el cubo `cubo_ene.pkl` junto con su
+        firma (tamaño, mtime); en ejecuciones siguientes solo se leen los archivos nuevos
+        o modificados, y se descartan los de archivos que ya no están. Los niveles se
+        obtienen como roll-up del cubo, que promedia cada mes de encuesta entre los
+        archivos que lo contienen: las tasas son las mismas de la ruta sin deduplicar.
+        """
+        cubo = self.cargar_cubo()
+        columns = list(dict.fromkeys(columns + cubo.columnas()))
+
+        firmas = {basename(file): (os.path.getsize(file), os.stat(file).st_mtime_ns) for file in csv_files}
+        nuevos = [file for file in sorted(csv_files) if cubo.fuentes.get(basename(file)) != firmas[basename(file)]]
+        ausentes = [fuente for fuente in cubo.fuentes if fuente not in firmas]
+        logging.info(f"Ingesta deduplicada: {len(nuevos)} de {len(csv_files)} archivos nuevos o modificados")
+        for fuente in ausentes:
+            cubo.quitar(fuente)
+        for file in nuevos:
+            cubo.agregar(self.leer_archivo(file, columns), fuente=basename(file), firma=firmas[basename(file)])
+
+        if nuevos or ausentes:
+            cubo.guardar(join(self.preprocess_path, self.cube_name))
+        # 'n' replica los niveles de la ruta sin deduplicar, que no lee fact_cal
+        return cubo.niveles(medida='n')
+
     def nivel_estratificado(self, raw, estado, date_set):
         if 'fact_cal' not in raw.columns:
             raw['fact_cal'] = 1
@@ -96,17 +149,15 @@ class ENE():
         m25 = raw.loc[estado_mask & mask_25 & m_mask,:].groupby(date_set)['fact_cal'].sum().rename(f'{estado[0]}m25')
         return h15, m15, h25, m25 
 
-    def trimestre_movil(self, nivel:pd.DataFrame):
-        nivel['dias_mes'] = [monthrange(*index)[-1] for index in nivel.index]
-        nivel_pre = nivel.shift(1)
-        nivel_pos = nivel.shift(-1)
-        dm_pos, dm, dm_pre = nivel_pos['dias_mes'].copy(), nivel['dias_mes'].copy(), nivel_pre['dias_mes'].copy()
-        nivel_movil = (nivel_pos.mul(dm_pos, axis=0) + nivel.mul(dm, axis=0) + nivel_pre.mul(dm_pre, axis=0)).div(
-            (dm_pos + dm + dm_pre), axis=0) 
+    def trimestre_movil(self, nivel:pd.DataFrame, ventana=3, ponderacion='dias'):
+        motor = VentanaMovil(ventana=ventana, ponderacion=ponderacion)
+        pesos = motor.pesos(nivel.index.get_level_values(0), nivel.index.get_level_values(1))
+        nivel_movil = motor.aplicar(nivel.to_numpy(dtype=float), pesos)
+        nivel_movil = pd.DataFrame(nivel_movil, index=nivel.index, columns=nivel.columns)
 
-        return nivel_movil.drop(columns='dias_mes').dropna(axis=0, how='all')
+        return nivel_movil.dropna(axis=0, how='all')
 
-    def nuevos_datos(self):
+    def nuevos_datos(self, revalidate=False, max_workers=6):
         if os.path.isfile(join(self.preprocess_path, self.final_name)):
             tasa = pd.read_csv(join(self.preprocess_path, self.final_name), sep=';')
             ano_mes = tasa.loc[len(tasa)-1, ['ano', 'mes']].astype(int).astype(str).str.cat(sep='-')
@@ -114,31 +165,35 @@ class ENE():
             last_date = pd.to_datetime(ano_mes, format='%Y-%m')
         else:
             last_date = pd.Timestamp(year=2010, month=1, day=1)
-        trim_movil = {1:'def', 2:'efm', 3:'fma', 4:'mam', 5:'amj', 6:'mjj', 7:'jja', 8:'jas', 9:'aso', 10:'son', 11:'ond', 12:'nde'}
-
-        i = 0
-        while True:
-            i += 1
-            date = last_date + pd.DateOffset(months=i)
-            trim = trim_movil[date.month]
-            file_name = f"ene-{date.strftime(format='%Y-%m')}-{trim}.csv"
-            os.makedirs(join(self.raw_path, 'monthly'), exist_ok=True)
-            if not os.path.exists(join(self.raw_path, 'monthly', file_name)):
-                request_statement = f'https://www.ine.gob.cl/docs/default-source/ocupacion-y-desocupacion/bbdd/{date.year}/csv/{file_name}'
-                response = requests.get(request_statement)
-                if response.status_code != 200:
-                    logging.warning(f"File download stopped on date {date.year}-{date.month}")
-                    break
-                else:
-                    logging.info(f"Downloading file for date {date.year}-{date.month}")
-                response = io.BytesIO(response.content, )
-                try:
-                    new = pd.read_csv(response, sep=';', encoding='latin1', low_memory=False)
-                except pd.errors.ParserError as e:
-                    logging.error("Check response content")
-                    break
-                new.to_csv(join(self.raw_path, 'monthly', file_name), sep=';', index=False)
-        
+
+        # Meses candidatos: desde el último registro procesado hasta el mes en curso.
+        # Los archivos ya descargados se omiten sin tocar la red.
+        today = pd.Timestamp.today()
+        candidates = []
+        date = last_date + pd.DateOffset(months=1)
+        while (date.year, date.month) <= (today.year, today.month):
+            candidates.append((date.year, date.month))
+            date = date + pd.DateOffset(months=1)
+
+        downloader = Downloader(join(self.raw_path, 'monthly'), base_url=self.base_url, max_workers=max_workers)
+        try:
+            # Archivos cuyo sha256 ya no coincide con el manifest: se borran y se descargan de nuevo
+            for name in downloader.verify():
+                logging.warning(f"Checksum mismatch for {name}, downloading it again")
+                downloader.discard(name)
+                candidates = sorted(set(candidates) | {(int(name[4:8]), int(name[9:11]))})
+            status = downloader.fetch_many(candidates, revalidate=revalidate)
+        finally:
+            downloader.close()
+
+        stopped = False
+        for (year, month), state in status.items():
+            if state == 'descargado':
+                logging.info(f"Downloading file for date {year}-{month}")
+            elif state != 'vigente' and not stopped:
+                logging.warning(f"File download stopped on date {year}-{month} ({state})")
+                stopped = True
+        return status
 
 if __name__=='__main__':
     ene = ENE()
@@ -0,0 +1,91 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+PONDERACIONES = ('dias', 'igual')
+
+
+def dias_mes(years, months) -> np.ndarray:
+    """Cantidad de días de cada mes, vectorizado."""
+    inicio = (np.asarray(years, dtype=int) - 1970) * 12 + np.asarray(months, dtype=int) - 1
+    inicio = inicio.astype('datetime64[M]')
+    return ((inicio + 1).astype('datetime64[D]') - inicio.astype('datetime64[D]')).astype(float)
+
+
+class VentanaMovil():
+    """
+    Promedio móvil centrado y ponderado sobre arreglos NumPy (filas = meses).
+
+    Generaliza el trimestre móvil de la ENE: cada fila se reemplaza por el promedio
+    de las `ventana` filas centradas en ella, ponderadas por los días de cada mes
+    ('dias') o con igual peso ('igual'). Las sumas se calculan sobre vistas
+    deslizantes del arreglo, sin copias desplazadas de la tabla completa. Las
+    primeras y últimas `ventana // 2` filas quedan en NaN.
+
+    `agregar` permite sumar meses nuevos y obtener solo las filas suavizadas que
+    se completan con ellos, reutilizando la cola guardada del último cálculo.
+    """
+    def __init__(self, ventana=3, ponderacion='dias') -> None:
+        if ventana < 1 or ventana % 2 == 0:
+            raise ValueError(f"La ventana debe ser un entero impar positivo. Se entregó {ventana}")
+        if ponderacion not in PONDERACIONES:
+            raise ValueError(f"Valores permitidos para ponderacion son: {PONDERACIONES}")
+        self.ventana = ventana
+        self.ponderacion = ponderacion
+        self._cola_valores = None
+        self._cola_pesos = None
+
+    def pesos(self, years, months) -> np.ndarray:
+        if self.ponderacion == 'dias':
+            return dias_mes(years, months)
+        return np.ones(len(years), dtype=float)
+
+    def _promedio(self, valores, pesos) -> np.ndarray:
+        # (n - ventana + 1, columnas): una fila por ventana completa
+        ponderados = valores * pesos[:, None]
+        num = sliding_window_view(ponderados, self.ventana, axis=0).sum(axis=-1)
+        den = sliding_window_view(pesos, self.ventana).sum(axis=-1)
+        return num / den[:, None]
+
+    def _guardar_cola(self, valores, pesos):
+        cola = self.ventana - 1
+        self._cola_valores = valores[len(valores) - cola:].copy()
+        self._cola_pesos = pesos[len(pesos) - cola:].copy()
+
+    def aplicar(self, valores, pesos) -> np.ndarray:
+        """Suaviza `valores` (n, columnas) o (n,). Retorna un arreglo de la misma forma."""
+        valores = np.asarray(valores, dtype=float)
+        pesos = np.asarray(pesos, dtype=float)
+        vector = valores.ndim == 1
+        valores = valores.reshape(len(valores), -1)
+        mitad = self.ventana // 2
+
+        salida = np.full(valores.shape, np.nan)
+        if len(valores) >= self.ventana:
+            salida[mitad:len(valores) - mitad] = self._promedio(valores, pesos)
+        self._guardar_cola(valores, pesos)
+        return salida[:, 0] if vector else salida
+
+    def agregar(self, valores, pesos) -> np.ndarray:
+        """
+        Agrega filas nuevas al final de la serie ya procesada con `aplicar`.
+
+        Retorna las filas suavizadas que quedan completas con los datos nuevos: una por
+        fila agregada, centradas `ventana // 2` filas antes de cada una.
+        """
+        if self._cola_valores is None:
+            raise ValueError("Debe llamar al método aplicar antes de agregar datos")
+        valores = np.asarray(valores, dtype=float)
+        vector = valores.ndim == 1
+        valores = valores.reshape(len(valores), -1)
+        pesos = np.asarray(pesos, dtype=float)
+
+        buffer_valores = np.concatenate([self._cola_valores, valores], axis=0)
+        buffer_pesos = np.concatenate([self._cola_pesos, pesos])
+        if len(buffer_valores) >= self.ventana:
+            salida = self._promedio(buffer_valores, buffer_pesos)
+        else:
+            salida = np.empty((0, valores.shape[1]))
+        salida = np.concatenate([np.full((len(valores) - len(salida), valores.shape[1]), np.nan), salida])
+        self._guardar_cola(buffer_valores, buffer_pesos)
+        return salida[:, 0] if vector else salida
@@ -0,0 +1,159 @@
+"""
+Modelo de costo de las tareas de ajuste y diagnóstico, y reporte de uso de un pool.
+
+El costo de una tarea se estima como `tasa[(tipo, modelo)] * trabajo(tipo, n)`. El
+trabajo son las observaciones que la tarea ajusta en total: `n` para un ajuste y
+~n²/2 para revision history, que ajusta todos los prefijos. La tasa (segundos por
+observación ajustada) se aprende de los tiempos medidos, ya sean los de TaskGraph o
+los spans 'task:*' de una traza de `--profile`. Mientras no hay mediciones, se parte
+de costos relativos por modelo (X13 muy por sobre STL y CiSSA). TaskGraph
+usa las estimaciones para despachar primero las tareas más largas.
+
+    costs = CostModel('data/.pipeline/costs.json')
+    costs.estimate('history', 'X13Model', 150)
+    costs.load_trace('traces/run.json')
+"""
+import os
+import json
+import logging
+from os.path import join
+
+
+# Segundos por observación ajustada de cada modelo, relativos a STL
+MODEL_COST = {'STLModel': 1.0, 'CiSSAModel': 2.0, 'X11Model': 3.0, 'X13Model': 12.0}
+
+# Observaciones ajustadas por cada tipo de tarea, según el largo de la serie
+WORK = {
+    'adjust': lambda n: n,
+    'vintage': lambda n: n,
+    # Un ajuste del prefijo y un pronóstico SARIMAX, que cuesta varios ajustes STL
+    'evolution': lambda n: 8 * n,
+    # Spans de 48 meses cada 12, sobre la serie antes y después del outlier
+    'sliding': lambda n: 2 * 4 * max(n - 48, 12),
+    # Prefijos de 4 meses a la serie completa
+    'history': lambda n: n * (n + 1) / 2,
+    # Diagnóstico completo de un modelo: lo domina revision history
+    'diagnose': lambda n: n * (n + 1) / 2 + 10 * n,
+}
+
+# Segundos por observación de STL en una CPU actual: escala de las estimaciones sin mediciones
+BASE_RATE = 2e-4
+
+
+class CostModel():
+    """
+    Estimador de segundos por tarea. Con `path` (JSON) las tasas se leen de ahí y `save`
+    las guarda para las ejecuciones siguientes; sin él, el modelo vive solo en memoria.
+
+    `observe` actualiza la tasa de (tipo, modelo) con un promedio móvil exponencial. Para
+    un par sin mediciones se usa MODEL_COST escalado por las tasas ya aprendidas de otros
+    pares, de modo que estimaciones aprendidas y a priori sean comparables entre sí.
+    """
+    def __init__(self, path=None, smoothing=0.3) -> None:
+        self.path = path
+        self.smoothing = smoothing
+        self.rates = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    self.rates = {tuple(key.split('|')): value for key, value in json.load(file).items()}
+            except (OSError, ValueError) as e:
+                logging.warning(f"No se pudo leer el modelo de costo '{path}': {e}")
+
+    @staticmethod
+    def work(kind, n) -> float:
+        if kind not in WORK:
+            raise ValueError(f"Tipo de tarea desconocido: '{kind}'. Valores permitidos: {list(WORK)}")
+        return float(WORK[kind](max(int(n), 1)))
+
+    def _scale(self, kind) -> float:
+        # Mediana de (tasa aprendida / costo relativo) del mismo tipo de tarea, o de todos
+        # si ese tipo no tiene mediciones: calibra los pares sin mediciones
+        for same_kind in (True, False):
+            ratios = sorted(rate / MODEL_COST.get(model, 1.0) for (other, model), rate in self.rates.items()
+                            if other == kind or not same_kind)
+            if ratios:
+                return ratios[len(ratios) // 2]
+        return BASE_RATE
+
+    def rate(self, kind, model) -> float:
+        if (kind, model) in self.rates:
+            return self.rates[(kind, model)]
+        return self._scale(kind) * MODEL_COST.get(model, 1.0)
+
+    def estimate(self, kind, model, n) -> float:
+        """Segundos estimados de una tarea `kind` de `model` (nombre de clase) sobre `n` observaciones."""
+        return self.rate(kind, model) * self.work(kind, n)
+
+    def observe(self, kind, model, n, seconds):
+        rate = seconds / self.work(kind, n)
+        previous = self.rates.get((kind, model))
+        self.rates[(kind, model)] = rate if previous is None else (1 - self.smoothing) * previous + self.smoothing * rate
+
+    def load_trace(self, path) -> int:
+        """Aprende de los spans 'task:*' con atributos de costo de una traza de `--profile`. Retorna cuántos usó."""
+        with open(path, encoding='utf-8') as file:
+            events = json.load(file)
+        events = events.get('traceEvents', []) if isinstance(events, dict) else events
+        used = 0
+        for event in events:
+            args = event.get('args', {})
+            if event.get('ph') == 'X' and event['name'].startswith('task:') and 'cost_kind' in args:
+                self.observe(args['cost_kind'], args['cost_model'], args['cost_n'], event['dur'] / 1e6)
+                used += 1
+        return used
+
+    def save(self):
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'|'.join(key): rate for key, rate in sorted(self.rates.items())}, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def utilization(intervals, workers) -> dict:
+    """
+    Uso del pool a partir de los intervalos (inicio, fin) de las tareas: fracción del
+    tiempo de `workers` workers ocupada, y la cola final (segundos desde la última vez
+    que todos los workers estaban ocupados hasta el fin; todo el tiempo si nunca lo estuvieron).
+    """
+    if not intervals:
+        return {'workers': workers, 'tasks': 0, 'wall_s': 0.0, 'busy_s': 0.0, 'utilization': None, 'tail_s': 0.0}
+    first = min(start for start, _ in intervals)
+    last = max(end for _, end in intervals)
+    wall = last - first
+    busy = sum(end - start for start, end in intervals)
+    # Barrido de eventos: +1 al iniciar, -1 al terminar (los fines primero en empates)
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals],
+                    key=lambda event: (event[0], event[1]))
+    running, full_until = 0, first
+    for when, delta in events:
+        if running >= workers:
+            full_until = when
+        running += delta
+    return {'workers': workers, 'tasks': len(intervals), 'wall_s': round(wall, 3), 'busy_s': round(busy, 3),
+            'utilization': round(busy / (wall * workers), 3) if wall > 0 else None,
+            'tail_s': round(last - full_until if full_until > first else wall, 3)}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Muestra (y actualiza con trazas de --profile) el modelo de costo de las tareas.')
+    parser.add_argument('--trace', action='append', default=[], help='Traza de --profile de la que aprender. Puede repetirse.')
+    parser.add_argument('--costs', default=join('data', '.pipeline', 'costs.json'), help="Por defecto: 'data/.pipeline/costs.json'.")
+    parser.add_argument('-n', type=int, default=180, help='Largo de serie para las estimaciones de ejemplo. Por defecto: 180.')
+    args = parser.parse_args()
+
+    costs = CostModel(args.costs)
+    for path in args.trace:
+        print(f"{costs.load_trace(path)} tareas aprendidas de '{path}'")
+    if args.trace:
+        costs.save()
+    print(f"{'tarea':<10} {'modelo':<11} {'s/obs':>10} {f'seg (n={args.n})':>12}")
+    for kind in WORK:
+        for model in MODEL_COST:
+            learned = '' if (kind, model) in costs.rates else '  (a priori)'
+            print(f"{kind:<10} {model:<11} {costs.rate(kind, model):10.2e} {costs.estimate(kind, model, args.n):12.2f}{learned}")
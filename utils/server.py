@@ -0,0 +1,323 @@
+import os
+import json
+import signal
+import time
+import logging
+import argparse
+import threading
+import socketserver
+from argparse import Namespace
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from main import MODELS, MODEL_LABELS, model_class, import_data, outlier_window, compute_rates
+from diagnostics.adjustment_cache import ADJUSTMENT_CACHE
+from utils.pipeline import file_signature
+
+
+class ServiceBusy(Exception):
+    """No se obtuvo un cupo de ejecución dentro del tiempo de espera."""
+
+
+class AdjustBatcher():
+    """
+    Agrupa los pedidos de ajuste que llegan casi al mismo tiempo.
+
+    El primer pedido de un modelo espera `window` segundos y luego ajusta, en una sola
+    llamada adjust_batch, todas las series de igual índice encoladas para ese modelo;
+    los demás pedidos solo esperan su resultado. Las series con NaN, o de modelos sin
+    ajuste por lotes, se ajustan una a una. Todo pasa por ADJUSTMENT_CACHE.
+    """
+    def __init__(self, window=0.01, max_batch=256) -> None:
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self._pending = dict()
+        self._lock = threading.Lock()
+
+    def submit(self, name:str, serie:pd.Series) -> pd.Series:
+        future = Future()
+        with self._lock:
+            queue = self._pending.setdefault(name, [])
+            queue.append((serie, future))
+            leader = len(queue) == 1
+            full = len(queue) >= self.max_batch
+        if leader:
+            if not full:
+                time.sleep(self.window)
+            with self._lock:
+                batch = self._pending.pop(name)
+            try:
+                self._run(name, batch)
+            except Exception as e:
+                for _, pending in batch:
+                    if not pending.done():
+                        pending.set_exception(e)
+        return future.result()
+
+    def _run(self, name, batch):
+        model = model_class(name)()
+        groups = dict()
+        for serie, future in batch:
+            if model.supports_batch and not serie.isna().any():
+                groups.setdefault((serie.index[0], serie.index[-1], len(serie)), []).append((serie, future))
+            else:
+                self._single(model_class(name)(), serie, future)
+        with self._lock:
+            self.batches += len(groups)
+        for group in groups.values():
+            rows = np.vstack([serie.to_numpy(dtype=float) for serie, _ in group])
+            try:
+                seasadj = ADJUSTMENT_CACHE.seasadj_batch(model, rows, [serie.index for serie, _ in group])
+            except ValueError:
+                for serie, future in group:
+                    self._single(model_class(name)(), serie, future)
+                continue
+            for (serie, future), values in zip(group, seasadj):
+                future.set_result(pd.Series(values, index=serie.index, name=serie.name))
+
+    @staticmethod
+    def _single(model, serie, future):
+        try:
+            future.set_result(ADJUSTMENT_CACHE.seasadj(model, serie).rename(serie.name))
+        except Exception as e:
+            future.set_exception(e)
+
+
+class Service():
+    """
+    Estado en memoria del servicio: datos de entrada, modelos importados y caches.
+
+    El archivo de entrada se relee solo si cambia (tamaño o fecha de modificación).
+    Los pedidos de cálculo se limitan a `max_concurrent` simultáneos; si no hay cupo
+    dentro de `queue_timeout` segundos el pedido se rechaza con ServiceBusy.
+    """
+    def __init__(self, input_file, max_concurrent=2, queue_timeout=30.0, batch_window=0.01) -> None:
+        self.input_file = input_file
+        self.queue_timeout = queue_timeout
+        self.batcher = AdjustBatcher(window=batch_window)
+        self.started = time.time()
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._data_lock = threading.Lock()
+        self._signature = None
+        self._data = None
+
+    @property
+    def data(self) -> pd.DataFrame:
+        with self._data_lock:
+            signature = file_signature(self.input_file)
+            if signature != self._signature:
+                logging.info(f"Cargando '{self.input_file}'")
+                self._data = import_data(self.input_file)
+                self._signature = signature
+            return self._data
+
+    def warm(self, names):
+        """Importa los modelos `names` y ajusta todas las series una vez para llenar los caches."""
+        for name in names:
+            start = time.perf_counter()
+            self.adjust({'model': name})
+            logging.info(f"{MODEL_LABELS[model_class(name).__name__]} precargado en {time.perf_counter() - start:.2f} s")
+
+    def run(self, func, payload):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise ServiceBusy(f"Sin cupo de ejecución tras {self.queue_timeout} s")
+        try:
+            with self._requests_lock:
+                self.requests += 1
+            return func(payload)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _model(payload) -> str:
+        name = payload.get('model')
+        if not isinstance(name, str) or name not in MODELS:
+            raise ValueError(f"Modelo inválido: {name!r}. Valores permitidos: {list(MODELS)}")
+        return name
+
+    def _series(self, payload) -> list:
+        data = self.data
+        names = payload.get('series') or list(data.columns)
+        names = [names] if isinstance(names, str) else names
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError(f"'series' debe ser un nombre o una lista de nombres, no {names!r}")
+        unknown = [name for name in names if name not in data.columns]
+        if unknown:
+            raise ValueError(f"Series inexistentes: {unknown}")
+        return [data[name] for name in names]
+
+    def _adjusted(self, name, series) -> pd.DataFrame:
+        results = [None] * len(series)
+        errors = [None] * len(series)
+
+        def submit(i, serie):
+            try:
+                results[i] = self.batcher.submit(name, serie)
+            except Exception as e:
+                errors[i] = e
+
+        # Cada serie entra al batcher desde su propio hilo para que se ajusten juntas
+        threads = [threading.Thread(target=submit, args=(i, serie)) for i, serie in enumerate(series)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        failed = [(serie.name, error) for serie, error in zip(series, errors) if error is not None]
+        if failed:
+            for serie_name, error in failed:
+                logging.error(f"No se pudo desestacionalizar '{serie_name}': {type(error).__name__}: {error}",
+                              exc_info=(type(error), error, error.__traceback__))
+            # Se propaga el error original (el handler responde 400 o 500 según su tipo)
+            raise failed[0][1]
+        return pd.concat([result.rename(f'{result.name}_std') for result in results], axis=1)
+
+    def adjust(self, payload) -> dict:
+        """Series desestacionalizadas: {'model': 'stl', 'series': ['td', ...]} (por defecto, todas)."""
+        name = self._model(payload)
+        return _frame(self._adjusted(name, self._series(payload)), model=name)
+
+    def rates(self, payload) -> dict:
+        """Tasas de desocupación originales y desestacionalizadas con el modelo pedido."""
+        name = self._model(payload)
+        data = self.data
+        adjusted = self._adjusted(name, [data[column] for column in data.columns])
+        try:
+            results = compute_rates(data, adjusted, Namespace(show_traceback=False))
+        except SystemExit:
+            # compute_rates termina el proceso ante columnas faltantes; aquí solo falla el pedido
+            raise ValueError("Faltan columnas para calcular las tasas (ver log)")
+        columns = [column for column in results.columns if column.startswith('td')]
+        return _frame(results[columns], model=name)
+
+    def diagnose(self, payload) -> dict:
+        """Diagnósticos de outlier de 'td' con el modelo pedido; los resultados quedan en el almacén."""
+        from utils.diagnose import Diagnose
+        name = self._model(payload)
+        tasa = self.data['td'].rename_axis('ds')
+        diag = Diagnose(tasa)
+        diag.set_outlier(outlier_window())
+        diag.outlier_diags(model_class(name), executor=payload.get('executor'))
+        return {'model': name, 'start': diag.start, 'end': diag.end, 'store': diag.store.path,
+                'timings': diag.timings}
+
+    def health(self) -> dict:
+        return {'status': 'ok', 'uptime_s': round(time.time() - self.started, 1), 'requests': self.requests,
+                'input': self.input_file, 'series': list(self.data.columns), 'batches': self.batcher.batches,
+                'cache': {'hits': ADJUSTMENT_CACHE.hits, 'misses': ADJUSTMENT_CACHE.misses,
+                          'mb': round(ADJUSTMENT_CACHE.nbytes / 2**20, 2)}}
+
+
+def _frame(frame:pd.DataFrame, **extra) -> dict:
+    values = frame.astype(object).where(frame.notna(), None)
+    return {**extra, 'index': [date.date().isoformat() for date in frame.index],
+            'series': {column: [None if value is None else float(value) for value in values[column]]
+                       for column in frame.columns}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'ENEService/1.0'
+    routes = {'/adjust': 'adjust', '/rates': 'rates', '/diagnose': 'diagnose'}
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, self.server.service.health())
+        else:
+            self._reply(404, {'error': f"Ruta inexistente: {self.path}"})
+
+    def do_POST(self):
+        if self.path not in self.routes:
+            return self._reply(404, {'error': f"Ruta inexistente: {self.path}"})
+        service = self.server.service
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError(f"El cuerpo debe ser un objeto JSON, no {type(payload).__name__}")
+            start = time.perf_counter()
+            result = service.run(getattr(service, self.routes[self.path]), payload)
+            result['seconds'] = round(time.perf_counter() - start, 4)
+            self._reply(200, result)
+        except (ValueError, KeyError) as e:
+            self._reply(400, {'error': str(e)})
+        except ServiceBusy as e:
+            self._reply(503, {'error': str(e)})
+        except Exception as e:
+            logging.error(f"Error en {self.path}: {type(e).__name__}: {e}", exc_info=True)
+            self._reply(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # En un socket Unix client_address no es (host, puerto)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service:Service, host='127.0.0.1', port=8765, unix_socket=None):
+    """Servidor HTTP (TCP o socket Unix si se entrega `unix_socket`) que atiende a `service`."""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = _UnixHTTPServer(unix_socket, _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+if __name__ == '__main__':
+    # python -m utils.server -i data/preprocess/tasa_oficial.csv --warm stl
+    # curl -s localhost:8765/adjust -d '{"model": "stl", "series": ["td"]}'
+    parser = argparse.ArgumentParser(description='Servicio de desestacionalización con estado en memoria.')
+    parser.add_argument('-i', '--input', required=True, help="CSV de entrada (mismo formato que 'main.py -i').")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', default=None, help='Ruta de un socket Unix; reemplaza host y puerto.')
+    parser.add_argument('--max_concurrent', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help='Pedidos de cálculo simultáneos. Por defecto: la mitad de las CPUs.')
+    parser.add_argument('--queue_timeout', type=float, default=30.0, help='Segundos de espera por un cupo antes de responder 503.')
+    parser.add_argument('--batch_window_ms', type=float, default=10.0, help='Ventana para agrupar pedidos de ajuste concurrentes.')
+    parser.add_argument('--warm', default='', help="Modelos a precargar al iniciar, separados por coma (p. ej. 'stl,x11').")
+    parser.add_argument('--log_level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+    service = Service(args.input, max_concurrent=args.max_concurrent, queue_timeout=args.queue_timeout,
+                      batch_window=args.batch_window_ms / 1e3)
+    service.data
+    service.warm([name for name in args.warm.split(',') if name])
+    server = make_server(service, args.host, args.port, args.socket)
+    logging.info(f"Escuchando en {args.socket or f'http://{args.host}:{args.port}'}")
+    # SIGTERM (p. ej. desde systemd) detiene el servicio igual que Ctrl+C, limpiando el socket
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
@@ -0,0 +1,611 @@
+"""
+Trabajos repartidos en shards para varios nodos sobre un sistema de archivos compartido.
+
+Un trabajo es un directorio con un manifiesto (`manifest.json`) que enumera shards
+independientes:
+
+    batch        una partición por hash de series_id de un CSV largo (ver utils.batch)
+    diagnose     un diagnóstico de outlier de un modelo: cada paso de 'evolution',
+                 A_mse, MM_mse, A_analysis, MM_analysis o history (ver utils.diagnose)
+
+Cualquier número de workers, en la misma máquina o en otras, reclama shards creando
+`locks/<shard>.lock` con O_EXCL (atómico también en NFS), los ejecuta y publica el
+resultado renombrando un directorio temporal a `results/<shard>`. Un lock cuyo
+worker dejó de renovarlo por más de `lease` segundos se puede reclamar de nuevo. Los
+fallos quedan en `failed/<shard>.json` y el shard se reintenta hasta `max_attempts`
+veces. Volver a crear el trabajo o a ejecutar los workers no repite shards ya
+terminados; `merge` junta los resultados en la salida final.
+
+    python -m utils.shards create jobs/noche --diagnose_input data/preprocess/tasa_oficial.csv --diagnose_models x13,stl
+    python -m utils.shards create jobs/lotes --batch_input series_largas.csv --shards 32 --route 'region_*=x13'
+    python -m utils.shards work jobs/noche --workers 4        # en cada nodo
+    python -m utils.shards status jobs/noche
+    python -m utils.shards merge jobs/noche
+"""
+import os
+import json
+import time
+import glob
+import pickle
+import shutil
+import socket
+import logging
+import argparse
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join, exists, basename, abspath
+
+import pandas as pd
+
+from main import MODELS, model_class
+from utils.batch import LongReader, BatchRunner, FORMATS, shard_of, _route
+from utils.pipeline import fingerprint, file_signature
+
+
+KINDS = ('batch', 'diagnose')
+DIAGNOSTICS = ('evolution', 'A_mse', 'MM_mse', 'A_analysis', 'MM_analysis', 'history')
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def batch_shards(job_dir, input, shards=16, sep=',', columns=('series_id', 'date', 'value'), model='stl',
+                 routes=(), chunksize=200_000) -> list:
+    """
+    Reparte el CSV largo `input` en `shards` archivos por hash de series_id (cada serie
+    queda completa y contigua en un shard, aunque la entrada no venga ordenada) y
+    retorna sus especificaciones. Los archivos van en
+    `job_dir/inputs/batch-<firma>`, con la firma del archivo y del reparto: si ya
+    existen no se vuelve a repartir, y otra entrada nunca pisa los de un trabajo anterior.
+    """
+    source = fingerprint(file_signature(abspath(input)), shards, sep, list(columns), 'sorted')[:12]
+    inputs = join('inputs', f'batch-{source}')
+    names = [f'batch-{k:04d}' for k in range(shards)]
+    specs = [{'id': name, 'kind': 'batch', 'input': join(inputs, f'{name}.csv'), 'model': model,
+              'routes': [list(route) for route in routes]} for name in names]
+    inputs = join(job_dir, inputs)
+    if all(exists(join(job_dir, spec['input'])) for spec in specs):
+        return specs
+    tmp = f'{inputs}.tmp-{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    reader = LongReader(input, sep=sep, columns=columns, chunksize=chunksize)
+    for chunk in reader._chunks(input):
+        shard = chunk['series_id'].map(lambda series_id: shard_of(series_id, shards))
+        for k, rows in chunk.groupby(shard):
+            path = join(tmp, f'{names[k]}.csv')
+            rows.to_csv(path, mode='a', index=False, header=not exists(path))
+    for name in names:
+        path = join(tmp, f'{name}.csv')
+        if not exists(path):
+            # Shard sin series: archivo vacío con encabezado para que el worker lo complete igual
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('series_id,date,value\n')
+            continue
+        # Las filas de una serie llegan en varios bloques: se ordena el shard (1/shards de
+        # la entrada) por series_id para que el worker lo lea en modo contiguo
+        rows = pd.read_csv(path, dtype={'series_id': str, 'date': str, 'value': float})
+        rows.sort_values('series_id', kind='stable').to_csv(path, index=False)
+    os.makedirs(inputs, exist_ok=True)
+    for name in names:
+        os.replace(join(tmp, f'{name}.csv'), join(inputs, f'{name}.csv'))
+    shutil.rmtree(tmp, ignore_errors=True)
+    logging.info(f"{reader.rows} filas de '{input}' repartidas en {shards} shards")
+    return specs
+
+
+def diagnostic_shards(job_dir, input, models, diagnostics=DIAGNOSTICS) -> list:
+    """
+    Un shard por modelo y diagnóstico de outlier de la tasa 'td' de `input` (el formato
+    de main.py), con cada paso de 'evolution' como un shard aparte.
+    """
+    from main import import_data, outlier_window
+    from diagnostics.outlier_analysis import OutlierAnalysis
+    unknown = [name for name in diagnostics if name not in DIAGNOSTICS]
+    if unknown:
+        raise ValueError(f"Diagnósticos inválidos: {unknown}. Valores permitidos: {DIAGNOSTICS}")
+    serie = import_data(input)['td'].rename_axis('ds')
+    outlier = outlier_window()
+    outlier = outlier.loc[outlier == 1]
+    relative = join('inputs', f'diagnose-{fingerprint(serie, outlier)[:12]}.pkl')
+    os.makedirs(join(job_dir, 'inputs'), exist_ok=True)
+    path = join(job_dir, relative)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'wb') as file:
+        pickle.dump({'serie': serie, 'outlier': outlier}, file)
+    os.replace(tmp_path, path)
+
+    analist = OutlierAnalysis()
+    analist.fit(serie, outlier=outlier)
+    steps = [last_date.date().isoformat() for last_date in analist.evolution_dates()]
+    specs = []
+    for name in models:
+        for diagnostic in diagnostics:
+            for step in steps if diagnostic == 'evolution' else [None]:
+                shard_id = f'diagnose-{name}-{diagnostic}' + (f'-{step}' if step else '')
+                specs.append({'id': shard_id, 'kind': 'diagnose', 'input': relative,
+                              'model': name, 'diagnostic': diagnostic, 'step': step})
+    return specs
+
+
+class ShardJob():
+    """
+    Directorio de un trabajo repartido: manifiesto, locks, resultados y fallos.
+
+    >>> job = ShardJob('jobs/noche')
+    >>> job.create(diagnostic_shards('jobs/noche', 'data/preprocess/tasa_oficial.csv', ['stl']))
+    >>> ShardWorker(job).run()
+    >>> job.status()
+    """
+    def __init__(self, job_dir) -> None:
+        self.job_dir = abspath(job_dir)
+        self.manifest_path = join(self.job_dir, 'manifest.json')
+        self.locks = join(self.job_dir, 'locks')
+        self.results = join(self.job_dir, 'results')
+        self.failed = join(self.job_dir, 'failed')
+        self._manifest = None
+        self._tokens = {}
+
+    def create(self, shards, force=False) -> dict:
+        """
+        Escribe el manifiesto. Si ya existe uno con los mismos shards no se toca (los
+        resultados previos se conservan); si es distinto se lanza ValueError, salvo con
+        `force`, que además descarta locks, resultados y fallos anteriores.
+        """
+        ids = [spec['id'] for spec in shards]
+        if len(set(ids)) != len(ids):
+            raise ValueError('Hay shards con el mismo id en el manifiesto')
+        manifest = {'fingerprint': fingerprint(shards), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'shards': shards}
+        if exists(self.manifest_path):
+            current = _read_json(self.manifest_path)
+            if current['fingerprint'] == manifest['fingerprint']:
+                logging.info(f"El manifiesto de '{self.job_dir}' no cambió: se conservan sus resultados")
+                self._manifest = current
+                return current
+            if not force:
+                raise ValueError(f"'{self.job_dir}' ya tiene otro manifiesto: use force para reemplazarlo")
+            for directory in (self.locks, self.results, self.failed):
+                shutil.rmtree(directory, ignore_errors=True)
+        for directory in (self.locks, self.results, self.failed):
+            os.makedirs(directory, exist_ok=True)
+        _write_json(self.manifest_path, manifest)
+        self._manifest = manifest
+        return manifest
+
+    @property
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            if not exists(self.manifest_path):
+                raise ValueError(f"'{self.job_dir}' no tiene manifiesto: cree el trabajo primero")
+            self._manifest = _read_json(self.manifest_path)
+        return self._manifest
+
+    @property
+    def shards(self) -> list:
+        return self.manifest['shards']
+
+    def path(self, relative) -> str:
+        return join(self.job_dir, relative)
+
+    def _lock(self, shard_id) -> str:
+        return join(self.locks, f'{shard_id}.lock')
+
+    def result(self, shard_id) -> str:
+        return join(self.results, shard_id)
+
+    def done(self, shard_id) -> bool:
+        return exists(self.result(shard_id))
+
+    def attempts(self, shard_id) -> list:
+        path = join(self.failed, f'{shard_id}.json')
+        return _read_json(path)['attempts'] if exists(path) else []
+
+    def _owner(self, path):
+        """(inodo, contenido) del lock en `path`, o None si no existe."""
+        try:
+            with open(path, encoding='utf-8') as file:
+                return os.fstat(file.fileno()).st_ino, file.read()
+        except FileNotFoundError:
+            return None
+
+    def _take(self, path, owner, tag) -> bool:
+        """
+        Retira el lock `path` solo si sigue siendo `owner`: lo renombra a un nombre único
+        y compara lo que se llevó. Si entretanto otro worker había creado un lock nuevo,
+        se lo devuelve (os.link no pisa un lock creado mientras tanto) y retorna False.
+        """
+        taken = f'{path}.{tag}'
+        try:
+            os.rename(path, taken)
+        except FileNotFoundError:
+            return False
+        matches = self._owner(taken) == owner
+        if not matches:
+            try:
+                os.link(taken, path)
+            except FileExistsError:
+                pass
+        os.remove(taken)
+        return matches
+
+    def claim(self, shard_id, worker, lease) -> bool:
+        """
+        Toma el lock del shard; reclama también locks cuyo dueño no los renovó en `lease`
+        segundos. Cada lock lleva un token único, de modo que un worker que vio un lock
+        vencido nunca retira el lock nuevo que otro creó al reclamarlo primero.
+        """
+        path = self._lock(shard_id)
+        token = f'{worker}-{uuid.uuid4().hex[:12]}'
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                owner = self._owner(path)
+                if owner is None:
+                    continue
+                try:
+                    age = time.time() - os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+                if age <= lease or self._owner(path) != owner:
+                    return False
+                if not self._take(path, owner, f'stale-{token}'):
+                    return False
+                logging.warning(f"Lock vencido de '{shard_id}' ({age:.0f} s sin renovar): se reclama")
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump({'worker': worker, 'token': token, 'since': time.strftime('%Y-%m-%dT%H:%M:%S')}, file)
+            self._tokens[shard_id] = token
+            if self.done(shard_id) or not self.owns(shard_id):
+                # Otro worker lo terminó entre la revisión y el lock, o ya reclamó el lock
+                self.release(shard_id)
+                return False
+            return True
+        return False
+
+    @staticmethod
+    def _token(owner):
+        try:
+            return json.loads(owner[1]).get('token') if owner else None
+        except ValueError:
+            return None
+
+    def owns(self, shard_id) -> bool:
+        """True si el lock del shard es el que tomó este proceso con `claim`."""
+        token = self._tokens.get(shard_id)
+        return token is not None and self._token(self._owner(self._lock(shard_id))) == token
+
+    def release(self, shard_id):
+        """Borra el lock del shard solo si sigue siendo de este proceso."""
+        token = self._tokens.pop(shard_id, None)
+        path = self._lock(shard_id)
+        owner = self._owner(path)
+        if token is not None and self._token(owner) == token:
+            self._take(path, owner, f'release-{token}')
+
+    def complete(self, shard_id, tmp_dir) -> bool:
+        """Publica `tmp_dir` como resultado del shard con un rename atómico. False si ya había uno."""
+        try:
+            os.rename(tmp_dir, self.result(shard_id))
+            return True
+        except OSError:
+            if not self.done(shard_id):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+
+    def fail(self, shard_id, worker, error):
+        attempts = self.attempts(shard_id)
+        attempts.append({'worker': worker, 'at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'error': error})
+        _write_json(join(self.failed, f'{shard_id}.json'), {'attempts': attempts})
+
+    def retry(self, shard_ids=None) -> list:
+        """Borra el historial de fallos (de todos o de `shard_ids`) para que los shards agotados se reintenten."""
+        cleared = []
+        for path in glob.glob(join(self.failed, '*.json')):
+            shard_id = basename(path)[:-len('.json')]
+            if shard_ids is None or shard_id in shard_ids:
+                os.remove(path)
+                cleared.append(shard_id)
+        return cleared
+
+    def status(self, max_attempts=3) -> dict:
+        """Estado de cada shard: 'terminado', 'en curso', 'agotado', 'reintentar' o 'pendiente'."""
+        states = {}
+        for spec in self.shards:
+            shard_id = spec['id']
+            if self.done(shard_id):
+                states[shard_id] = 'terminado'
+            elif exists(self._lock(shard_id)):
+                states[shard_id] = 'en curso'
+            elif len(self.attempts(shard_id)) >= max_attempts:
+                states[shard_id] = 'agotado'
+            elif self.attempts(shard_id):
+                states[shard_id] = 'reintentar'
+            else:
+                states[shard_id] = 'pendiente'
+        return states
+
+
+class ShardWorker():
+    """
+    Reclama y ejecuta shards de un trabajo hasta que no quede ninguno disponible: los
+    terminados, los agotados (`max_attempts` fallos) y los que tiene otro worker vivo
+    se saltan. Mientras ejecuta un shard renueva su lock cada `lease / 4` segundos.
+    `executor` y `max_workers` se usan dentro de los shards 'batch' (ver BatchRunner).
+    """
+    def __init__(self, job:ShardJob, worker=None, lease=3600, max_attempts=3, executor='serial',
+                 max_workers=None, fmt='auto') -> None:
+        self.job = job
+        self.worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.executor = executor
+        self.max_workers = max_workers
+        self.fmt = fmt
+        self.counts = {'completed': 0, 'failed': 0}
+
+    def _available(self):
+        for spec in self.job.shards:
+            if self.job.done(spec['id']) or len(self.job.attempts(spec['id'])) >= self.max_attempts:
+                continue
+            yield spec
+
+    def _heartbeat(self, shard_id, stop):
+        path = self.job._lock(shard_id)
+        while not stop.wait(self.lease / 4):
+            if not self.job.owns(shard_id):
+                logging.warning(f"El lock de '{shard_id}' ya no es de '{self.worker}': se deja de renovar")
+                return
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return
+
+    def execute(self, spec, tmp_dir):
+        if spec['kind'] == 'batch':
+            runner = BatchRunner(tmp_dir, model=spec['model'], routes=[tuple(route) for route in spec['routes']],
+                                 executor=self.executor, max_workers=self.max_workers, fmt=self.fmt)
+            return runner.run(LongReader(self.job.path(spec['input'])))
+        if spec['kind'] == 'diagnose':
+            with open(self.job.path(spec['input']), 'rb') as file:
+                data = pickle.load(file)
+            result = run_diagnostic(spec['diagnostic'], data['serie'], data['outlier'], model_class(spec['model']), spec['step'])
+            with open(join(tmp_dir, 'result.pkl'), 'wb') as file:
+                pickle.dump(result, file)
+            return {}
+        raise ValueError(f"Tipo de shard desconocido: '{spec['kind']}'. Valores permitidos: {KINDS}")
+
+    def run_one(self, spec) -> bool:
+        shard_id = spec['id']
+        if not self.job.claim(shard_id, self.worker, self.lease):
+            return False
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(shard_id, stop), daemon=True)
+        heartbeat.start()
+        tmp_dir = join(self.job.results, f'.{shard_id}.tmp-{self.worker}')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        start = time.perf_counter()
+        try:
+            summary = self.execute(spec, tmp_dir)
+            _write_json(join(tmp_dir, 'meta.json'), {'worker': self.worker, 'seconds': time.perf_counter() - start,
+                                                     'attempt': len(self.job.attempts(shard_id)) + 1, **summary})
+            if self.job.complete(shard_id, tmp_dir):
+                self.counts['completed'] += 1
+                logging.info(f"Shard '{shard_id}' completado en {time.perf_counter() - start:.1f} s")
+        except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            self.job.fail(shard_id, self.worker, f'{type(e).__name__}: {e}')
+            self.counts['failed'] += 1
+            logging.error(f"Shard '{shard_id}' falló: {type(e).__name__}: {e}")
+        finally:
+            stop.set()
+            heartbeat.join()
+            self.job.release(shard_id)
+        return True
+
+    def run(self) -> dict:
+        # Se repasa el manifiesto mientras se consiga algún shard: así los fallidos se reintentan
+        while any([self.run_one(spec) for spec in self._available()]):
+            pass
+        return self.counts
+
+
+def run_diagnostic(name, serie, outlier, model, step=None):
+    """Ejecuta un shard de diagnóstico: un paso de 'evolution' (`step`) o una tarea de utils.diagnose."""
+    from utils.diagnose import _evolution_step, _sliding, _history, SLIDING
+    if name == 'evolution':
+        return _evolution_step(serie, outlier, model, pd.Timestamp(step))
+    if name in SLIDING:
+        return _sliding(name, serie, outlier, model)
+    if name == 'history':
+        return _history(serie, outlier, model)
+    raise ValueError(f"Diagnóstico desconocido: '{name}'. Valores permitidos: {DIAGNOSTICS}")
+
+
+def _work(job_dir, options) -> dict:
+    """Worker local en su propio proceso (sustituto de una cola para una sola máquina)."""
+    return ShardWorker(ShardJob(job_dir), **options).run()
+
+
+def _check_complete(job, kind, partial):
+    specs = [spec for spec in job.shards if spec['kind'] == kind]
+    missing = [spec['id'] for spec in specs if not job.done(spec['id'])]
+    if missing and not partial:
+        raise ValueError(f"Faltan {len(missing)} shards '{kind}' por terminar (p. ej. {missing[:3]}): "
+                         "ejecute los workers, 'retry' para los agotados, o use partial")
+    return [spec for spec in specs if job.done(spec['id'])]
+
+
+def merge_batch(job:ShardJob, output_dir, partial=False) -> dict:
+    """
+    Copia las particiones de cada shard 'batch' a `output_dir/model=<m>/part-<shard>-NNNNN`
+    y junta errors.csv y summary.json. Repetirlo sobrescribe los mismos archivos.
+    """
+    specs = _check_complete(job, 'batch', partial)
+    totals = {'shards': len(specs), 'series': 0, 'adjusted': 0, 'errors': 0, 'rows_out': 0, 'parts': 0}
+    errors = []
+    for spec in specs:
+        result = job.result(spec['id'])
+        for part in sorted(glob.glob(join(result, 'model=*', 'part-*'))):
+            directory = join(output_dir, basename(os.path.dirname(part)))
+            os.makedirs(directory, exist_ok=True)
+            target = join(directory, basename(part).replace('part-', f"part-{spec['id']}-"))
+            shutil.copyfile(part, f'{target}.tmp')
+            os.replace(f'{target}.tmp', target)
+            totals['parts'] += 1
+        summary = _read_json(join(result, 'summary.json'))
+        for key in ('series', 'adjusted', 'errors', 'rows_out'):
+            totals[key] += summary[key] or 0
+        errors.append(pd.read_csv(join(result, 'errors.csv'), dtype=str))
+    os.makedirs(output_dir, exist_ok=True)
+    if errors:
+        pd.concat(errors, ignore_index=True).to_csv(join(output_dir, 'errors.csv'), index=False)
+    _write_json(join(output_dir, 'summary.json'), totals)
+    return totals
+
+
+def merge_diagnostics(job:ShardJob, store=None, partial=False) -> dict:
+    """
+    Agrega los resultados de los shards 'diagnose' al almacén de diagnósticos, combina
+    los pasos de 'evolution' y escribe `metrics.md` y `timings.csv` de cada modelo,
+    igual que Diagnose.outlier_diags. El almacén reemplaza cada métrica, así que
+    repetirlo no duplica filas.
+    """
+    from os.path import realpath
+    from diagnostics.store import DiagnosticsStore
+    from utils.diagnose import save_diagnostic, _evolution, _metrics, SLIDING
+    store = DiagnosticsStore() if store is None else store
+    specs = _check_complete(job, 'diagnose', partial)
+    inputs = {}
+    merged = {}
+    for spec in specs:
+        if spec['input'] not in inputs:
+            with open(job.path(spec['input']), 'rb') as file:
+                inputs[spec['input']] = pickle.load(file)
+        data = inputs[spec['input']]
+        with open(join(job.result(spec['id']), 'result.pkl'), 'rb') as file:
+            result = pickle.load(file)
+        key = (spec['model'], spec['input'])
+        merged.setdefault(key, {'results': {}, 'steps': {}, 'timings': {}, 'data': data})
+        seconds = _read_json(join(job.result(spec['id']), 'meta.json'))['seconds']
+        if spec['diagnostic'] == 'evolution':
+            merged[key]['steps'][spec['step']] = result
+            merged[key]['timings'][f"evolution[{spec['step']}]"] = seconds
+        else:
+            merged[key]['results'][spec['diagnostic']] = result
+            merged[key]['timings'][spec['diagnostic']] = seconds
+
+    expected = {}
+    for spec in job.shards:
+        if spec['kind'] == 'diagnose' and spec['diagnostic'] == 'evolution':
+            expected.setdefault((spec['model'], spec['input']), set()).add(spec['step'])
+    written = {}
+    for (name, input), group in merged.items():
+        model_name = model_class(name).__name__
+        serie, outlier = group['data']['serie'], group['data']['outlier']
+        start, end = outlier.index[0].date().isoformat(), outlier.index[-1].date().isoformat()
+        results = group['results']
+        if group['steps'] and set(group['steps']) == expected.get((name, input), set()):
+            results['evolution'] = _evolution(serie, outlier, *[group['steps'][step] for step in sorted(group['steps'])])
+        for diagnostic, result in results.items():
+            save_diagnostic(store, model_name, start, end, diagnostic, result)
+        results_path = join(realpath('.'), 'data', 'diagnostics', end.replace('-', ''), model_name)
+        os.makedirs(results_path, exist_ok=True)
+        if all(diagnostic in results for diagnostic in SLIDING):
+            with open(join(results_path, 'metrics.md'), 'w', encoding='utf-8') as file:
+                file.write(_metrics(model_name, start, end, *[results[diagnostic] for diagnostic in SLIDING]))
+        pd.Series(group['timings'], name='segundos').rename_axis('tarea').to_csv(join(results_path, 'timings.csv'))
+        written[model_name] = sorted(results)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trabajos de ajuste por lotes y diagnóstico repartidos en shards.')
+    parser.add_argument('command', choices=['create', 'work', 'status', 'retry', 'merge'])
+    parser.add_argument('job', help='Directorio del trabajo (compartido entre los nodos).')
+    parser.add_argument('--batch_input', default=None, help="create: CSV largo (series_id, date, value) para shards 'batch'.")
+    parser.add_argument('--shards', type=int, default=16, help="create: número de shards 'batch'. Por defecto: 16.")
+    parser.add_argument('--sep', default=',')
+    parser.add_argument('--columns', default='series_id,date,value', help="create: columnas de id, fecha y valor del CSV largo.")
+    parser.add_argument('--model', default='stl', choices=list(MODELS), help="create: modelo por defecto de los shards 'batch'.")
+    parser.add_argument('--route', type=_route, action='append', default=[], metavar='PATRÓN=MODELO')
+    parser.add_argument('--diagnose_input', default=None, help="create: archivo de tasas (formato de main.py) para shards 'diagnose'.")
+    parser.add_argument('--diagnose_models', type=lambda value: [name.strip() for name in value.split(',') if name.strip()],
+                        default=['stl'], help="create: modelos a diagnosticar, p. ej. 'x13,stl'. Por defecto: 'stl'.")
+    parser.add_argument('--diagnostics', type=lambda value: [name.strip() for name in value.split(',') if name.strip()],
+                        default=list(DIAGNOSTICS), help=f"create: diagnósticos a incluir. Por defecto: {','.join(DIAGNOSTICS)}.")
+    parser.add_argument('--force', action='store_true', help='create: reemplaza un manifiesto distinto y descarta sus resultados.')
+    parser.add_argument('--workers', type=int, default=1, help='work: workers locales, cada uno en su proceso. Por defecto: 1.')
+    parser.add_argument('--lease', type=float, default=3600, help='work: segundos sin renovar tras los que un lock se considera abandonado.')
+    parser.add_argument('--max_attempts', type=int, default=3, help='work/status: intentos por shard antes de darlo por agotado.')
+    parser.add_argument('--executor', default='serial', choices=['serial', 'thread', 'process'],
+                        help="work: ejecutor dentro de cada shard 'batch'. Por defecto: 'serial' (un worker por proceso).")
+    parser.add_argument('--max_workers', type=int, default=None, help="work: workers del ejecutor de cada shard 'batch'.")
+    parser.add_argument('--format', default='auto', choices=FORMATS, help="work: formato de las particiones de los shards 'batch'.")
+    parser.add_argument('--ids', default=None, help='retry: ids de shards separados por coma (por defecto, todos los fallidos).')
+    parser.add_argument('-o', '--output', default=join('output', 'batch'), help="merge: salida de los shards 'batch'. Por defecto: 'output/batch'.")
+    parser.add_argument('--store', default=None, help='merge: base SQLite de diagnósticos (por defecto, la de DiagnosticsStore).')
+    parser.add_argument('--partial', action='store_true', help='merge: junta lo terminado aunque falten shards.')
+    parser.add_argument('--log_level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+
+    job = ShardJob(args.job)
+    if args.command == 'create':
+        if not args.batch_input and not args.diagnose_input:
+            parser.error("create requiere --batch_input y/o --diagnose_input")
+        unknown = [name for name in args.diagnose_models if name not in MODELS]
+        if unknown:
+            parser.error(f"Modelos inválidos en '--diagnose_models': {unknown}. Valores permitidos: {list(MODELS)}")
+        os.makedirs(job.job_dir, exist_ok=True)
+        specs = []
+        if args.batch_input:
+            columns = [column.strip() for column in args.columns.split(',')]
+            specs += batch_shards(job.job_dir, args.batch_input, shards=args.shards, sep=args.sep, columns=columns,
+                                  model=args.model, routes=args.route)
+        if args.diagnose_input:
+            specs += diagnostic_shards(job.job_dir, args.diagnose_input, args.diagnose_models, args.diagnostics)
+        job.create(specs, force=args.force)
+        print(f"{len(job.shards)} shards en '{job.manifest_path}'")
+    elif args.command == 'work':
+        options = {'lease': args.lease, 'max_attempts': args.max_attempts, 'executor': args.executor,
+                   'max_workers': args.max_workers, 'fmt': args.format}
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                counts = [future.result() for future in [pool.submit(_work, job.job_dir, options) for _ in range(args.workers)]]
+        else:
+            counts = [_work(job.job_dir, options)]
+        print(f"{sum(c['completed'] for c in counts)} shards completados, {sum(c['failed'] for c in counts)} fallidos")
+    elif args.command == 'status':
+        states = job.status(args.max_attempts)
+        for state in ('terminado', 'en curso', 'pendiente', 'reintentar', 'agotado'):
+            ids = [shard_id for shard_id, value in states.items() if value == state]
+            print(f"{state:<11} {len(ids):5d}  {' '.join(ids[:5])}{' ...' if len(ids) > 5 else ''}")
+        for shard_id, value in states.items():
+            if value in ('reintentar', 'agotado'):
+                print(f"  {shard_id}: {job.attempts(shard_id)[-1]['error']}")
+    elif args.command == 'retry':
+        cleared = job.retry(args.ids.split(',') if args.ids else None)
+        print(f"{len(cleared)} shards vuelven a estar disponibles")
+    elif args.command == 'merge':
+        kinds = {spec['kind'] for spec in job.shards}
+        if 'batch' in kinds:
+            totals = merge_batch(job, args.output, partial=args.partial)
+            print(f"Lotes: {totals['adjusted']} de {totals['series']} series en {totals['parts']} archivos de '{args.output}'")
+        if 'diagnose' in kinds:
+            from diagnostics.store import DiagnosticsStore
+            written = merge_diagnostics(job, store=DiagnosticsStore(args.store) if args.store else None, partial=args.partial)
+            for model_name, diagnostics in written.items():
+                print(f"Diagnósticos de {model_name}: {', '.join(diagnostics)}")
@@ -0,0 +1,131 @@
+"""
+Arreglos y series en memoria compartida (multiprocessing.shared_memory) para pools de procesos.
+
+Los workers reciben solo un `handle` (nombre, forma y tipo) y escriben sus resultados
+directamente en la matriz del proceso principal, en vez de serializarlos con pickle y
+concatenarlos al final. Con `shared=False` se usa un arreglo numpy normal y el handle
+es el arreglo mismo, para los ejecutores en hilos o en serie.
+
+    with SharedArray((n, k), fill=np.nan) as matrix, SharedSeries(serie) as source:
+        pool.submit(worker, matrix.handle, source.handle, ...)   # SharedArray.attach(handle)[...] = ...
+        frame = pd.DataFrame(matrix.array, index=serie.index, copy=False)
+"""
+import gc
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+# Bloques abiertos por este proceso (en los workers), en orden de apertura
+_ATTACHED = {}
+MAX_ATTACHED = 64
+
+
+def _release(name):
+    memory = _ATTACHED.pop(name)
+    try:
+        memory.close()
+    except BufferError:
+        # Aún hay vistas vivas del bloque: se cierra cuando el objeto se libere
+        pass
+
+
+class SharedArray():
+    """
+    Arreglo numpy sobre un bloque de memoria compartida creado por este proceso, que lo
+    libera al cerrar. Los workers lo abren con `SharedArray.attach(handle)`.
+    Las vistas de `array` (p. ej. un DataFrame creado sin copiar) deben descartarse
+    antes de cerrar.
+    """
+    def __init__(self, shape, dtype=float, fill=None, shared=True) -> None:
+        dtype = np.dtype(dtype)
+        shape = tuple(int(size) for size in np.atleast_1d(shape))
+        self._memory = None
+        if shared:
+            size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+            self.array = np.ndarray(shape, dtype=dtype, buffer=self._memory.buf)
+        else:
+            self.array = np.empty(shape, dtype=dtype)
+        if fill is not None:
+            self.array.fill(fill)
+
+    @property
+    def handle(self):
+        """Referencia liviana para enviar a los workers: (nombre, forma, tipo), o el arreglo si no es compartido."""
+        if self._memory is None:
+            return self.array
+        return (self._memory.name, self.array.shape, self.array.dtype.str)
+
+    @staticmethod
+    def attach(handle) -> np.ndarray:
+        """
+        Arreglo de `handle` en este proceso. Cada bloque se abre una vez por proceso y
+        queda abierto (los workers lo reutilizan entre tareas); el creador lo libera.
+        """
+        if isinstance(handle, np.ndarray):
+            return handle
+        name, shape, dtype = handle
+        if name not in _ATTACHED:
+            if len(_ATTACHED) >= MAX_ATTACHED:
+                _release(next(iter(_ATTACHED)))
+            _ATTACHED[name] = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, dtype=dtype, buffer=_ATTACHED[name].buf)
+
+    def close(self):
+        if self._memory is not None:
+            self.array = None
+            try:
+                self._memory.close()
+            except BufferError:
+                # Vistas en ciclos de referencias (p. ej. DataFrames temporales)
+                gc.collect()
+                self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SharedSeries():
+    """
+    Serie de solo lectura para los workers: valores (float) e índice de fechas (int64)
+    en memoria compartida. `SharedSeries.read(handle, start, end)` reconstruye
+    serie.iloc[start:end] copiando solo ese tramo.
+    """
+    def __init__(self, serie:pd.Series, shared=True) -> None:
+        self.values = SharedArray(len(serie), float, shared=shared)
+        self.values.array[:] = serie.to_numpy(dtype=float)
+        self.index = SharedArray(len(serie), 'int64', shared=shared)
+        self.index.array[:] = pd.DatetimeIndex(serie.index).asi8
+        self.freq = serie.index.freqstr if isinstance(serie.index, pd.DatetimeIndex) else None
+        self.name = serie.name
+        self.index_name = serie.index.name
+
+    @property
+    def handle(self) -> tuple:
+        return (self.values.handle, self.index.handle, self.freq, self.name, self.index_name)
+
+    @staticmethod
+    def read(handle, start=0, end=None) -> pd.Series:
+        values_handle, index_handle, freq, name, index_name = handle
+        data = SharedArray.attach(values_handle)[start:end].copy()
+        dates = pd.DatetimeIndex(SharedArray.attach(index_handle)[start:end].copy().view('M8[ns]'), freq=freq, name=index_name)
+        return pd.Series(data, index=dates, name=name)
+
+    def close(self):
+        self.values.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
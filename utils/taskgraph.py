@@ -0,0 +1,208 @@
+import os
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.instrument import TRACER
+from utils.scheduler import CostModel, utilization
+
+
+EXECUTORS = ('serial', 'thread', 'process')
+
+
+def _timed(name, attrs, counters, func, *args):
+    """
+    Ejecuta `func` y retorna (resultado, segundos, inicio en time.time(), contadores).
+    Nivel de módulo para poder enviarse a procesos; `attrs` se agregan al span de la
+    tarea, y `counters` (o None) da los contadores del proceso, de los que se retorna
+    cuánto avanzaron durante la tarea.
+    """
+    before = counters() if counters is not None else {}
+    started = time.time()
+    start = time.perf_counter()
+    with TRACER.span(f'task:{name}', **attrs):
+        result = func(*args)
+    seconds = time.perf_counter() - start
+    after = counters() if counters is not None else {}
+    return result, seconds, started, {key: after[key] - before.get(key, 0) for key in after}
+
+
+class _SerialExecutor():
+    """Ejecutor sin concurrencia con la interfaz mínima de concurrent.futures (útil para depurar)."""
+    def __init__(self, max_workers=None) -> None:
+        pass
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class TaskGraph():
+    """
+    Grafo de tareas con dependencias, ejecutado en hilos, procesos o en serie.
+
+    Cada tarea recibe sus argumentos más los resultados de sus dependencias (en el
+    orden de `deps`) y se envía al ejecutor apenas estas terminan. `on_done` se llama
+    en el proceso principal con el resultado de la tarea en cuanto termina, de modo
+    que las salidas se escriben sin esperar al resto del grafo. Con el ejecutor
+    'process' las funciones y argumentos deben poder serializarse con pickle.
+
+    `cost` de cada tarea (segundos, o (tipo, modelo, n) para estimarlo con `costs`, un
+    utils.scheduler.CostModel) fija el orden de despacho: entre las tareas listas va
+    primero la de mayor costo sumado al de su cadena de dependientes más larga, y nunca
+    hay más tareas en vuelo que workers, de modo que una tarea larga que queda lista
+    tarde no espera detrás de una cola de tareas cortas. Los tiempos medidos de las
+    tareas con (tipo, modelo, n) actualizan `costs`, que se guarda solo si se pasó un
+    CostModel con ruta (sin él se usan las estimaciones a priori y no se escriben
+    archivos); `report` resume el uso del pool. `counters`, una función de módulo que
+    retorna contadores acumulados del proceso (p. ej. aciertos de un cache), deja en
+    `counts` lo que cada tarea los hizo avanzar, medido en el worker que la ejecutó.
+
+    >>> graph = TaskGraph('thread')
+    >>> graph.add('a', sum, [1, 2])
+    >>> graph.add('b', pow, 2, deps=['a'], on_done=print)
+    >>> graph.run()['b']
+    """
+    def __init__(self, executor='thread', max_workers=None, costs:CostModel=None, counters=None) -> None:
+        if executor not in EXECUTORS:
+            raise ValueError(f"Valores permitidos para executor son: {EXECUTORS}")
+        self.executor = executor
+        self.max_workers = max_workers
+        self.costs = costs
+        self.counters = counters
+        self.counts = {}
+        self.tasks = {}
+        self.results = {}
+        self.timings = {}
+        self.intervals = {}
+        self.errors = {}
+        self.report = {}
+
+    def add(self, name, func, *args, deps=(), on_done=None, cost=None):
+        if name in self.tasks:
+            raise ValueError(f"La tarea '{name}' ya existe en el grafo")
+        missing = [dep for dep in deps if dep not in self.tasks]
+        if missing:
+            # Las dependencias deben agregarse antes, lo que además impide ciclos
+            raise ValueError(f"Dependencias no definidas para '{name}': {missing}")
+        self.tasks[name] = {'func': func, 'args': args, 'deps': tuple(deps), 'on_done': on_done, 'cost': cost}
+        return self
+
+    @property
+    def workers(self) -> int:
+        if self.executor == 'serial':
+            return 1
+        if self.max_workers:
+            return self.max_workers
+        # Los mismos valores por defecto de concurrent.futures
+        cpus = os.cpu_count() or 1
+        return cpus if self.executor == 'process' else min(32, cpus + 4)
+
+    def _estimate(self, task) -> float:
+        cost = task['cost']
+        if cost is None:
+            return 0.0
+        if isinstance(cost, tuple):
+            if self.costs is None:
+                self.costs = CostModel()
+            return self.costs.estimate(*cost)
+        return float(cost)
+
+    def priorities(self) -> dict:
+        """Costo estimado de cada tarea más el de la cadena de dependientes más costosa."""
+        dependents = {name: [] for name in self.tasks}
+        for name, task in self.tasks.items():
+            for dep in task['deps']:
+                dependents[dep].append(name)
+        ranks = {}
+        # Los dependientes siempre se agregan después de sus dependencias
+        for name in reversed(list(self.tasks)):
+            ranks[name] = self._estimate(self.tasks[name]) + max((ranks[child] for child in dependents[name]), default=0.0)
+        return ranks
+
+    def _pool(self):
+        if self.executor == 'thread':
+            return ThreadPoolExecutor(max_workers=self.max_workers)
+        if self.executor == 'process':
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return _SerialExecutor()
+
+    def _finish(self, name, future):
+        task = self.tasks[name]
+        try:
+            result, seconds, started, counts = future.result()
+        except Exception as e:
+            self.errors[name] = e
+            logging.error(f"Tarea '{name}' falló: {type(e).__name__}: {e}")
+            return
+        self.results[name] = result
+        self.timings[name] = seconds
+        self.counts[name] = counts
+        self.intervals[name] = (started, started + seconds)
+        logging.debug(f"Tarea '{name}' completada en {seconds:.2f} s")
+        if task['on_done'] is not None:
+            task['on_done'](result)
+
+    def run(self, raise_errors=True) -> dict:
+        """
+        Ejecuta el grafo. Si alguna tarea falla, sus dependientes no se ejecutan y, al
+        terminar las demás, se relanza el primer error; con `raise_errors=False` los
+        errores de las tareas quedan solo en `errors` (los del pool se relanzan igual).
+        """
+        ranks = self.priorities()
+        pending = dict(self.tasks)
+        running = {}
+        with self._pool() as pool:
+            while pending or running:
+                ready = []
+                for name, task in list(pending.items()):
+                    if any(dep in self.errors for dep in task['deps']):
+                        self.errors[name] = RuntimeError(f"Dependencia fallida de '{name}'")
+                        del pending[name]
+                    elif all(dep in self.results for dep in task['deps']):
+                        ready.append(name)
+                # Las más largas primero; sort estable: sin costos se mantiene el orden de add
+                for name in sorted(ready, key=lambda name: -ranks[name])[:max(self.workers - len(running), 0)]:
+                    task = pending.pop(name)
+                    dep_results = [self.results[dep] for dep in task['deps']]
+                    running[pool.submit(_timed, name, self._attrs(task), self.counters, task['func'], *task['args'], *dep_results)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(running.pop(future), future)
+        self._learn()
+        if self.errors and raise_errors:
+            raise next(iter(self.errors.values()))
+        return self.results
+
+    def _attrs(self, task) -> dict:
+        cost = task['cost']
+        if isinstance(cost, tuple):
+            kind, model, n = cost
+            return {'cost_kind': kind, 'cost_model': model, 'cost_n': int(n), 'estimate_s': round(self._estimate(task), 3)}
+        return {}
+
+    def _learn(self):
+        """Actualiza el modelo de costo con los tiempos medidos y resume el uso del pool en `report`."""
+        self.report = utilization(list(self.intervals.values()), self.workers)
+        if self.report['tasks'] > 1:
+            logging.info(f"Pool de {self.report['workers']} workers: {self.report['tasks']} tareas en "
+                         f"{self.report['wall_s']:.1f} s, uso {self.report['utilization'] or 0:.0%}, "
+                         f"cola final con workers libres {self.report['tail_s']:.1f} s")
+        measured = [(self.tasks[name]['cost'], seconds) for name, seconds in self.timings.items()
+                    if isinstance(self.tasks[name]['cost'], tuple)]
+        if measured:
+            for (kind, model, n), seconds in measured:
+                self.costs.observe(kind, model, n, seconds)
+            self.costs.save()